@@ -1,7 +1,13 @@
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+
+from src import metrics
 
-from src.api import lm_apis
+# Serves only the word game from prebuilt embedding matrices; no LM is loaded
+GAME_ONLY = os.getenv("DMLM_GAME_ONLY", "0") == "1"
 
 app = FastAPI()
 
@@ -18,5 +24,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(lm_apis.router)
+app.middleware("http")(metrics.timing_middleware)
+
+if GAME_ONLY:
+    from src.api import game_api
+    app.include_router(game_api.router)
+else:
+    from src.api import lm_apis
+    app.include_router(lm_apis.router)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, inference and cache metrics."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,284 @@
+"""
+Offline latency/throughput benchmark for the backend routers.
+
+Requests go through FastAPI's in-process ASGI transport, so no server or
+network is involved. Each scenario is run at several concurrency levels and
+p50/p95/p99 latency plus throughput are written to JSON. Startup cost is
+measured in a fresh interpreter.
+
+    python benchmark.py --output bench_after.json
+    python benchmark.py --output bench_after.json --compare bench_before.json
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import httpx
+from fastapi import FastAPI
+
+ROUTER_MODULES = ["lm_apis", "game_api", "chess_apis", "planner_apis"]
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+PROMPT = "The quick brown fox jumps over the"
+
+PLANNER_STATE = {
+    "rooms": [
+        {"name": "living_room", "currentTemp": 70, "targetTemp": 70, "lightOn": True},
+        {"name": "bedroom", "currentTemp": 68, "targetTemp": 68, "lightOn": False},
+    ],
+    "people": [
+        {"name": "Alice", "location": "living_room", "preferredTemp": 72},
+    ],
+}
+
+
+@dataclass
+class Scenario:
+    name: str
+    router: str
+    method: str
+    path: str
+    # Builds the request body for the i-th request; receives per-run context
+    payload: Callable[[int, dict], Optional[dict]]
+
+
+def _lm(**fields) -> Callable[[int, dict], dict]:
+    def build(i: int, ctx: dict) -> dict:
+        return {"prompt": PROMPT, "model_name": "GPT-2", **fields}
+    return build
+
+
+def _unique_prompt(i: int, ctx: dict) -> dict:
+    # Never repeats across runs in a process, so the prefix cache can't serve it
+    ctx["prompt_counter"] = ctx.get("prompt_counter", 0) + 1
+    return {"prompt": f"{PROMPT} {ctx['prompt_counter']}", "model_name": "GPT-2"}
+
+
+def build_scenarios(max_tokens_levels: list[int]) -> list[Scenario]:
+    scenarios = [
+        Scenario("lm.token_probs", "lm_apis", "POST", "/lm/token_probs", _lm()),
+        Scenario("lm.token_probs[uncached]", "lm_apis", "POST", "/lm/token_probs", _unique_prompt),
+        Scenario("lm.tokenize_text", "lm_apis", "POST", "/lm/tokenize_text", _lm()),
+    ]
+    for strategy in ("Greedy", "Beam", "Sampling", "Assisted"):
+        for max_tokens in max_tokens_levels:
+            scenarios.append(Scenario(
+                f"lm.iterative_generation[{strategy},max_tokens={max_tokens}]",
+                "lm_apis", "POST", "/lm/iterative_generation",
+                _lm(search_strategy=strategy, max_tokens=max_tokens),
+            ))
+    scenarios += [
+        Scenario(
+            "game.guess", "game_api", "POST", "/game/guess",
+            lambda i, ctx: {"game_id": ctx["game_id"], "word": ctx["words"][i % len(ctx["words"])]},
+        ),
+        Scenario(
+            "game.guess_batch", "game_api", "POST", "/game/guess_batch",
+            lambda i, ctx: {"game_id": ctx["game_id"], "words": ctx["words"]},
+        ),
+        Scenario(
+            "game.hint", "game_api", "POST", "/game/hint",
+            lambda i, ctx: {
+                "game_id": ctx["game_id"],
+                "last_guess": ctx["words"][i % len(ctx["words"])],
+                "previous_guesses": ctx["words"][:i % 20],
+            },
+        ),
+        Scenario(
+            "game.neighbors", "game_api", "POST", "/game/neighbors",
+            lambda i, ctx: {"game_id": ctx["game_id"], "word": ctx["words"][i % len(ctx["words"])]},
+        ),
+        Scenario(
+            "chess.make_move", "chess_apis", "POST", "/chess/make_move",
+            lambda i, ctx: {"fen": START_FEN, "model_name": "GPT-2"},
+        ),
+        Scenario(
+            "chess.score_moves", "chess_apis", "POST", "/chess/score_moves",
+            lambda i, ctx: {"fen": START_FEN, "model_name": "GPT-2"},
+        ),
+        Scenario(
+            "chess.make_move[free]", "chess_apis", "POST", "/chess/make_move",
+            lambda i, ctx: {"fen": START_FEN, "model_name": "GPT-2", "decoding": "free"},
+        ),
+        Scenario(
+            "planner.execute", "planner_apis", "POST", "/planner/execute",
+            lambda i, ctx: {"prompt": "Turn on the bedroom light", "model_name": "GPT-2", "current_state": PLANNER_STATE},
+        ),
+    ]
+    return scenarios
+
+
+def build_app() -> tuple[FastAPI, dict[str, Any], dict[str, str]]:
+    """Mounts every router that imports cleanly; returns (app, modules, skipped)."""
+    app = FastAPI()
+    modules, skipped = {}, {}
+    for name in ROUTER_MODULES:
+        try:
+            module = importlib.import_module(f"src.api.{name}")
+        except Exception as e:
+            skipped[name] = f"{type(e).__name__}: {e}"
+            continue
+        app.include_router(module.router)
+        modules[name] = module
+    return app, modules, skipped
+
+
+def measure_startup() -> dict:
+    """Import time of the app module in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    try:
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, timeout=600
+        )
+        return {"app_import_seconds": round(float(result.stdout.strip().splitlines()[-1]), 3)}
+    except Exception as e:
+        return {"app_import_seconds": None, "error": str(e)}
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, ctx: dict, concurrency: int, requests: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(scenario.method, scenario.path, json=scenario.payload(i, ctx))
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "name": scenario.name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)),
+        "throughput_rps": round(requests / wall, 2),
+        "status_codes": statuses,
+    }
+
+
+async def run_all(args) -> dict:
+    results = {"startup": measure_startup(), "scenarios": []}
+
+    import_start = time.perf_counter()
+    app, modules, skipped = build_app()
+    results["startup"]["routers_import_seconds"] = round(time.perf_counter() - import_start, 3)
+    results["skipped_routers"] = skipped
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        ctx: dict = {}
+        if "game_api" in modules:
+            ctx["game_id"] = (await client.post("/game/start")).json()["game_id"]
+            ctx["words"] = modules["game_api"].WORD_NAMES[:200]
+
+        for scenario in build_scenarios(args.max_tokens):
+            if scenario.router not in modules:
+                continue
+            if args.only and not any(pattern in scenario.name for pattern in args.only):
+                continue
+            # The first call pays lazy model loading and cache warm-up
+            warm_start = time.perf_counter()
+            await client.request(scenario.method, scenario.path, json=scenario.payload(0, ctx))
+            first_call_ms = round((time.perf_counter() - warm_start) * 1000, 2)
+
+            for concurrency in args.concurrency:
+                result = await run_scenario(client, scenario, ctx, concurrency, args.requests)
+                result["first_call_ms"] = first_call_ms
+                results["scenarios"].append(result)
+                print(
+                    f"{result['name']:<55} c={concurrency:<3} "
+                    f"p50={result['p50_ms']:>9.2f}ms p95={result['p95_ms']:>9.2f}ms "
+                    f"p99={result['p99_ms']:>9.2f}ms {result['throughput_rps']:>8.2f} req/s"
+                )
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Lists scenarios whose p95 latency or throughput regressed beyond threshold."""
+    base = {(s["name"], s["concurrency"]): s for s in baseline.get("scenarios", [])}
+    regressions = []
+    for s in current["scenarios"]:
+        old = base.get((s["name"], s["concurrency"]))
+        if old is None:
+            continue
+        p95_change = (s["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        rps_change = (s["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] if old["throughput_rps"] else 0.0
+        line = (
+            f"{s['name']:<55} c={s['concurrency']:<3} "
+            f"p95 {old['p95_ms']:.2f} -> {s['p95_ms']:.2f}ms ({p95_change:+.1%}), "
+            f"throughput {old['throughput_rps']:.2f} -> {s['throughput_rps']:.2f} ({rps_change:+.1%})"
+        )
+        print(line)
+        if p95_change > threshold or rps_change < -threshold:
+            regressions.append(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_output.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change that counts as a regression")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--only", nargs="+", help="Only run scenarios whose name contains one of these")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_all(args))
+    results["meta"] = {
+        "git_commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "requests_per_level": args.requests,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
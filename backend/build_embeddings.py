@@ -0,0 +1,77 @@
+"""
+Offline job that precomputes word-game embedding matrices.
+
+Each backend's matrix is computed in large forward batches and written as a
+float16 .npy under DMLM_CACHE_DIR, where the game memory-maps it. Run it
+once per deployment (or bake it into the image) before serving a backend
+that needs a model forward:
+
+    python build_embeddings.py --backend contextual --batch-size 512
+    python build_embeddings.py --all --storage int8
+    python build_embeddings.py --backend static --check
+
+--check recomputes the float32 matrix and verifies that scoring on each
+compact form stays within word_embeddings.RANK_TOLERANCE.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from src.api import game_api
+from src.word_embeddings import (
+    EMBEDDING_BACKENDS, STORAGE_DTYPES, build_matrix, load_matrix, rank_agreement, within_tolerance
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", nargs="+", choices=sorted(EMBEDDING_BACKENDS), help="Backends to build")
+    parser.add_argument("--all", action="store_true", help="Build every registered backend")
+    parser.add_argument("--batch-size", type=int, default=256, help="Words per forward pass")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if a matrix is already cached")
+    parser.add_argument("--storage", choices=STORAGE_DTYPES, default="float16",
+                        help="Also prepare this serving form (int8 is derived from the float16 file)")
+    parser.add_argument("--check", action="store_true", help="Verify compact scoring against float32")
+    parser.add_argument("--check-targets", type=int, default=50, help="Targets sampled by --check")
+    args = parser.parse_args()
+
+    names = sorted(EMBEDDING_BACKENDS) if args.all else args.backend
+    if not names:
+        parser.error("pass --backend NAME [NAME ...] or --all")
+
+    failures = []
+    for name in names:
+        spec = EMBEDDING_BACKENDS[name]
+        matrix = None if args.force else load_matrix(game_api.VOCAB_KEY, spec, game_api.TOTAL_WORDS, args.storage)
+        if matrix is not None:
+            print(f"{name}: already built")
+        else:
+            start = time.perf_counter()
+            matrix = build_matrix(game_api.VOCAB_KEY, spec, game_api._vocab, args.batch_size, args.storage)
+            print(f"{name}: {matrix.shape[0]} x {matrix.shape[1]} {matrix.dtype} in {time.perf_counter() - start:.1f}s")
+
+        if args.check:
+            reference = spec.compute(game_api._vocab, args.batch_size).astype(np.float32)
+            targets = np.random.default_rng(0).choice(len(reference), min(args.check_targets, len(reference)), replace=False)
+            for storage in ("float16", "int8"):
+                compact = load_matrix(game_api.VOCAB_KEY, spec, game_api.TOTAL_WORDS, storage)
+                agreement = rank_agreement(reference, compact, targets)
+                ok = within_tolerance(storage, agreement)
+                print(
+                    f"{name} [{storage}, {compact.nbytes / 2**20:.1f} MiB]: "
+                    f"max |error| {agreement['max_abs_error']:.2e}, "
+                    f"top-{agreement['top_k']} overlap {agreement['mean_top_k_overlap']:.4f} "
+                    f"{'ok' if ok else 'OUT OF TOLERANCE'}"
+                )
+                if not ok:
+                    failures.append(f"{name}/{storage}")
+
+    if failures:
+        print(f"Out of tolerance: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Local stand-in for the OpenRouter chat-completions API.
+
+Serves OpenAI-shaped /chat/completions responses with per-token logprobs from
+a tiny deterministic fake model, with configurable latency, so the OpenRouter
+routes can be exercised offline:
+
+    python openrouter_stub.py --port 8765 --latency-ms 20
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1 OPENROUTER_API_KEY=stub uvicorn app:app
+
+--load-test starts the stub, runs a long iterative generation through the
+OpenRouter router and pings another route while it is in flight. The pings
+only progress if the generation never blocks the event loop. --fail-rate
+answers that share of upstream requests with 429/503 to exercise retries and
+the circuit breaker; the run ends with the transport stats.
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+VOCAB = [
+    " the", " a", " of", " and", " to", " in", " is", " was", " it", " that",
+    " model", " token", " language", " word", " next", " probability", " text", " learn",
+    ".", ",", " cat", " dog", " sat", " on", " mat", " quick", " brown", " fox",
+]
+TOP_LOGPROBS_WEIGHTS = [4.0, 3.0, 2.5, 2.0, 1.6, 1.3, 1.0, 0.8, 0.6, 0.4, 0.3, 0.2, 0.1, 0.05, 0.02, 0.01, 0.0, 0.0, 0.0, 0.0]
+
+stub_app = FastAPI()
+stub_app.state.latency = 0.0
+stub_app.state.requests = 0
+stub_app.state.fail_rate = 0.0
+
+
+def _candidates(context: str, k: int) -> list[tuple[str, float]]:
+    """Top-k next tokens with log-probabilities, a pure function of the context."""
+    seed = int.from_bytes(hashlib.sha256(context.encode()).digest()[:8], "big")
+    tokens = random.Random(seed).sample(VOCAB, k)
+    weights = TOP_LOGPROBS_WEIGHTS[:k]
+    norm = math.log(sum(math.exp(w) for w in weights))
+    return [(token, w - norm) for token, w in zip(tokens, weights)]
+
+
+def _entry(token: str, logprob: float) -> dict:
+    return {"token": token, "logprob": logprob, "bytes": list(token.encode())}
+
+
+@stub_app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stub_app.state.requests += 1
+    if stub_app.state.latency:
+        await asyncio.sleep(stub_app.state.latency)
+    if random.random() < stub_app.state.fail_rate:
+        if random.random() < 0.5:
+            return JSONResponse({"error": {"message": "Rate limited"}}, status_code=429, headers={"Retry-After": "0.05"})
+        return JSONResponse({"error": {"message": "Upstream overloaded"}}, status_code=503)
+
+    context = "".join(m.get("content", "") for m in body["messages"])
+    max_tokens = body.get("max_tokens") or 16
+    temperature = body.get("temperature") or 0.0
+    top_k = max(1, min(body.get("top_logprobs") or 1, 20))
+    rng = random.Random()
+
+    content, pieces = [], []
+    for _ in range(max_tokens):
+        candidates = _candidates(context, top_k)
+        if temperature > 0:
+            token, logprob = rng.choices(candidates, weights=[math.exp(lp / temperature) for _, lp in candidates])[0]
+        else:
+            token, logprob = candidates[0]
+        entry = _entry(token, logprob)
+        if body.get("logprobs"):
+            entry["top_logprobs"] = [_entry(t, lp) for t, lp in candidates]
+        content.append(entry)
+        pieces.append(token)
+        context += token
+
+    return {
+        "id": f"stub-{stub_app.state.requests}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(pieces)},
+            "finish_reason": "length",
+            "logprobs": {"content": content} if body.get("logprobs") else None,
+        }],
+        "usage": {"prompt_tokens": len(context.split()), "completion_tokens": max_tokens, "total_tokens": 0},
+    }
+
+
+def serve_in_thread(port: int, latency_ms: float, fail_rate: float = 0.0) -> uvicorn.Server:
+    stub_app.state.latency = latency_ms / 1000.0
+    stub_app.state.fail_rate = fail_rate
+    server = uvicorn.Server(uvicorn.Config(stub_app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def load_test(port: int, tokens: int, strategy: str = "Greedy") -> None:
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{port}/api/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub")
+    import httpx
+    from src.api import openrouter_apis
+    from src.api.openrouter_client import upstream_stats
+    from src.upstream import UPSTREAM_RETRIES
+
+    app = FastAPI()
+    app.include_router(openrouter_apis.router)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+        generation = asyncio.create_task(client.post("/lm/openrouter/iterative_generation", json={
+            "prompt": "The quick brown fox", "model_name": "GPT-2",
+            "search_strategy": strategy, "max_tokens": tokens,
+        }))
+        start = time.perf_counter()
+        ping_latencies = []
+        while not generation.done():
+            ping_start = time.perf_counter()
+            await client.get("/ping")
+            ping_latencies.append(time.perf_counter() - ping_start)
+            await asyncio.sleep(0.01)
+        response = await generation
+        elapsed = time.perf_counter() - start
+
+    steps = len(response.json().get("steps", [])) if response.status_code == 200 else 0
+    ping_latencies.sort()
+    print(f"{strategy} generation: {steps} steps, status {response.status_code}, {elapsed:.2f}s, "
+          f"{stub_app.state.requests} upstream requests")
+    if ping_latencies:
+        print(f"Pings served meanwhile: {len(ping_latencies)}, "
+              f"p50 {ping_latencies[len(ping_latencies) // 2] * 1000:.1f}ms, max {ping_latencies[-1] * 1000:.1f}ms")
+    else:
+        print("Pings served meanwhile: 0 (the event loop was blocked)")
+    stats = upstream_stats()
+    retries = UPSTREAM_RETRIES.total()
+    print(f"Upstream: {stats['http_requests']:.0f} HTTP requests on {stats['connections_opened']:.0f} connections "
+          f"(reuse {stats['connection_reuse_ratio']:.1%}), {retries:.0f} retries, breakers {stats['breakers']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Delay added to every upstream response")
+    parser.add_argument("--load-test", action="store_true", help="Run the event-loop load test and exit")
+    parser.add_argument("--tokens", type=int, default=100, help="max_tokens for the load-test generation")
+    parser.add_argument("--strategy", choices=["Greedy", "Sampling", "Beam"], default="Greedy")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of upstream requests answered 429/503")
+    args = parser.parse_args()
+
+    if args.load_test:
+        serve_in_thread(args.port, args.latency_ms, args.fail_rate)
+        asyncio.run(load_test(args.port, args.tokens, args.strategy))
+    else:
+        stub_app.state.latency = args.latency_ms / 1000.0
+        stub_app.state.fail_rate = args.fail_rate
+        uvicorn.run(stub_app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
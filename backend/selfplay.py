@@ -0,0 +1,65 @@
+"""
+Headless LM-vs-LM chess self-play against local models.
+
+Games run concurrently in-process; the moves of all games on the same turn
+are batched into one forward pass per model. PGNs are written to a file and
+illegal-move rate, per-move latency and throughput are printed (and saved
+as JSON with --json).
+
+    python selfplay.py --games 16 --white GPT-2 --black GPT-2 --pgn games.pgn
+    python selfplay.py --games 8 --decoding free --json selfplay.json
+"""
+import argparse
+import asyncio
+import json
+
+from src.api import lm_apis
+from src.api.chess_apis import SelfPlayInput, run_selfplay
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--white", default="GPT-2", help="Model playing White in odd-numbered games")
+    parser.add_argument("--black", default="GPT-2", help="Model playing Black in odd-numbered games")
+    parser.add_argument("--games", type=int, default=8, help="Games played concurrently")
+    parser.add_argument("--max-plies", type=int, default=200, help="Unfinished games stop here with result '*'")
+    parser.add_argument("--decoding", choices=["constrained", "free"], default="constrained")
+    parser.add_argument("--no-alternate", action="store_true", help="Keep colors fixed instead of swapping every other game")
+    parser.add_argument("--seed", type=int, help="Seed for the random fallback after an illegal move")
+    parser.add_argument("--pgn", default="selfplay.pgn", help="Where to write the games")
+    parser.add_argument("--json", help="Also write the full results as JSON")
+    args = parser.parse_args()
+
+    # One batch per model per turn needs room for every game in the batch
+    lm_apis._batcher.max_batch_size = max(lm_apis._batcher.max_batch_size, args.games)
+    lm_apis.INFERENCE_TIMEOUT = max(lm_apis.INFERENCE_TIMEOUT, 120.0)
+
+    result = asyncio.run(run_selfplay(SelfPlayInput(
+        white_model=args.white,
+        black_model=args.black,
+        games=args.games,
+        max_plies=args.max_plies,
+        decoding=args.decoding,
+        alternate_colors=not args.no_alternate,
+        seed=args.seed,
+    )))
+
+    with open(args.pgn, "w") as f:
+        f.write("\n\n".join(game.pgn for game in result.games) + "\n")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result.model_dump(), f, indent=2)
+
+    for i, game in enumerate(result.games, 1):
+        print(f"Game {i:<3} {game.white} vs {game.black}: {game.result:<7} {game.termination:<22} "
+              f"{game.plies} plies, {game.illegal_moves} illegal")
+    print(
+        f"{result.total_moves} moves in {result.wall_seconds}s ({result.moves_per_second} moves/s), "
+        f"illegal-move rate {result.illegal_move_rate:.2%}, "
+        f"move latency p50 {result.move_latency_ms['p50']}ms p95 {result.move_latency_ms['p95']}ms"
+    )
+    print(f"PGNs written to {args.pgn}")
+
+
+if __name__ == "__main__":
+    main()
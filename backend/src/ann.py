@@ -0,0 +1,166 @@
+"""Inverted-file (IVF) approximate nearest-neighbor index over unit vectors.
+
+Vectors are partitioned with spherical k-means. A query scores the centroids,
+then scores exactly only the members of the ``n_probe`` best lists, so a
+top-k lookup touches a few percent of the matrix instead of all of it.
+Everything is plain NumPy and the index is a few arrays that can be saved
+with ``save_npy`` and memory-mapped back.
+"""
+
+import math
+from pathlib import Path
+
+import numpy as np
+
+from .artifacts import load_npy, save_npy
+
+# Below this size an exact scan is as cheap as probing lists
+EXACT_SEARCH_MAX_ROWS = 4096
+
+
+def _argtopk(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` largest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class IVFIndex:
+    """Cosine-similarity IVF index; ``vectors`` must be L2-normalized rows (any float dtype)."""
+
+    _FIELDS = ("centroids", "list_offsets", "list_ids")
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_ids: np.ndarray):
+        self.centroids = centroids        # [L, D] unit centroids
+        self.list_offsets = list_offsets  # [L + 1] slice bounds into list_ids
+        self.list_ids = list_ids          # [N] row ids grouped by list
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @staticmethod
+    def default_n_lists(n_rows: int) -> int:
+        return max(1, int(4 * math.sqrt(n_rows)))
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_lists: int | None = None,
+        n_iter: int = 10,
+        seed: int = 0,
+        chunk_size: int = 8192,
+    ) -> "IVFIndex":
+        """Spherical k-means over ``vectors`` with assignment done in row chunks."""
+        n_rows = len(vectors)
+        n_lists = min(n_lists or cls.default_n_lists(n_rows), n_rows)
+        rng = np.random.default_rng(seed)
+        centroids = np.array(vectors[rng.choice(n_rows, n_lists, replace=False)], dtype=np.float32)
+
+        assign = np.empty(n_rows, dtype=np.int32)
+        for _ in range(n_iter):
+            sums = np.zeros_like(centroids)
+            for start in range(0, n_rows, chunk_size):
+                chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+                labels = np.argmax(chunk @ centroids.T, axis=1)
+                assign[start:start + chunk_size] = labels
+                # One-hot matmul sums each list's members far faster than np.add.at
+                onehot = np.zeros((len(chunk), n_lists), dtype=np.float32)
+                onehot[np.arange(len(chunk)), labels] = 1.0
+                sums += onehot.T @ chunk
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Reseed empty lists with random rows so every list stays usable
+            if empty.any():
+                sums[empty] = vectors[rng.choice(n_rows, int(empty.sum()), replace=False)]
+                norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        list_ids = np.argsort(assign, kind="stable").astype(np.int32)
+        counts = np.bincount(assign, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(centroids, list_offsets, list_ids)
+
+    def candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        """Row ids in the ``n_probe`` lists whose centroids best match ``query``."""
+        lists = _argtopk(self.centroids @ query, min(n_probe, self.n_lists))
+        return np.concatenate(
+            [self.list_ids[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists]
+        )
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        n_probe: int = 8,
+        exclude: set[int] = frozenset(),
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Approximate top-``k`` rows of ``vectors`` by cosine similarity to ``query``.
+
+        Returns ``(ids, scores)`` best first. Small matrices are scanned exactly.
+        When the probed lists hold fewer than ``k`` rows outside ``exclude``,
+        the probe count doubles until they do or every list is scanned.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        exact = len(vectors) <= EXACT_SEARCH_MAX_ROWS
+        while True:
+            ids = np.arange(len(vectors)) if exact else np.sort(self.candidates(query, n_probe))
+            if exclude:
+                ids = ids[~np.isin(ids, np.fromiter(exclude, dtype=np.int64))]
+            if exact or len(ids) >= k or n_probe >= self.n_lists:
+                break
+            n_probe *= 2
+        scores = np.asarray(vectors[ids], dtype=np.float32) @ query
+        top = _argtopk(scores, k)
+        return ids[top].astype(np.int64), scores[top]
+
+    def save(self, directory: Path) -> None:
+        for name in self._FIELDS:
+            save_npy(directory / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: Path, n_rows: int) -> "IVFIndex | None":
+        """Memory-maps a saved index, or returns None if missing or built for other data."""
+        arrays = [load_npy(directory / f"{name}.npy") for name in cls._FIELDS]
+        if any(a is None for a in arrays) or len(arrays[2]) != n_rows:
+            return None
+        return cls(*arrays)
+
+    def recall(
+        self, vectors: np.ndarray, queries: np.ndarray, k: int, n_probe: int, exact: list[np.ndarray] | None = None
+    ) -> float:
+        """Mean overlap of approximate and exact top-``k`` over ``queries``.
+
+        ``exact`` holds precomputed exact top-``k`` ids per query.
+        """
+        if exact is None:
+            matrix = np.asarray(vectors[:], dtype=np.float32)  # [:] dequantizes an Int8Matrix
+            exact = [_argtopk(matrix @ query, k) for query in queries]
+        hits = 0
+        for query, expected in zip(queries, exact):
+            approx, _ = self.search(vectors, query, k, n_probe)
+            hits += len(np.intersect1d(approx, expected))
+        return hits / (k * len(queries))
+
+    def tune_n_probe(
+        self, vectors: np.ndarray, target: float, k: int = 10, n_queries: int = 200, seed: int = 0
+    ) -> tuple[int, float]:
+        """Smallest power-of-two ``n_probe`` reaching ``target`` recall@``k``.
+
+        Queries are rows sampled from ``vectors``, the workload of a
+        neighbour lookup. Returns ``(n_probe, measured recall)``.
+        """
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False))
+        queries = np.asarray(vectors[rows], dtype=np.float32)
+        matrix = np.asarray(vectors[:], dtype=np.float32)
+        exact = [_argtopk(matrix @ query, k) for query in queries]
+        n_probe = 1
+        while True:
+            recall = self.recall(vectors, queries, k, n_probe, exact)
+            if recall >= target or n_probe >= self.n_lists:
+                return min(n_probe, self.n_lists), recall
+            n_probe *= 2
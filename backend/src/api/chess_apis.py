@@ -1,8 +1,25 @@
+import asyncio
 import chess
+import chess.pgn
+import math
+import random
+import os
 import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Literal
+import torch
+from transformers import LogitsProcessorList, StoppingCriteriaList
 from ..models import SUPPORTED_MODELS, extract_json_from_response
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from ..logs import log_event
+from ..constrained import TokenTrie, TrieCompleteCriteria, TrieLogitsProcessor
+from ..prefix_cache import continuation_logprobs, left_pad
+from ..lru import LRUCache
+from .. import metrics
+from .lm_apis import run_batched, _prefix_cache
 
 router = APIRouter(
     prefix="/chess",
@@ -29,14 +46,31 @@ TOOL_DESCRIPTION = {
     }
 }
 
+# "constrained" masks decoding to the legal moves, so the reply is always a
+# legal move; "free" samples a few tokens and salvages a move from the text
+MoveDecoding = Literal["constrained", "free"]
+
 class ChessStateInput(BaseModel):
     fen: str
     model_name: str
+    decoding: MoveDecoding = "constrained"
 
 # Move in UCI format
 class ChessMoveOutput(BaseModel):
     move: str
 
+class ScoreMovesInput(BaseModel):
+    fen: str
+    model_name: str
+
+class MoveScore(BaseModel):
+    move: str
+    logprob: float       # log-likelihood of the move's tokens after the prompt
+    probability: float   # renormalized over the legal moves
+
+class ScoreMovesOutput(BaseModel):
+    moves: list[MoveScore]  # most likely first
+
 class ApplyMoveInput(BaseModel):
     fen: str
     move: str
@@ -48,17 +82,15 @@ class ApplyMoveOutput(BaseModel):
 
 def get_possible_moves(fen: str) -> list[str]:
     """Returns a list of possible moves in UCI format for the given FEN."""
-    try:
-        board = chess.Board(fen)
-        return [move.uci() for move in board.legal_moves]
-    except ValueError:
-        return []
+    position = _position(fen)
+    return list(position.legal_moves) if position is not None else []
 
-def build_chess_prompt(fen: str, possible_moves: list[str], tool_description: dict) -> str:
+def build_chess_prompt(fen: str, possible_moves: list[str], tool_description: dict, current_player: str | None = None) -> str:
     """Builds a prompt for the LM to choose the next chess move."""
     # Determine whose turn it is from FEN
-    board = chess.Board(fen)
-    current_player = "White" if board.turn == chess.WHITE else "Black"
+    if current_player is None:
+        board = chess.Board(fen)
+        current_player = "White" if board.turn == chess.WHITE else "Black"
         
     # Format moves for easy parsing
     moves_list_str = "\n".join(f"- {move}" for move in possible_moves)
@@ -81,6 +113,117 @@ def build_chess_prompt(fen: str, possible_moves: list[str], tool_description: di
     )
     return prompt
 
+# --- Position cache ---
+# Self-play and replayed games revisit the same positions; cache the legal
+# moves and per-model token ids so repeats skip python-chess move generation
+# and tokenization entirely.
+
+POSITION_CACHE_SIZE = int(os.getenv("CHESS_POSITION_CACHE_SIZE", 4096))
+
+@dataclass
+class _Encoded:
+    prompt_ids: list[int]
+    move_ids: list[list[int]]  # parallel to legal_moves
+    trie: TokenTrie
+
+@dataclass
+class _Board:
+    """What a position's legal moves depend on; shared by every FEN with the same first four fields."""
+    legal_moves: list[str]
+    current_player: str
+    move_encodings: dict  # model_name -> (move ids, legal-move trie)
+    prompt_ids: dict  # (model_name, fen) -> prompt token ids; the prompt shows the move clocks
+
+@dataclass
+class _Position:
+    """A request's FEN, as given, over the cached board it normalizes to."""
+    fen: str
+    board: _Board
+    prompt: str
+
+    @property
+    def legal_moves(self) -> list[str]:
+        return self.board.legal_moves
+
+_positions = LRUCache(max_entries=POSITION_CACHE_SIZE)
+_encoding_stats = {"hits": 0, "misses": 0}
+_encoding_stats_lock = threading.Lock()  # _encoded runs on executor threads
+
+def normalize_fen(fen: str) -> str:
+    """Placement, side to move, castling and en passant: the fields legal moves depend on.
+
+    The move clocks are dropped so positions reached at different move
+    numbers share one entry.
+    """
+    return " ".join(fen.split()[:4])
+
+def _position(fen: str) -> _Position | None:
+    """``fen`` over its cached board, or None if the FEN is invalid.
+
+    The prompt still shows the FEN exactly as given, move clocks included.
+    """
+    key = normalize_fen(fen)
+    board = _positions.get(key)
+    if board is None:
+        try:
+            chess_board = chess.Board(fen)
+        except ValueError:
+            return None
+        board = _Board(
+            legal_moves=[move.uci() for move in chess_board.legal_moves],
+            current_player="White" if chess_board.turn == chess.WHITE else "Black",
+            move_encodings={},
+            prompt_ids={},
+        )
+        _positions.put(key, board)
+    prompt = build_chess_prompt(fen, board.legal_moves, TOOL_DESCRIPTION, board.current_player)
+    return _Position(fen=fen, board=board, prompt=prompt)
+
+def _encoded(position: _Position, model_name: str) -> _Encoded:
+    """Token ids of the position's prompt and legal moves for one model's tokenizer."""
+    board = position.board
+    moves = board.move_encodings.get(model_name)
+    prompt_ids = board.prompt_ids.get((model_name, position.fen))
+    with _encoding_stats_lock:
+        _encoding_stats["hits" if moves is not None and prompt_ids is not None else "misses"] += 1
+    if moves is None or prompt_ids is None:
+        tokenizer = SUPPORTED_MODELS.tokenizer(model_name)
+    if moves is None:
+        move_ids = [tokenizer.encode(move, add_special_tokens=False) for move in board.legal_moves]
+        trie = TokenTrie()
+        for ids, move in zip(move_ids, board.legal_moves):
+            trie.insert(ids, move)
+        moves = board.move_encodings[model_name] = (move_ids, trie)
+    if prompt_ids is None:
+        prompt_ids = board.prompt_ids[(model_name, position.fen)] = tokenizer.encode(position.prompt)
+    return _Encoded(prompt_ids, *moves)
+
+def position_cache_stats() -> dict:
+    with _encoding_stats_lock:
+        encoding_stats = dict(_encoding_stats)
+    return {
+        **_positions.stats(),
+        "max_entries": POSITION_CACHE_SIZE,
+        "encoding_hits": encoding_stats["hits"],
+        "encoding_misses": encoding_stats["misses"],
+    }
+
+def _collect_metrics() -> list[str]:
+    stats = position_cache_stats()
+    return metrics.gauge_lines(
+        "chess_position_cache_lookups", "Chess position-cache lookups by outcome",
+        {k: stats[k] for k in ("hits", "misses", "encoding_hits", "encoding_misses")}, label="outcome",
+    )
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+
+@router.get("/cache/stats")
+async def chess_cache_stats():
+    """Hit/miss counters of the FEN position cache."""
+    return position_cache_stats()
+
+
 @router.get("/get_possible_moves")
 async def get_chess_possible_moves(fen: str):
     """API endpoint to get possible chess moves given FEN."""
@@ -90,37 +233,188 @@ async def get_chess_possible_moves(fen: str):
     return {"possible_moves": moves}
 
 
-# API Endpoint takes in the current FEN and calls the LM to get the next move
-@router.post("/make_move")
-async def make_chess_move(data: ChessStateInput):
-    """API endpoint to make a chess move given FEN and UCI move."""
-    fen = data.fen
-    move_uci = get_possible_moves(fen)    
-    print(f"Moves UCI: {move_uci}")
-    if not fen or not move_uci:
-        return ChessMoveOutput(move="game_over")
-    # 1. Select LM components based on input
+@dataclass
+class _MoveJob:
+    position: _Position
+    model_name: str
+
+
+# Low temperature keeps play strong; the legal-move mask replaces top-k/top-p
+CONSTRAINED_TEMPERATURE = 0.2
+
+
+def _choose_moves_batch(items: list[_MoveJob]):
+    """Picks one legal move per position with a single left-padded ``generate``.
+
+    Every row is masked to its own legal-move trie and stops as soon as it has
+    spelled a complete move, so the batch takes at most as many steps as the
+    longest move has tokens.
+    """
+    model_name = items[0].model_name
+    tokenizer = SUPPORTED_MODELS[model_name]["tokenizer"]
+    model = SUPPORTED_MODELS[model_name]["model"]
+
+    with metrics.stage("chess_move", "tokenize"):
+        encoded = [_encoded(job.position, model_name) for job in items]
+        prompts = [e.prompt_ids for e in encoded]
+        tries = [e.trie for e in encoded]
+
+    input_ids, attention_mask = left_pad(prompts, tokenizer.eos_token_id, model.device)
+    prompt_len = input_ids.shape[1]
+    generate_start = time.perf_counter()
+    with torch.no_grad(), metrics.stage("chess_move", "forward"):
+        outputs = model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            max_new_tokens=max(trie.depth for trie in tries) + 1,
+            do_sample=True,
+            temperature=CONSTRAINED_TEMPERATURE,
+            top_k=0,
+            top_p=1.0,
+            pad_token_id=tokenizer.eos_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            logits_processor=LogitsProcessorList([
+                TrieLogitsProcessor(tries, prompt_len, tokenizer.eos_token_id)
+            ]),
+            stopping_criteria=StoppingCriteriaList([TrieCompleteCriteria(tries, prompt_len)]),
+        )
+    steps = outputs.shape[1] - prompt_len
+    metrics.GENERATED_TOKENS.inc(steps * len(items), endpoint="chess_move")
+    log_event(
+        "chess.constrained",
+        f"♟️ Constrained decoding: {len(items)} position(s) in {steps} step(s), "
+        f"{time.perf_counter() - generate_start:.3f}s",
+        batch_size=len(items), steps=steps, model=model_name,
+    )
+
+    moves = []
+    for row, trie in enumerate(tries):
+        generated = outputs[row, prompt_len:].tolist()
+        while generated and generated[-1] == tokenizer.eos_token_id:
+            generated.pop()
+        moves.append(trie.value(generated) or "invalid_move")
+    return moves
+
+
+def _score_moves_batch(items: list[_MoveJob]):
+    """Ranks every legal move per position by the model's log-likelihood.
+
+    The prompt runs through the shared prefix cache once; all legal moves are
+    then scored together in one packed forward over its KV cache.
+    """
+    model_name = items[0].model_name
+    model = SUPPORTED_MODELS[model_name]["model"]
+
+    results = []
+    for job in items:
+        try:
+            with metrics.stage("score_moves", "tokenize"):
+                encoded = _encoded(job.position, model_name)
+            with metrics.stage("score_moves", "forward"):
+                logprobs = continuation_logprobs(
+                    _prefix_cache, model_name, model, encoded.prompt_ids, encoded.move_ids
+                )
+        except Exception as e:
+            results.append(e)
+            continue
+        peak = max(logprobs)
+        norm = sum(math.exp(lp - peak) for lp in logprobs)
+        ranked = sorted(zip(job.position.legal_moves, logprobs), key=lambda pair: pair[1], reverse=True)
+        results.append(ScoreMovesOutput(moves=[
+            MoveScore(move=move, logprob=round(lp, 4), probability=round(math.exp(lp - peak) / norm, 6))
+            for move, lp in ranked
+        ]))
+    return results
+
+
+@router.post("/score_moves", response_model=ScoreMovesOutput)
+async def score_chess_moves(data: ScoreMovesInput):
+    """The model's probability for every legal move in the position."""
+    position = _position(data.fen)
+    if position is None or not position.legal_moves:
+        raise HTTPException(status_code=400, detail="Invalid FEN or no possible moves.")
+    if data.model_name not in SUPPORTED_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported model: {data.model_name}. Supported models are: {list(SUPPORTED_MODELS.keys())}"
+        )
     try:
-        if data.model_name not in SUPPORTED_MODELS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported model: {data.model_name}. Supported models are: {list(SUPPORTED_MODELS.keys())}"
-            )
-        tokenizer = SUPPORTED_MODELS[data.model_name]["tokenizer"]
-        model = SUPPORTED_MODELS[data.model_name]["model"]
-        
-        print(f"♟️ Chess move request for FEN: '{fen}' using {data.model_name}")
-        
-        # Build prompt
-        prompt = build_chess_prompt(fen, move_uci, TOOL_DESCRIPTION)
-        
-        print(f"📝 Prompt sent to LM:\n{prompt}\n")
-        # Tokenize the prompt directly (without chat template for simpler handling)
-        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+        return await run_batched(_score_moves_batch, data.model_name, _MoveJob(position, data.model_name))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Issue with Calling LM: {e}")
+
 
-        # Generate response with minimal tokens
+def _salvage_move(response_text: str, legal_moves: list[str], fen: str) -> str:
+    """Finds a legal move in free-form model output, or returns "invalid_move"."""
+    # Extract JSON from response
+    response_json = extract_json_from_response(response_text)
+    
+    # If JSON extraction succeeds, validate the move
+    if response_json and "move" in response_json:
+        move = response_json["move"].strip().lower()
+        if move in legal_moves:
+            log_event("chess.move", f"✅ Valid move from JSON: {move}", move=move, source="json")
+            return move
+        else:
+            log_event("chess.illegal_move", f"⚠️ Move from JSON not in legal moves: {move}", move=move, source="json")
+    
+    # If JSON extraction fails or move invalid, try to extract move directly from text
+    # Look for UCI format moves (e.g., e2e4, g8h6) - try multiple patterns
+    
+    # First, try word boundary pattern
+    move_match = re.search(r'\b([a-h][1-8][a-h][1-8][qrbn]?)\b', response_text.lower())
+    if move_match:
+        potential_move = move_match.group(1)
+        log_event("chess.candidate", f"🔍 Found potential move with word boundary: {potential_move}", move=potential_move)
+        if potential_move in legal_moves:
+            log_event("chess.move", f"✅ Extracted move from text: {potential_move}", move=potential_move, source="regex")
+            return potential_move
+    
+    # If that fails, try without word boundaries (for cases like "move:e2e4")
+    move_match = re.search(r'([a-h][1-8][a-h][1-8][qrbn]?)', response_text.lower())
+    if move_match:
+        potential_move = move_match.group(1)
+        log_event("chess.candidate", f"🔍 Found potential move without word boundary: {potential_move}", move=potential_move)
+        if potential_move in legal_moves:
+            log_event("chess.move", f"✅ Extracted move from text: {potential_move}", move=potential_move, source="regex")
+            return potential_move
+    
+    # Last resort: check if the entire trimmed response is a valid move
+    cleaned_response = response_text.strip().lower()
+    if cleaned_response in legal_moves:
+        log_event("chess.move", f"✅ Entire response is a valid move: {cleaned_response}", move=cleaned_response, source="exact")
+        return cleaned_response
+    
+    log_event(
+        "chess.invalid_move",
+        f"❌ Could not extract valid move from response\n"
+        f"❌ Response text: '{response_text}'\n"
+        f"❌ First 10 legal moves were: {legal_moves[:10]}",
+        level="error", response=response_text, fen=fen,
+    )
+    return "invalid_move"
+
+
+def _free_moves_batch(items: list[_MoveJob]):
+    """Samples a few free-form tokens per position in one left-padded ``generate``."""
+    model_name = items[0].model_name
+    tokenizer = SUPPORTED_MODELS[model_name]["tokenizer"]
+    model = SUPPORTED_MODELS[model_name]["model"]
+
+    with metrics.stage("chess_move", "tokenize"):
+        prompts = [_encoded(job.position, model_name).prompt_ids for job in items]
+    for job in items:
+        log_event("chess.prompt", f"📝 Prompt sent to LM:\n{job.position.prompt}\n", prompt=job.position.prompt)
+
+    input_ids, attention_mask = left_pad(prompts, tokenizer.eos_token_id, model.device)
+    prompt_len = input_ids.shape[1]
+    # Generate response with minimal tokens
+    with torch.no_grad(), metrics.stage("chess_move", "forward"):
         outputs = model.generate(
-            **inputs,
+            input_ids=input_ids,
+            attention_mask=attention_mask,
             max_new_tokens=5,
             temperature=0.2,     # Slightly higher than 0.0, but still low
             do_sample=True,
@@ -129,56 +423,172 @@ async def make_chess_move(data: ChessStateInput):
             top_p=0.95,
             top_k=5,             # Highly constrain the token choice pool
         )
-        
+
+    moves = []
+    for row, job in enumerate(items):
         # Decode response
-        generated_tokens = outputs[0][inputs['input_ids'].shape[1]:]
-        response_text = tokenizer.decode(generated_tokens, skip_special_tokens=True).strip()
-        print(f"📝 LM Response:\n{response_text}\n")
-        print(f"🔍 Legal moves: {move_uci[:10]}...\n")  # Show first 10 legal moves
-        
-        # Extract JSON from response
-        response_json = extract_json_from_response(response_text)
-        
-        # If JSON extraction succeeds, validate the move
-        if response_json and "move" in response_json:
-            move = response_json["move"].strip().lower()
-            if move in move_uci:
-                print(f"✅ Valid move from JSON: {move}")
-                return ChessMoveOutput(move=move)
-            else:
-                print(f"⚠️ Move from JSON not in legal moves: {move}")
-        
-        # If JSON extraction fails or move invalid, try to extract move directly from text
-        # Look for UCI format moves (e.g., e2e4, g8h6) - try multiple patterns
-        
-        # First, try word boundary pattern
-        move_match = re.search(r'\b([a-h][1-8][a-h][1-8][qrbn]?)\b', response_text.lower())
-        if move_match:
-            potential_move = move_match.group(1)
-            print(f"🔍 Found potential move with word boundary: {potential_move}")
-            if potential_move in move_uci:
-                print(f"✅ Extracted move from text: {potential_move}")
-                return ChessMoveOutput(move=potential_move)
-        
-        # If that fails, try without word boundaries (for cases like "move:e2e4")
-        move_match = re.search(r'([a-h][1-8][a-h][1-8][qrbn]?)', response_text.lower())
-        if move_match:
-            potential_move = move_match.group(1)
-            print(f"🔍 Found potential move without word boundary: {potential_move}")
-            if potential_move in move_uci:
-                print(f"✅ Extracted move from text: {potential_move}")
-                return ChessMoveOutput(move=potential_move)
-        
-        # Last resort: check if the entire trimmed response is a valid move
-        cleaned_response = response_text.strip().lower()
-        if cleaned_response in move_uci:
-            print(f"✅ Entire response is a valid move: {cleaned_response}")
-            return ChessMoveOutput(move=cleaned_response)
-        
-        print(f"❌ Could not extract valid move from response")
-        print(f"❌ Response text: '{response_text}'")
-        print(f"❌ First 10 legal moves were: {move_uci[:10]}")
-        return ChessMoveOutput(move="invalid_move")
-        
+        response_text = tokenizer.decode(outputs[row, prompt_len:], skip_special_tokens=True).strip()
+        log_event(
+            "chess.response",
+            f"📝 LM Response:\n{response_text}\n\n🔍 Legal moves: {job.position.legal_moves[:10]}...\n",  # Show first 10 legal moves
+            response=response_text,
+        )
+        moves.append(_salvage_move(response_text, job.position.legal_moves, job.position.fen))
+    return moves
+
+
+_MOVE_BATCH_FNS = {"constrained": _choose_moves_batch, "free": _free_moves_batch}
+
+
+# API Endpoint takes in the current FEN and calls the LM to get the next move
+@router.post("/make_move")
+async def make_chess_move(data: ChessStateInput):
+    """API endpoint to make a chess move given FEN and UCI move."""
+    fen = data.fen
+    position = _position(fen) if fen else None
+    move_uci = position.legal_moves if position is not None else []
+    log_event("chess.legal_moves", f"Moves UCI: {move_uci}", fen=fen, legal_moves=len(move_uci))
+    if not fen or not move_uci:
+        return ChessMoveOutput(move="game_over")
+    # 1. Select LM components based on input
+    if data.model_name not in SUPPORTED_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported model: {data.model_name}. Supported models are: {list(SUPPORTED_MODELS.keys())}"
+        )
+
+    log_event("chess.request", f"♟️ Chess move request for FEN: '{fen}' using {data.model_name}", fen=fen, model=data.model_name)
+    try:
+        move = await run_batched(_MOVE_BATCH_FNS[data.decoding], data.model_name, _MoveJob(position, data.model_name))
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Issue with Calling LM: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Issue with Calling LM: {e}")
+    if data.decoding == "constrained":
+        log_event("chess.move", f"✅ Constrained move: {move}", move=move, source="constrained")
+    return ChessMoveOutput(move=move)
+
+
+# --- LM-vs-LM self-play ---
+# Every game is a coroutine asking the micro-batcher for its next move, so the
+# moves of all games on the same turn share one batched forward pass.
+
+MAX_SELFPLAY_GAMES = int(os.getenv("CHESS_MAX_SELFPLAY_GAMES", 64))
+
+class SelfPlayInput(BaseModel):
+    white_model: str = "GPT-2"
+    black_model: str = "GPT-2"
+    games: int = 8
+    max_plies: int = 200
+    decoding: MoveDecoding = "constrained"
+    alternate_colors: bool = True  # swap models in every other game
+    start_fen: str = chess.STARTING_FEN
+    seed: int | None = None
+
+class SelfPlayGame(BaseModel):
+    white: str
+    black: str
+    result: str
+    termination: str
+    plies: int
+    illegal_moves: int
+    pgn: str
+
+class SelfPlayOutput(BaseModel):
+    games: list[SelfPlayGame]
+    total_moves: int
+    illegal_moves: int
+    illegal_move_rate: float
+    move_latency_ms: dict[str, float]  # p50 / p95 / mean time a game waited for its move
+    moves_per_second: float
+    wall_seconds: float
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def _play_game(round_no: int, white: str, black: str, req: SelfPlayInput, rng, latencies: list[float]) -> SelfPlayGame:
+    board = chess.Board(req.start_fen)
+    illegal = 0
+    plies = 0
+    while plies < req.max_plies and not board.is_game_over(claim_draw=True):
+        model_name = white if board.turn == chess.WHITE else black
+        position = _position(board.fen())
+        start = time.perf_counter()
+        move = await run_batched(_MOVE_BATCH_FNS[req.decoding], model_name, _MoveJob(position, model_name))
+        latencies.append(time.perf_counter() - start)
+        if move not in position.legal_moves:
+            # Count it and keep the game going with a random legal move
+            illegal += 1
+            move = rng.choice(position.legal_moves)
+        board.push_uci(move)
+        plies += 1
+
+    outcome = board.outcome(claim_draw=True)
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "LM self-play"
+    game.headers["Round"] = str(round_no)
+    game.headers["White"] = white
+    game.headers["Black"] = black
+    game.headers["Result"] = outcome.result() if outcome else "*"
+    return SelfPlayGame(
+        white=white,
+        black=black,
+        result=game.headers["Result"],
+        termination=outcome.termination.name.lower() if outcome else "max_plies",
+        plies=plies,
+        illegal_moves=illegal,
+        pgn=str(game),
+    )
+
+
+async def run_selfplay(req: SelfPlayInput) -> SelfPlayOutput:
+    """Plays ``req.games`` games concurrently and aggregates their statistics."""
+    for name in (req.white_model, req.black_model):
+        if name not in SUPPORTED_MODELS:
+            raise HTTPException(status_code=400, detail=f"Unsupported model: {name}. Supported models are: {list(SUPPORTED_MODELS.keys())}")
+    try:
+        chess.Board(req.start_fen)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start FEN.")
+
+    rng = random.Random(req.seed)
+    latencies: list[float] = []
+    pairings = [
+        (req.black_model, req.white_model) if req.alternate_colors and i % 2 else (req.white_model, req.black_model)
+        for i in range(req.games)
+    ]
+    log_event("chess.selfplay", f"♟️ Self-play: {req.games} game(s), {req.white_model} vs {req.black_model}", games=req.games)
+    start = time.perf_counter()
+    games = await asyncio.gather(*(
+        _play_game(i + 1, white, black, req, rng, latencies) for i, (white, black) in enumerate(pairings)
+    ))
+    wall = time.perf_counter() - start
+
+    total_moves = len(latencies)
+    illegal = sum(g.illegal_moves for g in games)
+    latencies.sort()
+    return SelfPlayOutput(
+        games=list(games),
+        total_moves=total_moves,
+        illegal_moves=illegal,
+        illegal_move_rate=round(illegal / total_moves, 4) if total_moves else 0.0,
+        move_latency_ms={
+            "p50": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(_percentile(latencies, 0.95) * 1000, 2),
+            "mean": round(sum(latencies) / total_moves * 1000, 2) if total_moves else 0.0,
+        },
+        moves_per_second=round(total_moves / wall, 2) if wall > 0 else 0.0,
+        wall_seconds=round(wall, 2),
+    )
+
+
+@router.post("/selfplay", response_model=SelfPlayOutput)
+async def chess_selfplay(data: SelfPlayInput):
+    """Plays LM-vs-LM games against local models and returns PGNs and statistics."""
+    if not 1 <= data.games <= MAX_SELFPLAY_GAMES:
+        raise HTTPException(status_code=400, detail=f"games must be between 1 and {MAX_SELFPLAY_GAMES}.")
+    return await run_selfplay(data)
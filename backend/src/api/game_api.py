@@ -6,29 +6,67 @@ Works across any number of backend replicas without sticky sessions.
 
 from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException
-import torch
-import torch.nn.functional as F
 import numpy as np
 import random
 import hmac
 import hashlib
 import base64
+import os
+import functools
+import threading
 
 import nltk
 from nltk.stem import WordNetLemmatizer
 from nltk.corpus import wordnet as wn
 
 from ..models import SUPPORTED_MODELS
+from ..lru import LRUCache
+from ..ann import IVFIndex
+from ..word_embeddings import (
+    EMBEDDING_BACKENDS, STORAGE_DTYPES, Int8Matrix, backend_key, build_matrix, load_matrix, score
+)
+from ..artifacts import (
+    artifact_dir, fingerprint, load_json, load_npy, save_json, save_npy, tokenizer_fingerprint
+)
 
 # ------------------------------------------------------------------ #
 #  NLTK data
 # ------------------------------------------------------------------ #
 
-nltk.download("wordnet", quiet=True)
+_wordnet_lock = threading.Lock()
+_wordnet_ready = False
+
+
+def _wordnet():
+    """WordNet, loaded on first use.
+
+    Startup doesn't pay for the corpus; the first guess that needs a lemma
+    does, once. The lock keeps concurrent first requests from racing the lazy
+    corpus loader, which is not safe to first-touch from several threads. The
+    Docker image bakes the corpus in; elsewhere it is downloaded here.
+    """
+    global _wordnet_ready
+    if not _wordnet_ready:
+        with _wordnet_lock:
+            if not _wordnet_ready:
+                try:
+                    nltk.data.find("corpora/wordnet")
+                except LookupError:
+                    print("Word Game: WordNet not found, downloading…")
+                    if not nltk.download("wordnet", quiet=True):
+                        raise RuntimeError(
+                            "WordNet is missing and could not be downloaded; run `python -m nltk.downloader wordnet`"
+                        )
+                wn.ensure_loaded()
+                _wordnet_ready = True
+    return wn
+
+
 _lemmatizer = WordNetLemmatizer()
 
 
 def _lemmatize(word: str) -> str:
+    _wordnet()
     candidates = set()
     for pos in ("v", "n", "a", "r"):
         candidates.add(_lemmatizer.lemmatize(word, pos=pos))
@@ -95,7 +133,7 @@ _DEFAULT_CATEGORY = "General"
 
 
 def _get_category(word: str) -> str:
-    synsets = wn.synsets(word)
+    synsets = _wordnet().synsets(word)
     if not synsets:
         return _DEFAULT_CATEGORY
     return _LEXNAME_TO_CATEGORY.get(synsets[0].lexname(), _DEFAULT_CATEGORY)
@@ -108,17 +146,17 @@ def _get_category(word: str) -> str:
 router = APIRouter(prefix="/game", tags=["Word Game APIs"])
 
 # ------------------------------------------------------------------ #
-#  Build lemmatised vocabulary
+#  Build lemmatised vocabulary (cached on disk between starts)
 # ------------------------------------------------------------------ #
 
-print("Word Game: building lemmatised vocabulary…")
+# Bump when the vocabulary build below changes
+VOCAB_VERSION = 3
 
-_tokenizer = SUPPORTED_MODELS["GPT-2"]["tokenizer"]
-_model = SUPPORTED_MODELS["GPT-2"]["model"]
-_embedding_weights = _model.transformer.wte.weight.detach().float()
+_tokenizer = SUPPORTED_MODELS.tokenizer("GPT-2")
 
 
-def _build_lemma_groups() -> dict[str, list[int]]:
+def _build_lemma_groups(surface_forms: dict[str, str]) -> dict[str, list[int]]:
+    """Groups vocab token ids by lemma, recording each surface word's lemma."""
     vocab = _tokenizer.get_vocab()
     groups: dict[str, list[int]] = {}
     for token_str, token_id in vocab.items():
@@ -132,31 +170,167 @@ def _build_lemma_groups() -> dict[str, list[int]]:
         lemma = _lemmatize(word)
         if len(lemma) < 3:
             continue
+        surface_forms[word] = lemma
         groups.setdefault(lemma, []).append(token_id)
     return groups
 
 
-_lemma_groups = _build_lemma_groups()
+def _build_inflections(surface_forms: dict[str, str], words: list[str]) -> dict[str, str]:
+    """surface form -> lemma for every known inflection that lands in the vocabulary.
+
+    Covers the vocab words themselves, the lemmas, and WordNet's irregular
+    forms (e.g. "geese"), so normal guesses never need a WordNet call.
+    """
+    known = set(words)
+    inflections = {form: lemma for form, lemma in surface_forms.items() if lemma in known}
+    exception_forms = {
+        form
+        for exceptions in getattr(_wordnet(), "_exception_map", {}).values()
+        for form in exceptions
+        if form.isalpha() and form.islower()
+    }
+    for form in known | exception_forms:
+        if form not in inflections:
+            lemma = _lemmatize(form)
+            if lemma in known:
+                inflections[form] = lemma
+    return inflections
+
+
+def _build_vocabulary() -> dict:
+    print("Word Game: building lemmatised vocabulary…")
+    surface_forms: dict[str, str] = {}
+    lemma_groups = _build_lemma_groups(surface_forms)
+    words = list(lemma_groups.keys())
+
+    print("Word Game: assigning categories…")
+    lengths = [len(ids) for ids in lemma_groups.values()]
+    return {
+        "words": words,
+        "categories": [_get_category(w) for w in words],
+        "inflections": _build_inflections(surface_forms, words),
+        "lemma_ids": np.array([tid for ids in lemma_groups.values() for tid in ids], dtype=np.int32),
+        "lemma_offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+    }
+
+
+_VOCAB_ARRAYS = ("lemma_ids", "lemma_offsets")
+
+# The vocabulary depends only on the tokenizer; the revision keeps artifacts of
+# different model releases apart without touching the weights
+VOCAB_KEY = fingerprint(
+    VOCAB_VERSION, tokenizer_fingerprint(_tokenizer), SUPPORTED_MODELS.revision("GPT-2")
+)
+
+
+def _load_vocabulary() -> dict:
+    """Memory-maps the cached vocabulary artifact, building and saving it on a miss."""
+    directory = artifact_dir("word_game_vocab", VOCAB_KEY)
+    meta = load_json(directory / "vocab.json")
+    arrays = {name: load_npy(directory / f"{name}.npy") for name in _VOCAB_ARRAYS}
+    if (
+        meta is not None
+        and all(a is not None for a in arrays.values())
+        and len(arrays["lemma_offsets"]) == len(meta["words"]) + 1
+    ):
+        return {**meta, **arrays}
+
+    vocab = _build_vocabulary()
+    try:
+        for name in _VOCAB_ARRAYS:
+            save_npy(directory / f"{name}.npy", vocab[name])
+        save_json(
+            directory / "vocab.json",
+            {key: vocab[key] for key in ("words", "categories", "inflections")},
+        )
+    except OSError as e:
+        print(f"Word Game: vocabulary cache not written ({e}).")
+    return vocab
+
 
-WORD_NAMES: list[str] = list(_lemma_groups.keys())
+_vocab = _load_vocabulary()
+
+WORD_NAMES: list[str] = _vocab["words"]
 WORD_TO_IDX: dict[str, int] = {w: i for i, w in enumerate(WORD_NAMES)}
 
-_avg_embeddings = torch.stack(
-    [_embedding_weights[ids].mean(dim=0) for ids in _lemma_groups.values()]
-)
-_word_embeddings_norm = F.normalize(_avg_embeddings, p=2, dim=1)
+_lemma_ids: np.ndarray = _vocab["lemma_ids"]
+_lemma_offsets: np.ndarray = _vocab["lemma_offsets"]
 
 TOTAL_WORDS = len(WORD_NAMES)
 
-print("Word Game: assigning categories…")
-WORD_CATEGORIES: list[str] = [_get_category(w) for w in WORD_NAMES]
+WORD_CATEGORIES: list[str] = _vocab["categories"]
+_inflections: dict[str, str] = _vocab["inflections"]
 print(
     f"Word Game: {TOTAL_WORDS} words loaded across "
     f"{len(set(WORD_CATEGORIES))} categories."
 )
 
+# ------------------------------------------------------------------ #
+#  Embedding matrices (one memory-mapped file per backend)
+# ------------------------------------------------------------------ #
+
+DEFAULT_EMBEDDING_BACKEND = os.getenv("WORD_GAME_EMBEDDING_BACKEND", "static")
+# float16 | int8 | float32; scoring runs directly on the stored form
+EMBEDDING_STORAGE = os.getenv("WORD_GAME_EMBEDDING_STORAGE", "float16")
+if EMBEDDING_STORAGE not in STORAGE_DTYPES:
+    raise ValueError(f"WORD_GAME_EMBEDDING_STORAGE must be one of {STORAGE_DTYPES}")
+# Serve prebuilt matrices only, so the transformer is never loaded
+GAME_ONLY = os.getenv("DMLM_GAME_ONLY", "0") == "1"
+
+_embedding_matrices: dict[str, np.ndarray | Int8Matrix] = {}
+
+
+def _embeddings(backend: str) -> np.ndarray | Int8Matrix:
+    """Normalized [TOTAL_WORDS, dim] matrix for ``backend``, mapped from disk once."""
+    matrix = _embedding_matrices.get(backend)
+    if matrix is not None:
+        return matrix
+    spec = EMBEDDING_BACKENDS.get(backend)
+    if spec is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown embedding backend '{backend}'. Available: {sorted(EMBEDDING_BACKENDS)}",
+        )
+    matrix = load_matrix(VOCAB_KEY, spec, TOTAL_WORDS, EMBEDDING_STORAGE)
+    if matrix is None:
+        if not spec.on_demand or GAME_ONLY:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Embeddings for '{backend}' are not built; run `python build_embeddings.py --backend {backend}`.",
+            )
+        print(f"Word Game: computing {backend} embeddings…")
+        matrix = build_matrix(VOCAB_KEY, spec, _vocab, storage=EMBEDDING_STORAGE)
+    _embedding_matrices[backend] = matrix
+    return matrix
+
+
+try:
+    _embeddings(DEFAULT_EMBEDDING_BACKEND)
+    print(f"Word Game: serving '{DEFAULT_EMBEDDING_BACKEND}' embeddings as {EMBEDDING_STORAGE}.")
+except HTTPException as e:
+    if GAME_ONLY:
+        raise RuntimeError(f"Game-only mode needs prebuilt embeddings: {e.detail}") from None
+    print(f"Word Game: default embedding backend unavailable ({e.detail})")
+
 HINT_FACTOR = 0.10
 
+# Upper bound on words per /guess_batch request
+MAX_BATCH_GUESSES = int(os.getenv("WORD_GAME_MAX_BATCH_GUESSES", 1000))
+
+# Out-of-table guesses still go through WordNet, but each only once
+LEMMA_CACHE_SIZE = int(os.getenv("WORD_GAME_LEMMA_CACHE_SIZE", 4096))
+
+
+@functools.lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _lemmatize_cached(word: str) -> str:
+    return _lemmatize(word)
+
+
+def _normalize_word(word: str) -> str:
+    """Lemma of a guess: precomputed inflection table first, bounded LRU otherwise."""
+    lemma = _inflections.get(word)
+    return lemma if lemma is not None else _lemmatize_cached(word)
+
 # ------------------------------------------------------------------ #
 #  Stateless game-id token  (HMAC-signed target index)
 # ------------------------------------------------------------------ #
@@ -188,18 +362,156 @@ def _decode_game_id(game_id: str) -> int:
 
 
 # ------------------------------------------------------------------ #
-#  Helpers (recomputed per request — fast for 10k words)
+#  Per-target similarity index
 # ------------------------------------------------------------------ #
 
+SIMILARITY_INDEX_CACHE_SIZE = int(os.getenv("WORD_GAME_INDEX_CACHE_SIZE", 256))
+PERSIST_SIMILARITY_INDEX = os.getenv("WORD_GAME_PERSIST_INDEX", "0") == "1"
+
+
+def _compute_similarities(backend: str, target_idx: int) -> np.ndarray:
+    matrix = _embeddings(backend)
+    return score(matrix, matrix[target_idx])
+
+
+class _TargetIndex:
+    """Similarities to one target, pre-sorted so guesses and hints avoid full scans."""
+
+    def __init__(self, sims: np.ndarray, order: np.ndarray, sorted_sims: np.ndarray, ranks: np.ndarray):
+        self.sims = sims                # [N] similarity by word index
+        self.order = order              # word indices by ascending similarity
+        self.sorted_sims = sorted_sims  # sims[order]
+        self.ranks = ranks              # [N] 1-based rank by word index
+
+    @classmethod
+    def build(cls, sims: np.ndarray) -> "_TargetIndex":
+        sims = np.ascontiguousarray(sims, dtype=np.float32)
+        order = np.argsort(sims, kind="stable").astype(np.int32)
+        sorted_sims = sims[order]
+        # 1-based rank: how many words have strictly higher similarity + 1
+        higher = len(sims) - np.searchsorted(sorted_sims, sorted_sims, side="right")
+        ranks = np.empty(len(sims), dtype=np.int32)
+        ranks[order] = higher + 1
+        return cls(sims, order, sorted_sims, ranks)
+
+    def closest_to(self, goal: float, excluded: set[int]) -> int:
+        """Word whose similarity is nearest ``goal``, skipping ``excluded`` indices."""
+        hi = int(np.searchsorted(self.sorted_sims, goal))
+        lo = hi - 1
+        n = len(self.order)
+        while lo >= 0 or hi < n:
+            take_hi = lo < 0 or (hi < n and self.sorted_sims[hi] - goal <= goal - self.sorted_sims[lo])
+            pos = hi if take_hi else lo
+            if take_hi:
+                hi += 1
+            else:
+                lo -= 1
+            idx = int(self.order[pos])
+            if idx not in excluded:
+                return idx
+        raise HTTPException(status_code=400, detail="No hint available.")
+
+    _FIELDS = ("sims", "order", "sorted_sims", "ranks")
+
+    def save(self, directory) -> None:
+        for name in self._FIELDS:
+            save_npy(directory / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, directory) -> "_TargetIndex | None":
+        arrays = [load_npy(directory / f"{name}.npy") for name in cls._FIELDS]
+        if any(a is None or len(a) != TOTAL_WORDS for a in arrays):
+            return None
+        return cls(*arrays)
+
+
+_similarity_indexes = LRUCache(max_entries=SIMILARITY_INDEX_CACHE_SIZE)
+
+
+def _similarity_index(target_idx: int, backend: str = DEFAULT_EMBEDDING_BACKEND) -> _TargetIndex:
+    """LRU-cached index for ``target_idx``; memory-mapped from disk when persisted."""
+    index = _similarity_indexes.get((backend, target_idx))
+    if index is not None:
+        return index
+    target_dir = None
+    if PERSIST_SIMILARITY_INDEX and backend in EMBEDDING_BACKENDS:
+        # Rankings depend on the stored form the similarities were computed from
+        key = fingerprint(backend_key(VOCAB_KEY, EMBEDDING_BACKENDS[backend]), EMBEDDING_STORAGE)
+        target_dir = artifact_dir("word_game_index", key) / str(target_idx)
+    if target_dir is not None:
+        index = _TargetIndex.load(target_dir)
+    if index is None:
+        index = _TargetIndex.build(_compute_similarities(backend, target_idx))
+        if target_dir is not None:
+            try:
+                index.save(target_dir)
+            except OSError as e:
+                print(f"Word Game: similarity index not persisted ({e}).")
+    _similarity_indexes.put((backend, target_idx), index)
+    return index
 
-def _compute_similarities(target_idx: int) -> np.ndarray:
-    target_emb = _word_embeddings_norm[target_idx]
-    return torch.mv(_word_embeddings_norm, target_emb).numpy()
 
+# ------------------------------------------------------------------ #
+#  Nearest-neighbour index
+# ------------------------------------------------------------------ #
 
-def _rank_of(sims: np.ndarray, word_idx: int) -> int:
-    """1-based rank: how many words have strictly higher similarity + 1."""
-    return int((sims > sims[word_idx]).sum()) + 1
+ANN_LISTS = int(os.getenv("WORD_GAME_ANN_LISTS", 0)) or IVFIndex.default_n_lists(TOTAL_WORDS)
+# Probe count per lookup; 0 picks the fewest probes whose recall@ANN_RECALL_K,
+# measured against exact search when the index is built, meets the target
+ANN_PROBES = int(os.getenv("WORD_GAME_ANN_PROBES", 0))
+ANN_RECALL_TARGET = float(os.getenv("WORD_GAME_ANN_RECALL_TARGET", 0.95))
+ANN_RECALL_K = 10
+MAX_NEIGHBORS = 100
+
+_ann_indexes: dict[str, tuple[IVFIndex, int]] = {}
+
+
+def _neighbor_index(backend: str) -> tuple[IVFIndex, int]:
+    """IVF index over one backend's matrix and its probe count, built on first use and persisted."""
+    cached = _ann_indexes.get(backend)
+    if cached is not None:
+        return cached
+    matrix = _embeddings(backend)
+    key = backend_key(VOCAB_KEY, EMBEDDING_BACKENDS[backend])
+    directory = artifact_dir("word_game_ann", fingerprint(key, EMBEDDING_STORAGE, ANN_LISTS))
+    index = IVFIndex.load(directory, TOTAL_WORDS)
+    if index is None:
+        index = IVFIndex.build(matrix, n_lists=ANN_LISTS)
+        try:
+            index.save(directory)
+        except OSError as e:
+            print(f"Word Game: neighbour index not persisted ({e}).")
+
+    n_probe = ANN_PROBES
+    if not n_probe:
+        tuning_path = directory / f"probes-{ANN_RECALL_TARGET}-{ANN_RECALL_K}.json"
+        tuned = load_json(tuning_path)
+        if tuned is None:
+            n_probe, recall = index.tune_n_probe(matrix, ANN_RECALL_TARGET, ANN_RECALL_K)
+            tuned = {"n_probe": n_probe, "recall": recall}
+            print(f"Word Game: {backend} neighbours probe {n_probe}/{index.n_lists} lists "
+                  f"(recall@{ANN_RECALL_K} {recall:.3f}).")
+            try:
+                save_json(tuning_path, tuned)
+            except OSError as e:
+                print(f"Word Game: probe count not persisted ({e}).")
+        n_probe = tuned["n_probe"]
+    _ann_indexes[backend] = (index, n_probe)
+    return index, n_probe
+
+
+def _nearest_words(idx: int, n: int, backend: str) -> list[tuple[int, float]]:
+    matrix = _embeddings(backend)
+    index, n_probe = _neighbor_index(backend)
+    ids, scores = index.search(matrix, matrix[idx], n, n_probe, exclude={idx})
+    return list(zip(ids.tolist(), scores.tolist()))
+
+
+def _target_neighbors(target_idx: int, n: int, backend: str) -> list[tuple[int, float]]:
+    """Exact closest words to the target, read off its pre-sorted similarity index."""
+    index = _similarity_index(target_idx, backend)
+    closest = [int(i) for i in index.order[::-1][:n + 1] if i != target_idx][:n]
+    return [(i, float(index.sims[i])) for i in closest]
 
 
 def _percentile_of(rank: int) -> float:
@@ -225,6 +537,42 @@ def _hot_cold(rank: int) -> str:
     return "🧊 Freezing"
 
 
+def _unknown_word_message(raw: str, word: str) -> str:
+    if word != raw:
+        return f"'{raw}' (base form: '{word}') is not in the vocabulary."
+    return f"'{raw}' is not in the vocabulary."
+
+
+def _score_guesses(target_idx: int, guesses: list[tuple[str, str]], backend: str) -> list["GuessResponse"]:
+    """Scores in-vocabulary ``(raw, word)`` guesses against one target.
+
+    Similarities and ranks for the whole list are gathered from the target's
+    similarity index in one fancy-indexing step.
+    """
+    if not guesses:
+        return []
+    index = _similarity_index(target_idx, backend)
+    idxs = np.fromiter((WORD_TO_IDX[word] for _, word in guesses), dtype=np.int64, count=len(guesses))
+    similarities = np.round(index.sims[idxs].astype(np.float64) * 100, 2).tolist()
+    ranks = index.ranks[idxs].tolist()
+    target_category = WORD_CATEGORIES[target_idx]
+
+    responses = []
+    for (raw, word), idx, similarity, rank in zip(guesses, idxs.tolist(), similarities, ranks):
+        word_category = WORD_CATEGORIES[idx]
+        responses.append(GuessResponse(
+            word=word,
+            input_word=raw,
+            similarity=similarity,
+            percentile=_percentile_of(rank),
+            hot_cold=_hot_cold(rank),
+            is_correct=idx == target_idx,
+            word_category=word_category,
+            category_match=word_category == target_category,
+        ))
+    return responses
+
+
 # ------------------------------------------------------------------ #
 #  Schemas
 # ------------------------------------------------------------------ #
@@ -239,6 +587,7 @@ class StartGameResponse(BaseModel):
 class GuessRequest(BaseModel):
     game_id: str
     word: str
+    backend: str = DEFAULT_EMBEDDING_BACKEND
 
 
 class GuessResponse(BaseModel):
@@ -252,10 +601,27 @@ class GuessResponse(BaseModel):
     category_match: bool
 
 
+class GuessBatchRequest(BaseModel):
+    game_id: str
+    words: list[str]
+    backend: str = DEFAULT_EMBEDDING_BACKEND
+
+
+class GuessBatchItem(BaseModel):
+    input_word: str
+    result: GuessResponse | None = None
+    error: str | None = None
+
+
+class GuessBatchResponse(BaseModel):
+    results: list[GuessBatchItem]
+
+
 class HintRequest(BaseModel):
     game_id: str
     last_guess: str
     previous_guesses: list[str] = []
+    backend: str = DEFAULT_EMBEDDING_BACKEND
 
 
 class HintResponse(BaseModel):
@@ -263,6 +629,30 @@ class HintResponse(BaseModel):
     hint_similarity: float
 
 
+class NeighborsRequest(BaseModel):
+    game_id: str
+    word: str | None = None  # defaults to the target word
+    n: int = 10
+    backend: str = DEFAULT_EMBEDDING_BACKEND
+
+
+class Neighbor(BaseModel):
+    word: str
+    similarity: float
+
+
+class NeighborsResponse(BaseModel):
+    word: str
+    neighbors: list[Neighbor]
+
+
+class EmbeddingBackendInfo(BaseModel):
+    name: str
+    model_name: str
+    description: str
+    available: bool
+
+
 class GiveUpRequest(BaseModel):
     game_id: str
 
@@ -276,6 +666,24 @@ class GiveUpResponse(BaseModel):
 # ------------------------------------------------------------------ #
 
 
+@router.get("/backends", response_model=list[EmbeddingBackendInfo])
+async def list_backends():
+    """Registered embedding backends and whether their matrix can be served."""
+    return [
+        EmbeddingBackendInfo(
+            name=spec.name,
+            model_name=spec.model_name,
+            description=spec.description,
+            available=(
+                spec.name in _embedding_matrices
+                or (spec.on_demand and not GAME_ONLY)
+                or load_matrix(VOCAB_KEY, spec, TOTAL_WORDS) is not None
+            ),
+        )
+        for spec in EMBEDDING_BACKENDS.values()
+    ]
+
+
 @router.post("/start", response_model=StartGameResponse)
 async def start_game():
     target_idx = random.randint(0, TOTAL_WORDS - 1)
@@ -293,64 +701,89 @@ async def submit_guess(req: GuessRequest):
     target_idx = _decode_game_id(req.game_id)
 
     raw = req.word.lower().strip()
-    word = _lemmatize(raw)
+    word = _normalize_word(raw)
 
     if word not in WORD_TO_IDX:
-        msg = f"'{raw}' is not in the vocabulary."
-        if word != raw:
-            msg = f"'{raw}' (base form: '{word}') is not in the vocabulary."
-        raise HTTPException(status_code=400, detail=msg)
-
-    idx = WORD_TO_IDX[word]
-    sims = _compute_similarities(target_idx)
-
-    similarity = round(float(sims[idx]) * 100, 2)
-    rank = _rank_of(sims, idx)
-    percentile = _percentile_of(rank)
-    hot_cold_label = _hot_cold(rank)
-    word_category = WORD_CATEGORIES[idx]
-    category_match = word_category == WORD_CATEGORIES[target_idx]
-    is_correct = idx == target_idx
-
-    return GuessResponse(
-        word=word,
-        input_word=raw,
-        similarity=similarity,
-        percentile=percentile,
-        hot_cold=hot_cold_label,
-        is_correct=is_correct,
-        word_category=word_category,
-        category_match=category_match,
-    )
+        raise HTTPException(status_code=400, detail=_unknown_word_message(raw, word))
+
+    return _score_guesses(target_idx, [(raw, word)], req.backend)[0]
+
+
+@router.post("/guess_batch", response_model=GuessBatchResponse)
+async def submit_guess_batch(req: GuessBatchRequest):
+    target_idx = _decode_game_id(req.game_id)
+    if len(req.words) > MAX_BATCH_GUESSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_GUESSES} words per batch (got {len(req.words)}).",
+        )
+
+    results: list[GuessBatchItem] = []
+    known: list[tuple[int, str, str]] = []  # (position in results, raw, word)
+    for raw in (w.lower().strip() for w in req.words):
+        word = _normalize_word(raw)
+        if word in WORD_TO_IDX:
+            known.append((len(results), raw, word))
+            results.append(GuessBatchItem(input_word=raw))
+        else:
+            results.append(GuessBatchItem(input_word=raw, error=_unknown_word_message(raw, word)))
+
+    scored = _score_guesses(target_idx, [(raw, word) for _, raw, word in known], req.backend)
+    for (pos, _, _), guess in zip(known, scored):
+        results[pos].result = guess
+
+    return GuessBatchResponse(results=results)
 
 
 @router.post("/hint", response_model=HintResponse)
 async def get_hint(req: HintRequest):
     target_idx = _decode_game_id(req.game_id)
 
-    last_word = _lemmatize(req.last_guess.lower().strip())
+    last_word = _normalize_word(req.last_guess.lower().strip())
     if last_word not in WORD_TO_IDX:
         raise HTTPException(status_code=400, detail="Last guess not recognised.")
 
-    sims = _compute_similarities(target_idx)
+    index = _similarity_index(target_idx, req.backend)
 
     last_idx = WORD_TO_IDX[last_word]
-    current_sim = float(sims[last_idx])
+    current_sim = float(index.sims[last_idx])
     goal_sim = current_sim + HINT_FACTOR * (1.0 - current_sim)
 
-    diffs = np.abs(sims - goal_sim)
-    diffs[target_idx] = np.inf
-
+    excluded = {target_idx}
     for w in req.previous_guesses:
-        lemma = _lemmatize(w.lower().strip())
+        lemma = _normalize_word(w.lower().strip())
         if lemma in WORD_TO_IDX:
-            diffs[WORD_TO_IDX[lemma]] = np.inf
+            excluded.add(WORD_TO_IDX[lemma])
 
-    hint_idx = int(np.argmin(diffs))
-    hint_sim = round(float(sims[hint_idx]) * 100, 2)
+    hint_idx = index.closest_to(goal_sim, excluded)
+    hint_sim = round(float(index.sims[hint_idx]) * 100, 2)
     return HintResponse(hint_word=WORD_NAMES[hint_idx], hint_similarity=hint_sim)
 
 
+@router.post("/neighbors", response_model=NeighborsResponse)
+async def get_neighbors(req: NeighborsRequest):
+    """Closest words to the target (for the post-game reveal) or to any word."""
+    target_idx = _decode_game_id(req.game_id)
+
+    if req.word is None:
+        idx = target_idx
+    else:
+        raw = req.word.lower().strip()
+        word = _normalize_word(raw)
+        if word not in WORD_TO_IDX:
+            raise HTTPException(status_code=400, detail=_unknown_word_message(raw, word))
+        idx = WORD_TO_IDX[word]
+
+    n = max(1, min(req.n, MAX_NEIGHBORS))
+    neighbors = [
+        Neighbor(word=WORD_NAMES[i], similarity=round(sim * 100, 2))
+        for i, sim in (
+            _target_neighbors(idx, n, req.backend) if idx == target_idx else _nearest_words(idx, n, req.backend)
+        )
+    ]
+    return NeighborsResponse(word=WORD_NAMES[idx], neighbors=neighbors)
+
+
 @router.post("/give_up", response_model=GiveUpResponse)
 async def give_up(req: GiveUpRequest):
     target_idx = _decode_game_id(req.game_id)
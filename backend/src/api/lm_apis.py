@@ -1,32 +1,71 @@
 from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from transformers import pipeline, GPT2Tokenizer, GPT2LMHeadModel, AutoTokenizer
+from transformers import StoppingCriteria, StoppingCriteriaList
 import torch
 from fastapi import HTTPException
-from typing import Literal, Optional
+from typing import Any, Callable, Literal, Optional
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 import threading
+import json
+import os
 from ..models import SUPPORTED_MODELS
+from ..prefix_cache import PrefixCache, forward_batch_with_cache, left_pad
+from ..batching import MicroBatcher
+from .. import metrics
+from ..logs import log_event
+import time
 
 # Thread pool for inference tasks
 _executor = ThreadPoolExecutor(max_workers=4)
 
-# Lock to prevent race conditions during PyTorch inference
-_model_lock = threading.Lock()
+# Concurrent inference requests are collected into batches; batches run one at
+# a time, which also keeps PyTorch inference free of race conditions
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 16))
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", 5.0))
+_batcher = MicroBatcher(_executor, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_WINDOW_MS)
 
 # Timeout in seconds before returning a 503
 INFERENCE_TIMEOUT = 20.0
 
+# KV-cache of prompt prefixes so search-tree expansions run one incremental step
+PREFIX_CACHE_MAX_BYTES = int(os.getenv("PREFIX_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+_prefix_cache = PrefixCache(max_bytes=PREFIX_CACHE_MAX_BYTES)
+
 # Helper to run blocking calls off the event loop with timeout
 async def run_in_thread(fn, *args):
     loop = asyncio.get_event_loop()
+    endpoint = fn.__name__.strip("_")
+    submitted_at = time.perf_counter()
+
+    def timed():
+        metrics.QUEUE_WAIT.observe(time.perf_counter() - submitted_at, endpoint=endpoint)
+        return fn(*args)
+
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(_executor, timed),
+            timeout=INFERENCE_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        metrics.INFERENCE_TIMEOUTS.inc(endpoint=endpoint)
+        raise HTTPException(
+            status_code=503,
+            detail=f"Inference timeout after {INFERENCE_TIMEOUT}s, server is under load. Please try again."
+        )
+
+# Helper to run an item through the micro-batcher with the same timeout
+async def run_batched(batch_fn, key, item):
     try:
         return await asyncio.wait_for(
-            loop.run_in_executor(_executor, fn, *args),
+            _batcher.submit(batch_fn, key, item),
             timeout=INFERENCE_TIMEOUT
         )
     except asyncio.TimeoutError:
+        metrics.INFERENCE_TIMEOUTS.inc(endpoint=batch_fn.__name__.strip("_"))
         raise HTTPException(
             status_code=503,
             detail=f"Inference timeout after {INFERENCE_TIMEOUT}s, server is under load. Please try again."
@@ -62,9 +101,17 @@ class StepData(BaseModel):
     chosen_token: str
     chosen_token_id: int
 
+class BeamData(BaseModel):
+    text: str
+    score: float  # length-normalized cumulative logprob
+    logprob: float
+    finished: bool
+    steps: list[StepData]
+
 class IterativeGenerationResponse(BaseModel):
     generated_text: str
     steps: list[StepData]
+    beams: Optional[list[BeamData]] = None  # every final hypothesis, best first (beam search only)
 
 router = APIRouter(
     prefix="/lm",
@@ -79,51 +126,80 @@ def get_lm_components(model_name: str):
             status_code=400,
             detail=f"Unsupported model: {model_name}. Supported models are: {list(SUPPORTED_MODELS.keys())}"
         )
+    components = SUPPORTED_MODELS[model_name]
     return (
-        SUPPORTED_MODELS[model_name]["tokenizer"],
-        SUPPORTED_MODELS[model_name]["model"],
-        SUPPORTED_MODELS[model_name]["pipeline"]
+        components["tokenizer"],
+        components["model"],
+        components["pipeline"]
     )
 
+def get_decode_table(model_name: str):
+    """Precomputed token-id -> display-string table for a given model_name."""
+    get_lm_components(model_name)
+    return SUPPORTED_MODELS[model_name]["decode_table"]
+
+
 def prepare_prompt(prompt: str):
     return [{"role": "user", "content": prompt}]
 
 
 # --- Synchronous inference functions ---
 
-def _token_probs_sync(data: LMInput):
-    tokenizer, model, _ = get_lm_components(data.model_name)
-    print(f"Token probabilities requested using model: {model.__class__.__name__} ({data.model_name})")
-
-    if data.model_name in ("GPT-2", "Llama-3.2"):
-        encoded_prompt = tokenizer(data.prompt, return_tensors='pt')
-    else:
+def _encode_for_probs(data: LMInput) -> list[int]:
+    tokenizer, _, _ = get_lm_components(data.model_name)
+    if data.model_name not in ("GPT-2", "Llama-3.2"):
         raise HTTPException(status_code=400, detail=f"Unsupported model: {data.model_name}. Supported models: GPT-2, Llama-3.2")
+    input_ids = tokenizer(data.prompt)['input_ids']
+    if not input_ids:
+        raise HTTPException(status_code=400, detail="Prompt cannot be empty")
+    return input_ids
 
-    input_ids = encoded_prompt['input_ids']
-
-    with _model_lock:
-        output = model(input_ids=input_ids, output_scores=True)
 
-    logits = output.logits
-    probabilities = torch.nn.functional.softmax(logits[:, -1, :], dim=-1)
-    top_k_probs, top_k_indices = torch.topk(probabilities, 10)
-    token_ids_list = top_k_indices.tolist()[0]
-    decoded_tokens = [
-        tokenizer.decode([tid], skip_special_tokens=False).replace('Ġ', ' ')
-        for tid in token_ids_list
-    ]
-    probs_list = [round(p, 3) for p in top_k_probs.tolist()[0]]
-    return LMProbSpread(
-        tokens=decoded_tokens,
-        probabilities=probs_list,
-        token_ids=token_ids_list
+def _token_probs_batch(items: list[LMInput]):
+    """Next-token top-10 for a batch of prompts sharing one model."""
+    tokenizer, model, _ = get_lm_components(items[0].model_name)
+    log_event(
+        "token_probs",
+        f"Token probabilities requested using model: {model.__class__.__name__} ({items[0].model_name}), batch of {len(items)}",
+        model=items[0].model_name, batch_size=len(items),
     )
 
+    results: list = [None] * len(items)
+    encoded: dict[int, list[int]] = {}
+    with metrics.stage("token_probs", "tokenize"):
+        for i, data in enumerate(items):
+            try:
+                encoded[i] = _encode_for_probs(data)
+            except HTTPException as e:
+                results[i] = e
+
+    if encoded:
+        with metrics.stage("token_probs", "forward"):
+            entries = forward_batch_with_cache(
+                _prefix_cache, items[0].model_name, model,
+                list(encoded.values()), tokenizer.eos_token_id
+            )
+        with metrics.stage("token_probs", "postprocess"):
+            last_logits = torch.stack([entry.last_logits for entry in entries])
+            probabilities = torch.nn.functional.softmax(last_logits, dim=-1)
+            top_k_probs, top_k_indices = torch.topk(probabilities, 10)
+            display = get_decode_table(items[0].model_name)
+            for i, token_ids_list, probs in zip(encoded, top_k_indices.tolist(), top_k_probs.tolist()):
+                results[i] = LMProbSpread(
+                    tokens=display.decode_ids(token_ids_list),
+                    probabilities=[round(p, 3) for p in probs],
+                    token_ids=token_ids_list
+                )
+    return results
+
 
 def _generate_text_sync(data: LMInput):
     tokenizer, _, generator = get_lm_components(data.model_name)
-    print(f"Text generation requested using model: {generator.model.__class__.__name__} ({data.model_name})")
+    log_event(
+        "generate_text",
+        f"Text generation requested using model: {generator.model.__class__.__name__} ({data.model_name})",
+        model=data.model_name,
+    )
 
     if data.model_name == "Llama-3.2":
         message = prepare_prompt(data.prompt)
@@ -137,40 +213,41 @@ def _generate_text_sync(data: LMInput):
     else:
         raise HTTPException(status_code=400, detail=f"Unsupported model: {data.model_name}. Supported models: GPT-2, Llama-3.2")
 
-    with _model_lock:
+    with metrics.stage("generate_text", "generate"):
         output = generator(prompt, max_length=50, num_return_sequences=1)
 
     generated_text = output[0]['generated_text']
     return LMOutput(token=generated_text)
 
 
+def _generate_text_batch(items: list[LMInput]):
+    """Pipeline generation runs per prompt; batching here only serializes model use."""
+    results = []
+    for data in items:
+        try:
+            results.append(_generate_text_sync(data))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
 def _tokenize_sync(data: LMInput):
     tokenizer, _, _ = get_lm_components(data.model_name)
-    print(f"Tokenization requested using model: {tokenizer.__class__.__name__} ({data.model_name})")
-    token_ids = tokenizer.encode(data.prompt)
-    tokens = tokenizer.convert_ids_to_tokens(token_ids)
-    result = [Token(value=val, id=tid) for val, tid in zip(tokens, token_ids)]
-    print(f"{result}")
+    log_event(
+        "tokenize_text",
+        f"Tokenization requested using model: {tokenizer.__class__.__name__} ({data.model_name})",
+        model=data.model_name,
+    )
+    with metrics.stage("tokenize_text", "tokenize"):
+        token_ids = tokenizer.encode(data.prompt)
+    with metrics.stage("tokenize_text", "postprocess"):
+        tokens = get_decode_table(data.model_name).decode_ids(token_ids)
+        result = [Token(value=val, id=tid) for val, tid in zip(tokens, token_ids)]
+    log_event("tokenize_text.result", f"{result}", tokens=len(result))
     return result
 
 
-def _iterative_generation_sync(data: LMInput):
-    tokenizer, model, _ = get_lm_components(data.model_name)
-    print(f"Iterative generation requested using model: {model.__class__.__name__} ({data.model_name})")
-
-    if not data.prompt or data.prompt.strip() == "":
-        raise HTTPException(status_code=400, detail="Prompt cannot be empty")
-
-    print(f"Prompt: '{data.prompt}'")
-
-    if data.model_name in ("GPT-2", "Llama-3.2"):
-        inputs = tokenizer(
-            data.prompt,
-            return_tensors="pt",
-        ).to(model.device)
-    else:
-        raise HTTPException(status_code=400, detail=f"Unsupported model: {data.model_name}. Supported models: GPT-2, Llama-3.2")
-
+def _generation_kwargs(data: LMInput) -> dict:
     gen_kwargs = {
         "max_new_tokens": data.max_tokens if data.max_tokens else 20,
         "output_scores": True,
@@ -188,79 +265,312 @@ def _iterative_generation_sync(data: LMInput):
         gen_kwargs["top_p"] = 0.9
     elif data.search_strategy == "Assisted":
         gen_kwargs["do_sample"] = False
+    return gen_kwargs
+
 
-    print(f"Using {data.search_strategy} search with params: {gen_kwargs}")
-
-    with _model_lock:
-        outputs = model.generate(**inputs, **gen_kwargs)
-
-    generated_tokens = outputs.sequences[0][inputs['input_ids'].shape[1]:]
-    generated_text = tokenizer.decode(generated_tokens, skip_special_tokens=True)
-
-    steps_data = []
-    for i, step_logits in enumerate(outputs.scores):
-        if step_logits.dim() > 1:
-            step_logits = step_logits[0]
-
-        probabilities = torch.softmax(step_logits, dim=-1)
-
-        chosen_token_id = generated_tokens[i].item()
-        chosen_token_prob = probabilities[chosen_token_id].item()
-        chosen_token = tokenizer.decode(chosen_token_id, skip_special_tokens=False).replace('Ġ', ' ')
-
-        top_k_probs, top_k_indices = torch.topk(probabilities, k=10)
-        top_k_token_ids = top_k_indices.cpu().tolist()
-        top_k_probs_list = top_k_probs.cpu().tolist()
-
-        if isinstance(top_k_token_ids[0], list):
-            top_k_token_ids = top_k_token_ids[0]
-        if isinstance(top_k_probs_list[0], list):
-            top_k_probs_list = top_k_probs_list[0]
-
-        if chosen_token_id not in top_k_token_ids:
-            top_k_token_ids[-1] = chosen_token_id
-            top_k_probs_list[-1] = chosen_token_prob
-            sorted_pairs = sorted(zip(top_k_probs_list, top_k_token_ids), reverse=True)
-            top_k_probs_list, top_k_token_ids = zip(*sorted_pairs)
-            top_k_probs_list = list(top_k_probs_list)
-            top_k_token_ids = list(top_k_token_ids)
-
-        top_k_tokens = [
-            tokenizer.decode(tid, skip_special_tokens=False).replace('Ġ', ' ')
-            for tid in top_k_token_ids
-        ]
-
-        steps_data.append({
-            "step": i + 1,
-            "top_k_tokens": top_k_tokens,
-            "top_k_probs": top_k_probs_list,
-            "top_k_token_ids": top_k_token_ids,
-            "chosen_token": chosen_token,
-            "chosen_token_id": chosen_token_id
-        })
-
-    return IterativeGenerationResponse(
-        generated_text=generated_text,
-        steps=steps_data
+def _generation_batch_key(data: LMInput) -> tuple:
+    """Requests may share a generate call only if their generation kwargs match."""
+    return (data.model_name, tuple(sorted(_generation_kwargs(data).items())))
+
+
+def _encode_for_generation(data: LMInput) -> list[int]:
+    tokenizer, _, _ = get_lm_components(data.model_name)
+    if not data.prompt or data.prompt.strip() == "":
+        raise HTTPException(status_code=400, detail="Prompt cannot be empty")
+    if data.model_name not in ("GPT-2", "Llama-3.2"):
+        raise HTTPException(status_code=400, detail=f"Unsupported model: {data.model_name}. Supported models: GPT-2, Llama-3.2")
+    return tokenizer(data.prompt)['input_ids']
+
+
+def _steps_from_scores(display, scores, row: int, generated_tokens, first_step: int = 1) -> list[dict]:
+    """Builds per-step top-k data for one row of a (batched) generate output.
+
+    All steps are processed together: one softmax/topk over ``[steps, vocab]``
+    and a gather for the chosen-token probabilities. If the chosen token is
+    not in a step's top-k it replaces the last entry and the row is re-sorted.
+    """
+    num_steps = min(len(scores), len(generated_tokens))
+    if num_steps == 0:
+        return []
+
+    logits = torch.stack([step_logits[row] for step_logits in scores[:num_steps]])
+    probabilities = torch.softmax(logits.float(), dim=-1)
+    chosen_ids = torch.as_tensor(generated_tokens[:num_steps], device=probabilities.device).long()
+    chosen_probs = probabilities.gather(1, chosen_ids[:, None]).squeeze(1)
+
+    top_k_probs, top_k_ids = torch.topk(probabilities, k=10, dim=-1)
+    missing = ~(top_k_ids == chosen_ids[:, None]).any(dim=1)
+    top_k_ids[missing, -1] = chosen_ids[missing]
+    top_k_probs[missing, -1] = chosen_probs[missing]
+    top_k_probs, order = torch.sort(top_k_probs, dim=-1, descending=True)
+    top_k_ids = top_k_ids.gather(1, order)
+
+    return [
+        {
+            "step": first_step + i,
+            "top_k_tokens": [display[tid] for tid in ids],
+            "top_k_probs": probs,
+            "top_k_token_ids": ids,
+            "chosen_token": display[chosen_id],
+            "chosen_token_id": chosen_id
+        }
+        for i, (ids, probs, chosen_id) in enumerate(
+            zip(top_k_ids.cpu().tolist(), top_k_probs.cpu().tolist(), chosen_ids.cpu().tolist())
+        )
+    ]
+
+
+def _iterative_generation_batch(items: list[LMInput]):
+    """Runs one left-padded ``generate`` call for requests with identical kwargs."""
+    tokenizer, model, _ = get_lm_components(items[0].model_name)
+    log_event(
+        "iterative_generation",
+        f"Iterative generation requested using model: {model.__class__.__name__} ({items[0].model_name}), batch of {len(items)}",
+        model=items[0].model_name, batch_size=len(items), strategy=items[0].search_strategy,
     )
 
+    results: list = [None] * len(items)
+    encoded: dict[int, list[int]] = {}
+    with metrics.stage("iterative_generation", "tokenize"):
+        for i, data in enumerate(items):
+            try:
+                encoded[i] = _encode_for_generation(data)
+                log_event("iterative_generation.prompt", f"Prompt: '{data.prompt}'", prompt=data.prompt)
+            except HTTPException as e:
+                results[i] = e
+    if not encoded:
+        return results
+
+    gen_kwargs = _generation_kwargs(items[0])
+    log_event(
+        "iterative_generation.params",
+        f"Using {items[0].search_strategy} search with params: {gen_kwargs}",
+        params=gen_kwargs,
+    )
+
+    input_ids, attention_mask = left_pad(list(encoded.values()), tokenizer.eos_token_id, model.device)
+    generate_start = time.perf_counter()
+    with torch.no_grad(), metrics.stage("iterative_generation", "forward"):
+        outputs = model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            pad_token_id=tokenizer.eos_token_id,
+            **gen_kwargs
+        )
+    generate_seconds = time.perf_counter() - generate_start
+    new_tokens = (outputs.sequences.shape[1] - input_ids.shape[1]) * len(encoded)
+    metrics.GENERATED_TOKENS.inc(new_tokens, endpoint="iterative_generation")
+    if generate_seconds > 0:
+        metrics.TOKENS_PER_SECOND.observe(new_tokens / generate_seconds, endpoint="iterative_generation")
+
+    # Beam search scores are laid out [batch * num_beams, vocab]; like the
+    # single-request path, report the first beam of each request
+    postprocess_start = time.perf_counter()
+    beams_per_row = gen_kwargs.get("num_beams", 1)
+    display = get_decode_table(items[0].model_name)
+    prompt_len = input_ids.shape[1]
+    for row, i in enumerate(encoded):
+        generated_tokens = outputs.sequences[row][prompt_len:]
+        # Finished rows are padded with EOS; keep the first EOS only
+        eos_positions = (generated_tokens == tokenizer.eos_token_id).nonzero()
+        if len(eos_positions) > 0:
+            generated_tokens = generated_tokens[:eos_positions[0].item() + 1]
+        generated_text = tokenizer.decode(generated_tokens, skip_special_tokens=True)
+        results[i] = IterativeGenerationResponse(
+            generated_text=generated_text,
+            steps=_steps_from_scores(display, outputs.scores, row * beams_per_row, generated_tokens)
+        )
+    metrics.STAGE_LATENCY.observe(
+        time.perf_counter() - postprocess_start, endpoint="iterative_generation", stage="postprocess"
+    )
+    return results
+
+
+# --- Streaming iterative generation ---
+
+# Tokens a stream decodes per scheduler slot; other batches run between chunks
+STREAM_CHUNK_TOKENS = int(os.getenv("STREAM_CHUNK_TOKENS", 8))
+
+
+@dataclass
+class _StreamJob:
+    data: LMInput
+    emit: Callable[[str, dict], None]  # thread-safe
+    cancel: threading.Event
+    # Decoding state carried from one chunk to the next
+    input_ids: Optional[torch.Tensor] = None
+    past_key_values: Any = None
+    generated: list[int] = field(default_factory=list)
+    remaining: int = 0
+    done: bool = False
+
+
+class _CancelCriteria(StoppingCriteria):
+    """Stops generation once the streaming client has gone away."""
+
+    def __init__(self, cancel: threading.Event):
+        self.cancel = cancel
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.cancel.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class _StepEmitter(_CancelCriteria):
+    """Emits a step event for every token ``generate`` produces.
+
+    Stopping criteria run right after each token is appended and receive the
+    same ``scores`` that ``output_scores`` returns, i.e. after temperature,
+    top-k and top-p, so streamed steps match /iterative_generation and the
+    distribution the token was drawn from.
+    """
+
+    def __init__(self, display, job: _StreamJob):
+        super().__init__(job.cancel)
+        self.display = display
+        self.job = job
+        self.first_step = len(job.generated) + 1
+        self.emitted = 0
+
+    def __call__(self, input_ids, scores, **kwargs):
+        step = _steps_from_scores(
+            self.display, scores[-1:], 0, input_ids[0, -1:], first_step=self.first_step + self.emitted
+        )[0]
+        self.emitted += 1
+        self.job.emit("step", step)
+        return super().__call__(input_ids, scores, **kwargs)
+
+
+def _stream_beams(job: _StreamJob):
+    """transformers can't stream beam search: the winning beam is only known
+    at the end, so the whole search runs in one slot and its steps are
+    emitted together."""
+    data = job.data
+    tokenizer, model, _ = get_lm_components(data.model_name)
+    display = get_decode_table(data.model_name)
+    input_ids = torch.tensor([_encode_for_generation(data)], device=model.device)
+    with torch.no_grad():
+        outputs = model.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            pad_token_id=tokenizer.eos_token_id,
+            stopping_criteria=StoppingCriteriaList([_CancelCriteria(job.cancel)]),
+            **_generation_kwargs(data)
+        )
+    generated_tokens = outputs.sequences[0][input_ids.shape[1]:]
+    for step in _steps_from_scores(display, outputs.scores, 0, generated_tokens):
+        job.emit("step", step)
+    job.generated = generated_tokens.tolist()
+    job.done = True
+
+
+def _stream_chunk(job: _StreamJob):
+    """Decodes up to STREAM_CHUNK_TOKENS more tokens, continuing from the KV cache."""
+    data = job.data
+    tokenizer, model, _ = get_lm_components(data.model_name)
+    gen_kwargs = _generation_kwargs(data)
+    if job.input_ids is None:
+        job.input_ids = torch.tensor([_encode_for_generation(data)], device=model.device)
+        job.remaining = gen_kwargs["max_new_tokens"]
+    gen_kwargs["max_new_tokens"] = chunk = min(STREAM_CHUNK_TOKENS, job.remaining)
+
+    with torch.no_grad():
+        outputs = model.generate(
+            input_ids=job.input_ids,
+            attention_mask=torch.ones_like(job.input_ids),
+            past_key_values=job.past_key_values,
+            pad_token_id=tokenizer.eos_token_id,
+            stopping_criteria=StoppingCriteriaList([_StepEmitter(get_decode_table(data.model_name), job)]),
+            **gen_kwargs
+        )
+    new_tokens = outputs.sequences[0, job.input_ids.shape[1]:].tolist()
+    job.input_ids = outputs.sequences
+    job.past_key_values = outputs.past_key_values
+    job.generated.extend(new_tokens)
+    job.remaining -= len(new_tokens)
+    job.done = (
+        job.remaining <= 0
+        or len(new_tokens) < chunk
+        or tokenizer.eos_token_id in new_tokens
+        or job.cancel.is_set()
+    )
+
+
+def _stream_generation_batch(items: list[_StreamJob]):
+    """Advances each stream by one chunk; streams are never merged."""
+    results = []
+    for job in items:
+        try:
+            if _generation_kwargs(job.data).get("num_beams", 1) > 1:
+                _stream_beams(job)
+            else:
+                _stream_chunk(job)
+            if job.done:
+                tokenizer = get_lm_components(job.data.model_name)[0]
+                job.emit("done", {"generated_text": tokenizer.decode(job.generated, skip_special_tokens=True)})
+            results.append(None)
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
 
 # --- Async route handlers ---
 
 @router.post("/token_probs")
 async def token_probs(data: LMInput):
     try:
-        return await run_in_thread(_token_probs_sync, data)
+        return await run_batched(_token_probs_batch, data.model_name, data)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Issue with Calling LM: {e}")
 
 
+def _collect_metrics() -> list[str]:
+    cache = _prefix_cache.stats()
+    batching = _batcher.stats()
+    return (
+        metrics.gauge_lines(
+            "prefix_cache_lookups", "token_probs prefix-cache lookups by outcome",
+            {k: cache[k] for k in ("hits", "partial_hits", "misses")}, label="outcome",
+        )
+        + metrics.gauge_lines("prefix_cache_bytes", "Bytes held by the prefix cache", {"": cache["bytes"]})
+        + metrics.gauge_lines("inference_queue_depth", "Requests waiting for the batch scheduler", {"": batching["queued"]})
+        + metrics.gauge_lines(
+            "model_loaded_bytes", "Weight memory of loaded models",
+            SUPPORTED_MODELS.stats()["loaded"], label="model",
+        )
+    )
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+
+@router.get("/models")
+async def loaded_models():
+    """Supported models, which are loaded, and their weight memory."""
+    return SUPPORTED_MODELS.stats()
+
+
+@router.get("/prefix_cache/stats")
+async def prefix_cache_stats():
+    """Hit/miss counters and memory usage of the token_probs prefix cache."""
+    return _prefix_cache.stats()
+
+
+@router.get("/batching/stats")
+async def batching_stats():
+    """Batch counts and mean batch size of the inference scheduler."""
+    return _batcher.stats()
+
+
 @router.post("/generate_text")
 async def generate_text(data: LMInput):
     try:
-        return await run_in_thread(_generate_text_sync, data)
+        return await run_batched(_generate_text_batch, data.model_name, data)
     except HTTPException:
         raise
     except Exception as e:
@@ -280,8 +590,66 @@ async def tokenize_text(data: LMInput):
 @router.post("/iterative_generation")
 async def iterative_generation(data: LMInput) -> IterativeGenerationResponse:
     try:
-        return await run_in_thread(_iterative_generation_sync, data)
+        return await run_batched(_iterative_generation_batch, _generation_batch_key(data), data)
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Issue with iterative generation: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Issue with iterative generation: {e}")
+
+
+@router.post("/iterative_generation/stream")
+async def iterative_generation_stream(data: LMInput, request: Request):
+    """Server-Sent Events variant of /iterative_generation.
+
+    Emits a ``step`` event (StepData fields) as soon as each token is decoded,
+    then ``done`` with the generated text, or ``error`` with a detail message.
+    Generation stops when the client disconnects.
+    """
+    # Validate only: a cold model loads in the first chunk, on the executor
+    if data.model_name not in SUPPORTED_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported model: {data.model_name}. Supported models are: {list(SUPPORTED_MODELS.keys())}"
+        )
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: str, payload: dict):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, payload))
+
+    job = _StreamJob(data=data, emit=emit, cancel=threading.Event())
+
+    async def drive():
+        # One scheduler slot per chunk, each under INFERENCE_TIMEOUT, so a long
+        # stream never holds the model while other requests queue behind it
+        while not job.done:
+            await run_batched(_stream_generation_batch, id(job), job)
+
+    task = asyncio.ensure_future(drive())
+    # Runs on the loop after every emit() queued by the worker thread
+    task.add_done_callback(lambda _: queue.put_nowait((None, None)))
+
+    async def events():
+        try:
+            while True:
+                event, payload = await queue.get()
+                if event is None:
+                    if not task.cancelled() and task.exception() is not None:
+                        e = task.exception()
+                        detail = e.detail if isinstance(e, HTTPException) else f"Issue with iterative generation: {e}"
+                        yield _sse("error", {"detail": detail})
+                    break
+                if await request.is_disconnected():
+                    break
+                yield _sse(event, payload)
+        finally:
+            job.cancel.set()
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
\ No newline at end of file
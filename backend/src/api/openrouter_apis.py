@@ -1,15 +1,42 @@
 import asyncio
+import heapq
+import os
+import numpy as np
 from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException
 from typing import Literal, Optional, List, Dict, Any
-from .lm_apis import LMInput, LMOutput, LMProbSpread, Token, StepData, IterativeGenerationResponse, SearchStrategy
-from .openrouter_client import get_openrouter_client, OpenRouterClient
+from .lm_apis import LMInput, LMOutput, LMProbSpread, Token, StepData, BeamData, IterativeGenerationResponse, SearchStrategy
+from .openrouter_client import get_openrouter_client, response_cache_stats, upstream_stats, OpenRouterClient
+from ..upstream import CircuitOpenError
+
+# Greedy steps taken from one completion; 1 restores one request per token
+GREEDY_TOKENS_PER_REQUEST = max(1, int(os.getenv("OPENROUTER_GREEDY_TOKENS_PER_REQUEST", "16")))
+# Beam hypotheses are ranked by logprob / length**penalty; 0 ranks by raw logprob
+BEAM_LENGTH_PENALTY = float(os.getenv("OPENROUTER_BEAM_LENGTH_PENALTY", "1.0"))
+# Chosen tokens that end a beam hypothesis
+EOS_TOKENS = frozenset({"<|endoftext|>", "</s>", "<|eot_id|>", "<|end_of_text|>", "<|im_end|>"})
 
 router = APIRouter(
     prefix="/lm/openrouter",
     tags=["OpenRouter LM APIs"]
 )
 
+def _upstream_error(e: Exception) -> HTTPException:
+    """503 while the model's circuit breaker is open, 500 for any other failure."""
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(status_code=503, detail=str(e))
+    return HTTPException(status_code=500, detail=f"Issue with OpenRouter API: {e}")
+
+@router.get("/upstream/stats")
+async def openrouter_upstream_stats():
+    """Connection reuse, circuit breaker states and in-flight calls per model."""
+    return upstream_stats()
+
+@router.get("/cache/stats")
+async def openrouter_cache_stats():
+    """Hit/miss counters of the deterministic response cache."""
+    return response_cache_stats()
+
 @router.post("/generate_text")
 async def generate_text(data: LMInput) -> LMOutput:
     """Generate text using OpenRouter API."""
@@ -21,7 +48,7 @@ async def generate_text(data: LMInput) -> LMOutput:
     try:
         messages = [{"role": "user", "content": data.prompt}]
         
-        completion = client.chat_completion(
+        completion = await client.chat_completion_async(
             model=openrouter_model,
             messages=messages,
             max_tokens=data.max_tokens if data.max_tokens else 100,
@@ -32,7 +59,7 @@ async def generate_text(data: LMInput) -> LMOutput:
         return LMOutput(token=generated_text)
     except Exception as e:
         print(f"Error in OpenRouter generate_text: {e}")
-        raise HTTPException(status_code=500, detail=f"Issue with OpenRouter API: {e}")
+        raise _upstream_error(e)
 
 @router.post("/token_probs")
 async def token_probs(data: LMInput) -> LMProbSpread:
@@ -45,7 +72,7 @@ async def token_probs(data: LMInput) -> LMProbSpread:
     try:
         messages = [{"role": "user", "content": data.prompt}]
         
-        completion = client.chat_completion(
+        completion = await client.chat_completion_async(
             model=openrouter_model,
             messages=messages,
             max_tokens=1,
@@ -78,7 +105,7 @@ async def token_probs(data: LMInput) -> LMProbSpread:
         )
     except Exception as e:
         print(f"Error in OpenRouter token_probs: {e}")
-        raise HTTPException(status_code=500, detail=f"Issue with OpenRouter API: {e}")
+        raise _upstream_error(e)
 
 @router.post("/tokenize_text")
 async def tokenize_text(data: LMInput):
@@ -119,7 +146,7 @@ async def iterative_generation(data: LMInput) -> IterativeGenerationResponse:
             )
     except Exception as e:
         print(f"Error in OpenRouter iterative_generation: {e}")
-        raise HTTPException(status_code=500, detail=f"Issue with OpenRouter API: {e}")
+        raise _upstream_error(e)
 
 async def _iterative_generation_greedy(
     client: OpenRouterClient,
@@ -127,62 +154,61 @@ async def _iterative_generation_greedy(
     prompt: str,
     max_tokens: int
 ) -> IterativeGenerationResponse:
-    """Greedy search: always pick highest probability token."""
+    """Greedy search: always pick highest probability token.
+
+    At temperature 0 every position of a multi-token completion is the greedy
+    choice given the ones before it, so each request yields up to
+    GREEDY_TOKENS_PER_REQUEST steps instead of one.
+    """
     generated_tokens = []
     steps_data = []
     current_context = prompt
     
-    for step in range(max_tokens):
+    while len(steps_data) < max_tokens:
         messages = [{"role": "system", "content": "You are a helpful assistant. Complete the text."}, {"role": "user", "content": current_context}]
         
-        completion = client.chat_completion(
+        completion = await client.chat_completion_async(
             model=model,
             messages=messages,
-            max_tokens=16,
+            max_tokens=min(GREEDY_TOKENS_PER_REQUEST, max_tokens - len(steps_data)),
             logprobs=True,
             top_logprobs=10,
             temperature=0  # Deterministic
         )
-        print("messages: ", messages)
-        print(f"Iterative generation completion: {completion}")
         
-        token_info = client.extract_token_info(completion)
-        
-        if not token_info or not token_info.get("tokens"):
+        positions = client.extract_all_token_info(completion)
+        if not positions:
             break
         
-        # Get chosen token (first in list, highest probability)
-        chosen_token = token_info["tokens"][0]
-        chosen_logprob = token_info["logprobs"][0]
-        chosen_token_id = token_info["token_ids"][0]
-        
-        # Get top k tokens and probabilities
-        top_k_tokens = token_info["tokens"][:10]
-        top_k_probs = token_info["probabilities"][:10]
-        top_k_token_ids = token_info["token_ids"][:10]
-        
-        # Normalize probabilities
-        total_prob = sum(top_k_probs)
-        if total_prob > 0:
-            top_k_probs = [p / total_prob for p in top_k_probs]
-        
-        # Round probabilities
-        top_k_probs = [round(p, 3) for p in top_k_probs]
-        
-        generated_tokens.append(chosen_token)
-        # # Add a space to the chosen token
-        # chosen_token = " " + chosen_token
-        current_context += chosen_token
-
-        
-        steps_data.append(StepData(
-            step=step + 1,
-            top_k_tokens=top_k_tokens,
-            top_k_probs=top_k_probs,
-            top_k_token_ids=top_k_token_ids,
-            chosen_token=chosen_token,
-            chosen_token_id=chosen_token_id
-        ))
+        for token_info in positions[:max_tokens - len(steps_data)]:
+            # Get chosen token (first in list, highest probability)
+            chosen_token = token_info["tokens"][0]
+            chosen_token_id = token_info["token_ids"][0]
+            
+            # Get top k tokens and probabilities
+            top_k_tokens = token_info["tokens"][:10]
+            top_k_probs = token_info["probabilities"][:10]
+            top_k_token_ids = token_info["token_ids"][:10]
+            
+            # Normalize probabilities
+            total_prob = sum(top_k_probs)
+            if total_prob > 0:
+                top_k_probs = [p / total_prob for p in top_k_probs]
+            
+            # Round probabilities
+            top_k_probs = [round(p, 3) for p in top_k_probs]
+            
+            generated_tokens.append(chosen_token)
+            current_context += chosen_token
+            
+            steps_data.append(StepData(
+                step=len(steps_data) + 1,
+                top_k_tokens=top_k_tokens,
+                top_k_probs=top_k_probs,
+                top_k_token_ids=top_k_token_ids,
+                chosen_token=chosen_token,
+                chosen_token_id=chosen_token_id
+            ))
     
     generated_text = "".join(generated_tokens)
     return IterativeGenerationResponse(
@@ -203,9 +229,9 @@ async def _iterative_generation_sampling(
     current_context = prompt
     
     for step in range(max_tokens):
-        messages = [{"role": "system", "content": "You are a helpful assistant. Complete the text."}, {"role": "user", "content": beam_context}]
+        messages = [{"role": "system", "content": "You are a helpful assistant. Complete the text."}, {"role": "user", "content": current_context}]
         
-        completion = client.chat_completion(
+        completion = await client.chat_completion_async(
             model=model,
             messages=messages,
             max_tokens=1,
@@ -255,6 +281,34 @@ async def _iterative_generation_sampling(
         steps=steps_data
     )
 
+class _BeamNode:
+    """One generated token; hypotheses that share a prefix share its nodes."""
+    __slots__ = ("parent", "token", "logprob", "length", "step")
+
+    def __init__(self, parent: Optional["_BeamNode"], token: str, logprob: float, step: Optional[StepData]):
+        self.parent = parent
+        self.token = token
+        self.logprob = (parent.logprob if parent else 0.0) + logprob  # cumulative
+        self.length = parent.length + 1 if parent else 0
+        self.step = step  # the expansion that chose this token, as the UI shows it
+
+    def path(self) -> List["_BeamNode"]:
+        nodes = []
+        node = self
+        while node.parent is not None:
+            nodes.append(node)
+            node = node.parent
+        return nodes[::-1]
+
+    @property
+    def score(self) -> float:
+        return _length_normalized(self.logprob, self.length)
+
+
+def _length_normalized(logprob: float, length: int) -> float:
+    return logprob / length ** BEAM_LENGTH_PENALTY if length else logprob
+
+
 async def _iterative_generation_beam(
     client: OpenRouterClient,
     model: str,
@@ -262,92 +316,122 @@ async def _iterative_generation_beam(
     max_tokens: int,
     num_beams: int = 5
 ) -> IterativeGenerationResponse:
-    """Beam search: maintain multiple candidate sequences with parallel async calls."""
-    # Initialize beams: each beam is (context, cumulative_logprob, tokens)
-    beams = [(prompt, 0.0, [])]
-    
-    all_steps_data = []
+    """Beam search: maintain multiple candidate sequences with parallel async calls.
+
+    Each step expands every live beam in one parallel round of requests, then
+    pops candidates off a heap of length-normalized scores until ``num_beams``
+    distinct texts survive; a candidate spelling the same text as a better
+    one is merged into it (probabilities added). Hypotheses end on an EOS
+    token or an upstream stop, and the search stops once no live beam can
+    beat the finished ones.
+    """
+    root = _BeamNode(None, "", 0.0, None)
+    beams = [(root, "")]  # (node, generated text); text is only rebuilt for survivors
+    finished: List[_BeamNode] = []
     
     for step in range(max_tokens):
-        # Create async tasks for all active beams
-        tasks = []
-        for beam_context, _, _ in beams:
-            messages = [{"role": "system", "content": "You are a helpful assistant. Complete the text."}, {"role": "user", "content": beam_context}]
-            task = client.chat_completion_async(
+        completions = await asyncio.gather(*(
+            client.chat_completion_async(
                 model=model,
-                messages=messages,
+                messages=[{"role": "system", "content": "You are a helpful assistant. Complete the text."}, {"role": "user", "content": prompt + text}],
                 max_tokens=1,
                 logprobs=True,
                 top_logprobs=10,
                 temperature=0  # Deterministic for beam search
             )
-            tasks.append(task)
-        
-        # Execute all API calls in parallel
-        completions = await asyncio.gather(*tasks)
+            for _, text in beams
+        ))
         
-        # Expand each beam with top candidates
+        expansions = []
         candidates = []
-        
         for i, completion in enumerate(completions):
-            beam_context, beam_logprob, beam_tokens = beams[i]
+            node = beams[i][0]
             token_info = client.extract_token_info(completion)
             
             if not token_info or not token_info.get("tokens"):
+                if completion.choices and completion.choices[0].finish_reason == "stop":
+                    finished.append(node)
+                expansions.append(None)
                 continue
             
-            # Get top k candidates from this beam
             top_k_tokens = token_info["tokens"][:10]
             top_k_logprobs = token_info["logprobs"][:10]
-            top_k_probs = token_info["probabilities"][:10]
             top_k_token_ids = token_info["token_ids"][:10]
             
-            # Normalize probabilities
+            # Normalize and round probabilities for display
+            top_k_probs = token_info["probabilities"][:10]
             total_prob = sum(top_k_probs)
             if total_prob > 0:
                 top_k_probs = [p / total_prob for p in top_k_probs]
-            
-            # Round probabilities
             top_k_probs = [round(p, 3) for p in top_k_probs]
+            expansions.append((top_k_tokens, top_k_logprobs, top_k_probs, top_k_token_ids))
             
-            # Store step data for the first beam (for visualization)
-            if i == 0:
-                chosen_token = top_k_tokens[0]
-                chosen_token_id = top_k_token_ids[0]
-                all_steps_data.append(StepData(
-                    step=step + 1,
-                    top_k_tokens=top_k_tokens,
-                    top_k_probs=top_k_probs,
-                    top_k_token_ids=top_k_token_ids,
-                    chosen_token=chosen_token,
-                    chosen_token_id=chosen_token_id
-                ))
-            
-            # Expand beam with top candidates
+            # The chosen token is repeated among the top logprobs; expand each token once
+            seen = set()
             for j, (token, logprob) in enumerate(zip(top_k_tokens, top_k_logprobs)):
-                new_context = beam_context + token
-                new_logprob = beam_logprob + logprob
-                new_tokens = beam_tokens + [token]
-                candidates.append((new_context, new_logprob, new_tokens))
-        
-        # Keep top num_beams candidates based on cumulative logprob
-        candidates.sort(key=lambda x: x[1], reverse=True)
-        beams = candidates[:num_beams]
-        
+                if token in seen:
+                    continue
+                seen.add(token)
+                candidates.append((-_length_normalized(node.logprob + logprob, node.length + 1), len(candidates), i, j))
+        
+        # Pop the best candidates until num_beams distinct texts survive
+        heapq.heapify(candidates)
+        survivors: Dict[str, _BeamNode] = {}
+        while candidates and len(survivors) < num_beams:
+            _, _, i, j = heapq.heappop(candidates)
+            parent, parent_text = beams[i]
+            tokens, logprobs, probs, token_ids = expansions[i]
+            text = parent_text + tokens[j]
+            
+            if text in survivors:
+                merged = survivors[text]
+                merged.logprob = float(np.logaddexp(merged.logprob, parent.logprob + logprobs[j]))
+                continue
+            
+            node = _BeamNode(parent, tokens[j], logprobs[j], StepData(
+                step=parent.length + 1,
+                top_k_tokens=tokens,
+                top_k_probs=probs,
+                top_k_token_ids=token_ids,
+                chosen_token=tokens[j],
+                chosen_token_id=token_ids[j]
+            ))
+            if tokens[j].strip() in EOS_TOKENS:
+                finished.append(node)
+            else:
+                survivors[text] = node
+        
+        beams = sorted(((node, text) for text, node in survivors.items()), key=lambda b: b[0].score, reverse=True)
         if not beams:
             break
+        
+        # Cumulative logprobs only fall as tokens are added, so a live beam can
+        # score at most its current logprob normalized at the longest length
+        if len(finished) >= num_beams:
+            finished = sorted(finished, key=lambda n: n.score, reverse=True)[:num_beams]
+            best_possible = _length_normalized(beams[0][0].logprob, max_tokens)
+            if best_possible <= finished[-1].score:
+                break
     
-    # Get the best beam
-    if not beams:
-        generated_text = ""
-        steps_data = []
-    else:
-        best_beam = beams[0]
-        generated_text = "".join(best_beam[2])
-        steps_data = all_steps_data
+    hypotheses = sorted(finished + [node for node, _ in beams], key=lambda n: n.score, reverse=True)[:num_beams]
+    hypotheses = [node for node in hypotheses if node.length > 0]
+    if not hypotheses:
+        return IterativeGenerationResponse(generated_text="", steps=[], beams=[])
+    
+    finished_ids = {id(node) for node in finished}
+    beam_data = []
+    for node in hypotheses:
+        path = node.path()
+        beam_data.append(BeamData(
+            text="".join(n.token for n in path),
+            score=round(node.score, 4),
+            logprob=round(node.logprob, 4),
+            finished=id(node) in finished_ids,
+            steps=[n.step for n in path]
+        ))
     
     return IterativeGenerationResponse(
-        generated_text=generated_text,
-        steps=steps_data
+        generated_text=beam_data[0].text,
+        steps=beam_data[0].steps,
+        beams=beam_data
     )
-
@@ -1,17 +1,88 @@
 import os
 import numpy as np
+import openai
 from openai import OpenAI, AsyncOpenAI
-from typing import Optional, Dict, List, Any
+from openai.types.chat import ChatCompletion
+from pathlib import Path
+from typing import Optional, Dict, List, Any, Tuple
 from dotenv import load_dotenv
 
+from .. import metrics
+from ..response_cache import ResponseCache, request_key
+from ..upstream import MAX_RETRIES, RETRYABLE_STATUS, UpstreamGuard, make_async_http_client, make_http_client
+
 load_dotenv()
 
+# Point at a local stub (see openrouter_stub.py) for offline testing
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
 # Model mapping configuration
 MODEL_MAPPING: Dict[str, str] = {
     "GPT-2": "openai/gpt-2",
     "Llama-3.2": "meta-llama/Llama-3.2-1B-Instruct",
 }
 
+def _classify_error(e: BaseException) -> Optional[Tuple[str, Optional[float]]]:
+    """Retry reason and Retry-After for transient OpenRouter failures, else None."""
+    if isinstance(e, openai.APITimeoutError):
+        return "timeout", None
+    if isinstance(e, openai.APIConnectionError):
+        return "connection", None
+    if isinstance(e, openai.APIStatusError) and e.status_code in RETRYABLE_STATUS:
+        retry_after = e.response.headers.get("retry-after")
+        try:
+            return str(e.status_code), float(retry_after) if retry_after else None
+        except ValueError:  # HTTP-date form; fall back to our own backoff
+            return str(e.status_code), None
+    return None
+
+
+# Shared by every client so limits and breakers are per process, not per instance
+_guard = UpstreamGuard(_classify_error)
+metrics.REGISTRY.add_collector(_guard.collect_metrics)
+
+
+def upstream_stats() -> dict:
+    return _guard.stats()
+
+
+# Deterministic completions are served from here; OPENROUTER_CACHE_SIZE=0 turns it off
+RESPONSE_CACHE_SIZE = int(os.getenv("OPENROUTER_CACHE_SIZE", "4096"))
+RESPONSE_CACHE_TTL = float(os.getenv("OPENROUTER_CACHE_TTL", "86400"))
+# Optional SQLite file shared by all workers, e.g. $DMLM_CACHE_DIR/openrouter.sqlite
+RESPONSE_CACHE_DB = os.getenv("OPENROUTER_CACHE_DB", "")
+
+_response_cache: Optional[ResponseCache] = None
+if RESPONSE_CACHE_SIZE > 0:
+    _response_cache = ResponseCache(
+        RESPONSE_CACHE_SIZE,
+        RESPONSE_CACHE_TTL,
+        Path(RESPONSE_CACHE_DB) if RESPONSE_CACHE_DB else None,
+        encode=lambda completion: completion.model_dump_json(),
+        decode=ChatCompletion.model_validate_json,
+    )
+
+
+def response_cache_stats() -> dict:
+    return _response_cache.stats() if _response_cache is not None else {"enabled": False}
+
+
+def _collect_cache_metrics() -> list[str]:
+    if _response_cache is None:
+        return []
+    stats = _response_cache.stats()
+    return (
+        metrics.gauge_lines(
+            "openrouter_response_cache_lookups", "Deterministic completion lookups by outcome",
+            {k: stats[k] for k in ("memory_hits", "disk_hits", "coalesced", "misses")}, label="outcome",
+        )
+        + metrics.gauge_lines("openrouter_response_cache_entries", "Completions held in memory", {"": stats["entries"]})
+    )
+
+
+metrics.REGISTRY.add_collector(_collect_cache_metrics)
+
+
 class OpenRouterClient:
     """Client for interacting with OpenRouter API using OpenAI SDK."""
     
@@ -20,33 +91,38 @@ class OpenRouterClient:
         if not api_key:
             raise ValueError("OPENROUTER_API_KEY environment variable is not set")
         
-        # Sync client for non-async endpoints
+        # Sync client for non-async endpoints; relies on the SDK's own retries
         self.sync_client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key
+            base_url=OPENROUTER_BASE_URL,
+            api_key=api_key,
+            http_client=make_http_client(),
+            max_retries=MAX_RETRIES
         )
         
-        # Async client for parallel beam search
+        # Async client used by every API handler so requests never block the event loop.
+        # Retries are done by the upstream guard so they are jittered, counted and
+        # seen by the circuit breaker.
         self.async_client = AsyncOpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key
+            base_url=OPENROUTER_BASE_URL,
+            api_key=api_key,
+            http_client=make_async_http_client(),
+            max_retries=0
         )
     
     def get_openrouter_model(self, model_name: str) -> str:
         """Get OpenRouter model name from internal model name."""
         return MODEL_MAPPING.get(model_name, model_name)
     
-    def chat_completion(
-        self,
+    @staticmethod
+    def _build_params(
         model: str,
         messages: List[Dict[str, str]],
-        max_tokens: Optional[int] = None,
-        temperature: Optional[float] = None,
-        logprobs: bool = False,
-        top_logprobs: Optional[int] = None,
-        top_p: Optional[float] = None
-    ) -> Any:
-        """Make a synchronous chat completion request."""
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        logprobs: bool,
+        top_logprobs: Optional[int],
+        top_p: Optional[float]
+    ) -> Dict[str, Any]:
         params = {
             "model": model,
             "messages": messages,
@@ -62,7 +138,30 @@ class OpenRouterClient:
             params["top_logprobs"] = top_logprobs
         if top_p is not None:
             params["top_p"] = top_p
+        return params
+    
+    @staticmethod
+    def _cacheable(params: Dict[str, Any]) -> bool:
+        """Greedy requests only: a sampled response, logprob payload included, is not repeatable."""
+        return _response_cache is not None and params.get("temperature") == 0
+    
+    def chat_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        logprobs: bool = False,
+        top_logprobs: Optional[int] = None,
+        top_p: Optional[float] = None
+    ) -> Any:
+        """Make a synchronous chat completion request."""
+        params = self._build_params(model, messages, max_tokens, temperature, logprobs, top_logprobs, top_p)
         
+        if self._cacheable(params):
+            return _response_cache.get_or_fetch(
+                request_key(params), lambda: self.sync_client.chat.completions.create(**params)
+            )
         return self.sync_client.chat.completions.create(**params)
     
     async def chat_completion_async(
@@ -76,23 +175,14 @@ class OpenRouterClient:
         top_p: Optional[float] = None
     ) -> Any:
         """Make an asynchronous chat completion request."""
-        params = {
-            "model": model,
-            "messages": messages,
-        }
+        params = self._build_params(model, messages, max_tokens, temperature, logprobs, top_logprobs, top_p)
         
-        if max_tokens is not None:
-            params["max_tokens"] = max_tokens
-        if temperature is not None:
-            params["temperature"] = temperature
-        if logprobs:
-            params["logprobs"] = True
-        if top_logprobs is not None:
-            params["top_logprobs"] = top_logprobs
-        if top_p is not None:
-            params["top_p"] = top_p
+        def fetch():
+            return _guard.call(model, lambda: self.async_client.chat.completions.create(**params))
         
-        return await self.async_client.chat.completions.create(**params)
+        if self._cacheable(params):
+            return await _response_cache.get_or_fetch_async(request_key(params), fetch)
+        return await fetch()
     
     @staticmethod
     def logprob_to_probability(logprob: float) -> float:
@@ -100,28 +190,13 @@ class OpenRouterClient:
         return float(np.exp(logprob))
     
     @staticmethod
-    def extract_token_info(completion) -> Dict[str, Any]:
-        """Extract token information from OpenRouter completion response."""
-        if not completion.choices:
-            return {}
-        
-        choice = completion.choices[0]
-        if not choice.logprobs:
-            return {}
-        
-        logprobs = choice.logprobs
-        content_tokens = logprobs.content if hasattr(logprobs, 'content') and logprobs.content else []
-        
-        if not content_tokens:
-            return {}
-        
-        # Get the first token (most recent)
-        first_token = content_tokens[0]
-        chosen_token = first_token.token
-        chosen_logprob = first_token.logprob
+    def _position_info(entry) -> Dict[str, Any]:
+        """Token information for one position of ``logprobs.content``."""
+        chosen_token = entry.token
+        chosen_logprob = entry.logprob
         
         # Get top logprobs
-        top_logprobs_list = first_token.top_logprobs if hasattr(first_token, 'top_logprobs') and first_token.top_logprobs else []
+        top_logprobs_list = entry.top_logprobs if hasattr(entry, 'top_logprobs') and entry.top_logprobs else []
         
         # Start with chosen token
         tokens = [chosen_token]
@@ -147,6 +222,25 @@ class OpenRouterClient:
             "token_ids": token_ids,
             "top_logprobs": top_logprobs_list
         }
+    
+    @staticmethod
+    def extract_all_token_info(completion) -> List[Dict[str, Any]]:
+        """Extract token information for every generated position, in order."""
+        if not completion.choices:
+            return []
+        
+        logprobs = completion.choices[0].logprobs
+        if not logprobs:
+            return []
+        
+        content_tokens = logprobs.content if hasattr(logprobs, 'content') and logprobs.content else []
+        return [OpenRouterClient._position_info(entry) for entry in content_tokens]
+    
+    @staticmethod
+    def extract_token_info(completion) -> Dict[str, Any]:
+        """Extract token information for the first generated token."""
+        positions = OpenRouterClient.extract_all_token_info(completion)
+        return positions[0] if positions else {}
 
 # Global client instance
 _client_instance: Optional[OpenRouterClient] = None
@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException
 import json
 from ..models import SUPPORTED_MODELS, extract_json_from_response
+from ..logs import log_event
 
 router = APIRouter(
     prefix="/planner",
@@ -172,7 +173,7 @@ async def execute_planner(data: PlannerInput) -> PlannerOutput:
         tokenizer = SUPPORTED_MODELS[data.model_name]["tokenizer"]
         model = SUPPORTED_MODELS[data.model_name]["model"]
         
-        print(f"🤖 Planner request for: '{data.prompt}' using {data.model_name}")
+        log_event("planner.request", f"🤖 Planner request for: '{data.prompt}' using {data.model_name}", prompt=data.prompt, model=data.model_name)
         
         # Build prompt with tools and state
         prompt = build_planner_prompt(data.prompt, data.current_state, TOOLS)
@@ -202,7 +203,7 @@ async def execute_planner(data: PlannerInput) -> PlannerOutput:
         generated_tokens = outputs[0][inputs['input_ids'].shape[1]:]
         response_text = tokenizer.decode(generated_tokens, skip_special_tokens=True)
         
-        print(f"📝 LM Response:\n{response_text}\n")
+        log_event("planner.response", f"📝 LM Response:\n{response_text}\n", response=response_text)
         
         # Extract JSON from response
         response_json = extract_json_from_response(response_text)
@@ -229,9 +230,11 @@ async def execute_planner(data: PlannerInput) -> PlannerOutput:
                     arguments=tc["arguments"]
                 ))
         
-        print(f"✅ Parsed {len(tool_calls)} tool calls")
-        for tc in tool_calls:
-            print(f"   - {tc.tool_name}({tc.arguments})")
+        log_event(
+            "planner.tool_calls",
+            "\n".join([f"✅ Parsed {len(tool_calls)} tool calls"] + [f"   - {tc.tool_name}({tc.arguments})" for tc in tool_calls]),
+            tool_calls=[tc.tool_name for tc in tool_calls],
+        )
         
         return PlannerOutput(
             reasoning=reasoning,
@@ -241,7 +244,7 @@ async def execute_planner(data: PlannerInput) -> PlannerOutput:
         )
         
     except Exception as e:
-        print(f"❌ Error in planner: {str(e)}")
+        log_event("planner.error", f"❌ Error in planner: {str(e)}", level="error", error=str(e))
         return PlannerOutput(
             reasoning=f"Error: {str(e)}",
             tool_calls=[],
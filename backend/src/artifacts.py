@@ -0,0 +1,66 @@
+"""On-disk cache for artifacts that are expensive to rebuild at startup.
+
+Artifacts live under ``DMLM_CACHE_DIR`` (default ``~/.cache/demystifying-lms``)
+in a directory named after a fingerprint of everything they were built from,
+so a changed tokenizer, model or format version simply misses the cache.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+CACHE_DIR = Path(os.getenv("DMLM_CACHE_DIR", Path.home() / ".cache" / "demystifying-lms"))
+
+
+def fingerprint(*parts) -> str:
+    """Short stable hash of JSON-serializable build inputs."""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash of a tokenizer's full vocabulary, merges and special tokens."""
+    if getattr(tokenizer, "is_fast", False):
+        spec = tokenizer.backend_tokenizer.to_str()
+    else:
+        spec = json.dumps(sorted(tokenizer.get_vocab().items()))
+    return fingerprint(tokenizer.__class__.__name__, hashlib.sha256(spec.encode()).hexdigest())
+
+
+def artifact_dir(kind: str, key: str) -> Path:
+    """Directory for one artifact version; not created until something is saved."""
+    return CACHE_DIR / kind / key
+
+
+def save_npy(path: Path, array: np.ndarray) -> None:
+    """Writes an .npy file atomically so concurrent workers never read a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def load_npy(path: Path) -> np.ndarray | None:
+    """Memory-maps an .npy file, or returns None if it is missing or unreadable."""
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+def save_json(path: Path, obj) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(obj))
+    os.replace(tmp, path)
+
+
+def load_json(path: Path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
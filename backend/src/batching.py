@@ -0,0 +1,168 @@
+"""Dynamic micro-batching scheduler for model inference.
+
+Requests submitted within a short window (or until the batch is full) are
+grouped by a compatibility key and handed to a batch function as one list,
+so a single padded forward / ``generate`` call serves many callers. Batches
+run one at a time on the executor, which also serializes model access.
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Sequence
+
+from . import metrics
+
+# A batch function receives the submitted items of one group and returns one
+# result per item, in order. An exception instance in the result list is
+# raised for that caller only; raising from the batch function fails them all.
+BatchFn = Callable[[list[Any]], Sequence[Any]]
+
+
+@dataclass
+class _Job:
+    batch_fn: BatchFn
+    key: Hashable
+    item: Any
+    future: asyncio.Future
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches and runs them serially."""
+
+    def __init__(self, executor: Executor, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.batches_run = 0
+        self.items_run = 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Jobs queued on another loop can't run here; fail them rather than drop them
+            if self._queue is not None:
+                self._fail_queued(self._queue)
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            if self._worker is not None and not self._worker.cancelled() and self._worker.exception() is not None:
+                print(f"Batch worker died ({self._worker.exception()!r}); restarting")
+            # Same queue: jobs that were waiting when the worker died still run
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    @staticmethod
+    def _fail_queued(queue: asyncio.Queue) -> None:
+        error = RuntimeError("Batch worker moved to another event loop")
+        while not queue.empty():
+            future = queue.get_nowait().future
+            if not future.done():
+                try:
+                    future.get_loop().call_soon_threadsafe(_fail, future, error)
+                except RuntimeError:
+                    pass  # that loop is closed; nothing awaits the future any more
+
+    async def submit(self, batch_fn: BatchFn, key: Hashable, item: Any) -> Any:
+        """Queues ``item`` and waits for its result from ``batch_fn``.
+
+        Items are only batched together when they share ``batch_fn`` and
+        ``key``. Cancelling the await drops the item if it has not started.
+        """
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait(_Job(batch_fn, key, item, future))
+        return await future
+
+    async def _collect(self, jobs: list[_Job]) -> None:
+        """Fills ``jobs`` with the next batch window's submissions."""
+        jobs.append(await self._queue.get())
+        deadline = time.perf_counter() + self.max_wait
+        while len(jobs) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs: list[_Job] = []
+            try:
+                await self._collect(jobs)
+                await self._run_jobs(loop, jobs)
+            except BaseException as e:
+                # The worker is going down; nothing else would resolve the jobs it holds
+                for job in jobs:
+                    if not job.future.done():
+                        _fail(job.future, e)
+                raise
+
+    async def _run_jobs(self, loop: asyncio.AbstractEventLoop, jobs: list[_Job]) -> None:
+        groups: dict[tuple, list[_Job]] = {}
+        for job in jobs:
+            if not job.future.done():
+                groups.setdefault((job.batch_fn, job.key), []).append(job)
+
+        for (batch_fn, _), group in groups.items():
+            # Callers may have timed out while earlier groups ran
+            group = [job for job in group if not job.future.done()]
+            if not group:
+                continue
+            try:
+                results = await loop.run_in_executor(self.executor, self._execute, batch_fn, group)
+            except Exception as e:
+                for job in group:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.items_run += len(group)
+            for job, result in zip(group, results):
+                if job.future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    job.future.set_exception(result)
+                else:
+                    job.future.set_result(result)
+
+    @staticmethod
+    def _execute(batch_fn: BatchFn, group: list[_Job]) -> Sequence[Any]:
+        endpoint = getattr(batch_fn, "__name__", "batch").strip("_")
+        started = time.perf_counter()
+        for job in group:
+            metrics.QUEUE_WAIT.observe(started - job.submitted_at, endpoint=endpoint)
+        metrics.BATCH_SIZE.observe(len(group), endpoint=endpoint)
+        try:
+            return batch_fn([job.item for job in group])
+        finally:
+            metrics.MODEL_BUSY.observe(time.perf_counter() - started, endpoint=endpoint)
+
+    def stats(self) -> dict:
+        return {
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "mean_batch_size": round(self.items_run / self.batches_run, 2) if self.batches_run else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+
+def _fail(future: asyncio.Future, error: BaseException) -> None:
+    if future.done():
+        return
+    if isinstance(error, Exception):
+        future.set_exception(error)
+    else:
+        future.cancel()
@@ -0,0 +1,97 @@
+"""Constrained decoding over a fixed set of allowed strings.
+
+The allowed strings are tokenized into a trie. During ``generate`` a logits
+processor masks every token that does not continue some allowed string, and
+a stopping criterion ends a row as soon as it spells out a complete string,
+so one call always yields a member of the set in as few steps as it has
+tokens.
+"""
+
+from typing import Optional, Sequence
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+
+class _Node:
+    __slots__ = ("children", "value")
+
+    def __init__(self):
+        self.children: dict[int, "_Node"] = {}
+        self.value: Optional[str] = None  # set when a full string ends here
+
+
+class TokenTrie:
+    """Prefix tree over the token ids of a set of strings."""
+
+    def __init__(self):
+        self.root = _Node()
+        self.depth = 0
+        self.size = 0
+
+    @classmethod
+    def build(cls, tokenizer, strings: Sequence[str]) -> "TokenTrie":
+        trie = cls()
+        for s in strings:
+            trie.insert(tokenizer.encode(s, add_special_tokens=False), s)
+        return trie
+
+    def insert(self, token_ids: Sequence[int], value: str) -> None:
+        node = self.root
+        for token_id in token_ids:
+            node = node.children.setdefault(token_id, _Node())
+        node.value = value
+        self.depth = max(self.depth, len(token_ids))
+        self.size += 1
+
+    def node(self, token_ids: Sequence[int]) -> Optional[_Node]:
+        node = self.root
+        for token_id in token_ids:
+            node = node.children.get(token_id)
+            if node is None:
+                return None
+        return node
+
+    def value(self, token_ids: Sequence[int]) -> Optional[str]:
+        """The allowed string spelled by ``token_ids``, if it is complete."""
+        node = self.node(token_ids)
+        return node.value if node is not None else None
+
+
+class TrieLogitsProcessor(LogitsProcessor):
+    """Masks each row's scores to the tokens that continue an allowed string.
+
+    ``tries[row]`` constrains the tokens generated after ``prompt_len``. A row
+    that has completed a string may also emit ``eos_token_id``; a row off the
+    trie (already stopped and padded) may only emit it.
+    """
+
+    def __init__(self, tries: list[TokenTrie], prompt_len: int, eos_token_id: int):
+        self.tries = tries
+        self.prompt_len = prompt_len
+        self.eos_token_id = eos_token_id
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        mask = torch.full_like(scores, float("-inf"))
+        for row, trie in enumerate(self.tries):
+            node = trie.node(input_ids[row, self.prompt_len:].tolist())
+            allowed = list(node.children) if node is not None else []
+            if node is None or node.value is not None:
+                allowed.append(self.eos_token_id)
+            mask[row, allowed] = 0.0
+        return scores + mask
+
+
+class TrieCompleteCriteria(StoppingCriteria):
+    """Stops each row once it has spelled a string no other allowed string extends."""
+
+    def __init__(self, tries: list[TokenTrie], prompt_len: int):
+        self.tries = tries
+        self.prompt_len = prompt_len
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = []
+        for row, trie in enumerate(self.tries):
+            node = trie.node(input_ids[row, self.prompt_len:].tolist())
+            done.append(node is None or (node.value is not None and not node.children))
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,108 @@
+"""Precomputed token-id -> display-string tables.
+
+Decoding token ids one at a time is a hot path in the LM endpoints. Each
+model's tokenizer gets a table built once and stored as a single UTF-8 blob
+plus an offsets array, memory-mapped from the artifact cache on later starts.
+
+For byte-level BPE tokenizers (GPT-2, Llama 3) tokens are mapped back to
+their raw bytes. A token holding only part of a multi-byte UTF-8 character
+renders its leftover bytes as ``<0xE2>``-style markers instead of U+FFFD.
+"""
+
+import codecs
+import re
+
+import numpy as np
+
+from .artifacts import artifact_dir, fingerprint, load_npy, save_npy, tokenizer_fingerprint
+
+TABLE_VERSION = 1
+
+_BYTE_TOKEN = re.compile(r"^<0x[0-9A-Fa-f]{2}>$")
+
+
+def _hex_bytes(error: UnicodeDecodeError):
+    bad = error.object[error.start:error.end]
+    return "".join(f"<0x{b:02X}>" for b in bad), error.end
+
+
+codecs.register_error("dmlm_hex", _hex_bytes)
+
+
+def _is_byte_level(tokenizer) -> bool:
+    if getattr(tokenizer, "is_fast", False):
+        decoder = tokenizer.backend_tokenizer.decoder
+        return decoder is not None and decoder.__class__.__name__ == "ByteLevel"
+    return hasattr(tokenizer, "byte_decoder")
+
+
+def _display_strings(tokenizer) -> list[str]:
+    size = len(tokenizer)
+    tokens = tokenizer.convert_ids_to_tokens(list(range(size)))
+    special = set(tokenizer.all_special_ids)
+
+    if _is_byte_level(tokenizer):
+        from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+        byte_decoder = {char: byte for byte, char in bytes_to_unicode().items()}
+    else:
+        byte_decoder = None
+
+    strings = []
+    for tid, token in enumerate(tokens):
+        if token is None:
+            strings.append("")
+        elif tid in special or _BYTE_TOKEN.match(token):
+            strings.append(token)
+        elif byte_decoder is not None and all(char in byte_decoder for char in token):
+            raw = bytes(byte_decoder[char] for char in token)
+            strings.append(raw.decode("utf-8", errors="dmlm_hex"))
+        else:
+            strings.append(tokenizer.decode([tid], skip_special_tokens=False))
+    return strings
+
+
+class DecodeTable:
+    """Compact id -> display string lookup backed by two NumPy arrays."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: list[str]) -> "DecodeTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    @classmethod
+    def build(cls, tokenizer) -> "DecodeTable":
+        return cls.from_strings(_display_strings(tokenizer))
+
+    @classmethod
+    def load_or_build(cls, tokenizer) -> "DecodeTable":
+        """Memory-maps the cached table for this tokenizer, building it on a miss."""
+        directory = artifact_dir("decode_tables", fingerprint(TABLE_VERSION, tokenizer_fingerprint(tokenizer)))
+        blob = load_npy(directory / "blob.npy")
+        offsets = load_npy(directory / "offsets.npy")
+        if blob is not None and offsets is not None and len(offsets) == len(tokenizer) + 1:
+            return cls(blob, offsets)
+
+        table = cls.build(tokenizer)
+        try:
+            save_npy(directory / "blob.npy", table._blob)
+            save_npy(directory / "offsets.npy", table._offsets)
+        except OSError as e:
+            print(f"Decode table cache not written ({e}); continuing in memory.")
+        return table
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, token_id: int) -> str:
+        start, end = self._offsets[token_id], self._offsets[token_id + 1]
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def decode_ids(self, token_ids) -> list[str]:
+        return [self[int(tid)] for tid in token_ids]
@@ -0,0 +1,44 @@
+"""Request logging with a switch between verbose prints and sampled JSON lines.
+
+``DMLM_LOG_MODE=verbose`` (default) prints messages as the routers always
+have. ``DMLM_LOG_MODE=structured`` emits one JSON line per event through the
+``dmlm`` logger, keeps only ``DMLM_LOG_SAMPLE_RATE`` of info events and
+truncates long text fields such as prompts and completions. Errors are
+never sampled out.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+
+LOG_MODE = os.getenv("DMLM_LOG_MODE", "verbose")
+LOG_SAMPLE_RATE = float(os.getenv("DMLM_LOG_SAMPLE_RATE", "0.01"))
+MAX_FIELD_CHARS = 200
+
+_logger = logging.getLogger("dmlm")
+if not _logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+
+def _truncate(value):
+    if isinstance(value, str) and len(value) > MAX_FIELD_CHARS:
+        return value[:MAX_FIELD_CHARS] + f"...(+{len(value) - MAX_FIELD_CHARS} chars)"
+    return value
+
+
+def log_event(event: str, message: str, level: str = "info", **fields) -> None:
+    """Logs ``message`` verbatim, or ``event`` plus ``fields`` as sampled JSON."""
+    if LOG_MODE != "structured":
+        print(message)
+        return
+    if level == "info" and random.random() >= LOG_SAMPLE_RATE:
+        return
+    record = {"event": event, "level": level}
+    record.update({k: _truncate(v) for k, v in fields.items()})
+    _logger.log(logging.ERROR if level == "error" else logging.INFO, json.dumps(record, default=str))
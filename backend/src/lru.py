@@ -0,0 +1,120 @@
+"""Thread-safe LRU cache shared by the backend's in-process caches."""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """LRU mapping bounded by entry count and/or total byte size.
+
+    ``sizeof`` returns the cost of a value in bytes. When ``max_bytes`` is set,
+    least-recently-used entries are evicted until the total fits the budget.
+    A value larger than the whole budget is not cached at all.
+    ``on_evict(key, value)`` is called, outside the lock, for every entry
+    dropped to make room.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda _value: 0)
+        self._on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value and marks it most-recently-used."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value without touching recency or counters."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            return default if item is _MISSING else item[0]
+
+    def touch(self, key: Hashable) -> None:
+        """Marks an entry most-recently-used without counting a hit."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        """Caches ``value``; returns False if it is larger than the whole budget."""
+        size = self._sizeof(value)
+        with self._lock:
+            old = self._data.pop(key, _MISSING)
+            if old is not _MISSING:
+                self.total_bytes -= old[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return False
+            self._data[key] = (value, size)
+            self.total_bytes += size
+            evicted = self._evict()
+        if self._on_evict is not None:
+            for evicted_key, evicted_value in evicted:
+                self._on_evict(evicted_key, evicted_value)
+        return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+            if item is _MISSING:
+                return default
+            self.total_bytes -= item[1]
+            return item[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def _evict(self) -> list[tuple[Hashable, Any]]:
+        evicted = []
+        while self._data and (
+            (self.max_entries is not None and len(self._data) > self.max_entries)
+            or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            key, (value, size) = self._data.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            evicted.append((key, value))
+        return evicted
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,201 @@
+"""Minimal Prometheus-style metrics for the backend.
+
+Counters and histograms live in a process-wide registry and are rendered in
+the Prometheus text exposition format by the ``/metrics`` endpoint. Each
+uvicorn worker keeps its own registry.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans cache hits (sub-ms) up to multi-second generate calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names: tuple, values: tuple, extra: tuple = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labels), 0.0)
+
+    def total(self) -> float:
+        """Sum over every label combination."""
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_label_str(self.labels, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_str(self.labels, key, (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.setdefault(metric.name, metric)
+        return self._metrics[metric.name]
+
+    def add_collector(self, collect) -> None:
+        """``collect()`` returns extra exposition lines, e.g. cache statistics."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels: tuple = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def histogram(name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+def gauge_lines(name: str, help: str, values: dict[str, float], label: str = "") -> list[str]:
+    """Exposition lines for a point-in-time gauge, one sample per dict entry."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        lines.append(f"{name}{_label_str((label,), (key,)) if label else ''} {value}")
+    return lines
+
+
+# --- Metrics shared across routers ---
+
+REQUEST_LATENCY = histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status")
+)
+QUEUE_WAIT = histogram(
+    "inference_queue_wait_seconds", "Time between submitting inference work and it starting", ("endpoint",)
+)
+MODEL_BUSY = histogram(
+    "inference_model_busy_seconds", "Time the model is held by one batch or job", ("endpoint",)
+)
+BATCH_SIZE = histogram(
+    "inference_batch_size", "Requests served per batched model call", ("endpoint",), SIZE_BUCKETS
+)
+STAGE_LATENCY = histogram(
+    "inference_stage_seconds", "Time per inference stage", ("endpoint", "stage")
+)
+TOKENS_PER_SECOND = histogram(
+    "generation_tokens_per_second", "Generated tokens per second of generate time", ("endpoint",), RATE_BUCKETS
+)
+GENERATED_TOKENS = counter(
+    "generated_tokens_total", "Tokens produced by generate calls", ("endpoint",)
+)
+INFERENCE_TIMEOUTS = counter(
+    "inference_timeouts_total", "Requests answered with 503 after INFERENCE_TIMEOUT", ("endpoint",)
+)
+
+
+def stage(endpoint: str, name: str):
+    """``with stage("token_probs", "forward"): ...`` records one stage's time."""
+    return STAGE_LATENCY.time(endpoint=endpoint, stage=name)
+
+
+async def timing_middleware(request, call_next):
+    """Records per-route latency; the route template keeps label cardinality bounded."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
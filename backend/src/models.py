@@ -1,10 +1,66 @@
 from transformers import GPT2LMHeadModel, pipeline, AutoTokenizer, AutoModelForCausalLM
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+import threading
+import weakref
+import gc
 import torch
+import os
 import re
 import json
+import hashlib
+import functools
+from .artifacts import artifact_dir, fingerprint
+from .decode_table import DecodeTable
 
-def _load_gpt2_model():
-    """Load GPT-2 and apply INT8 dynamic quantization."""
+# Bump when the way the quantized checkpoint is produced changes
+QUANTIZED_CHECKPOINT_VERSION = 1
+
+
+@functools.cache
+def _source_weights_hash(repo_id: str) -> str | None:
+    """Content hash of a model's pretrained weights file.
+
+    The Hugging Face cache stores LFS files as blobs named by their sha256,
+    so the resolved symlink name is the hash; otherwise the file is hashed.
+    """
+    from transformers.utils import cached_file
+    for filename in ("model.safetensors", "pytorch_model.bin"):
+        try:
+            path = cached_file(repo_id, filename, _raise_exceptions_for_missing_entries=False)
+        except OSError:
+            path = None
+        if not path:
+            continue
+        blob_name = os.path.basename(os.path.realpath(path))
+        if blob_name != filename:
+            return blob_name
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    return None
+
+
+@functools.cache
+def _source_revision(repo_id: str) -> str | None:
+    """Hub commit of a model's config, resolved once per process.
+
+    Only config.json is fetched (it is cached alongside the tokenizer), so
+    this works without the weights, e.g. in game-only deployments.
+    """
+    from transformers import AutoConfig
+    try:
+        return AutoConfig.from_pretrained(repo_id)._commit_hash
+    except OSError as e:
+        print(f"Could not resolve the revision of {repo_id} ({e}).")
+        return None
+
+
+def _quantize_gpt2():
     print("Loading GPT-2 weights...")
     model = GPT2LMHeadModel.from_pretrained('gpt2')
     print("Applying INT8 quantization...")
@@ -16,18 +72,229 @@ def _load_gpt2_model():
     print("GPT-2 quantization complete.")
     return quantized
 
-SUPPORTED_MODELS = {
-    "GPT-2": {
-        "tokenizer": AutoTokenizer.from_pretrained('gpt2'),
-        "model": _load_gpt2_model(),
-        "pipeline": pipeline('text-generation', model='gpt2', device=0 if torch.cuda.is_available() else -1)
+
+def _load_gpt2_model():
+    """Load GPT-2 with INT8 dynamic quantization, reusing a cached checkpoint.
+
+    The quantized module is saved under DMLM_CACHE_DIR on first run and
+    memory-mapped on later starts. The cache key covers the source weights'
+    content hash and the torch/transformers versions that pickled it. The
+    checkpoint is a full pickle, so it is only ever read from our own cache.
+    """
+    import transformers
+    weights_hash = _source_weights_hash('gpt2')
+    if weights_hash is None:
+        return _quantize_gpt2()
+
+    key = fingerprint("gpt2", weights_hash, torch.__version__, transformers.__version__, QUANTIZED_CHECKPOINT_VERSION)
+    path = artifact_dir("quantized", key) / "gpt2-int8.pt"
+    if path.exists():
+        try:
+            model = torch.load(path, weights_only=False, mmap=True)
+            print("Loaded quantized GPT-2 from cache.")
+            return model
+        except Exception as e:
+            print(f"Quantized GPT-2 cache unreadable ({e}); rebuilding.")
+
+    quantized = _quantize_gpt2()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        torch.save(quantized, tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Quantized GPT-2 cache not written ({e}).")
+    return quantized
+
+
+def _module_bytes(model) -> int:
+    """Approximate resident size of a model's weights, counting shared storage once."""
+    seen = set()
+    total = 0
+    stack = list(model.state_dict().values())
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (tuple, list)):
+            stack.extend(value)
+        elif isinstance(value, torch.Tensor):
+            try:
+                key = (value.data_ptr(), value.nelement())
+            except RuntimeError:
+                key = id(value)
+            if key not in seen:
+                seen.add(key)
+                total += value.element_size() * value.nelement()
+    return total
+
+
+@dataclass
+class ModelSpec:
+    """How to load one supported model; nothing is loaded until first use."""
+    load_tokenizer: Callable[[], Any]
+    load_model: Callable[[], Any]
+    source: Optional[str] = None  # Hub repo id of the pretrained weights
+    estimated_bytes: int = 0  # weight memory before the first load has measured it
+
+
+class ModelRegistry(Mapping):
+    """Lazily-loaded ``{model_name: components}`` mapping.
+
+    Looking up a name loads its tokenizer and model on first use and returns
+    ``{"tokenizer", "model", "pipeline", "decode_table"}``. The generation
+    pipeline wraps the same model object, so weights are held once. ``in``
+    and ``keys()`` never load.
+
+    Each model loads under its own lock, so a cold load never stalls lookups
+    of other models. When ``memory_budget_bytes`` is set, least-recently-used
+    models are evicted *before* a load, using the model's measured (or
+    estimated) size, so peak memory stays within the budget. An evicted
+    model's weights are only freed once no caller still holds its
+    components; until then they count as "draining" in ``loaded_bytes()`` and
+    ``stats()``, and further evictions make up for them.
+    """
+
+    def __init__(self, specs: dict[str, ModelSpec], memory_budget_bytes: Optional[int] = None):
+        self._specs = specs
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loaded: "OrderedDict[str, dict]" = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._measured: dict[str, int] = {}  # last measured size, kept across evictions
+        self._reserved: dict[str, int] = {}  # models being loaded right now
+        self._draining: dict[str, tuple[weakref.ref, int]] = {}
+        self._tokenizers: dict[str, Any] = {}
+        self._lock = threading.Lock()  # guards the dicts above; never held during a load
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._tokenizer_lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> dict:
+        spec = self._specs[name]
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return self._loaded[name]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if name in self._loaded:  # loaded by another caller while we waited
+                    self._loaded.move_to_end(name)
+                    return self._loaded[name]
+                estimate = self._measured.get(name, spec.estimated_bytes)
+                self._make_room(estimate)
+                self._reserved[name] = estimate
+
+            try:
+                tokenizer = self.tokenizer(name)
+                model = spec.load_model()
+                model.eval()
+                components = {
+                    "tokenizer": tokenizer,
+                    "model": model,
+                    "pipeline": pipeline('text-generation', model=model, tokenizer=tokenizer),
+                    "decode_table": DecodeTable.load_or_build(tokenizer),
+                }
+                size = _module_bytes(model)
+            finally:
+                with self._lock:
+                    self._reserved.pop(name, None)
+
+            with self._lock:
+                self._loaded[name] = components
+                self._sizes[name] = self._measured[name] = size
+                print(f"Loaded {name} ({size / 2**20:.0f} MB of weights).")
+                if estimate < size:
+                    self._make_room(0, keep=name)  # the estimate was low
+                return components
+
+    def _draining_bytes(self) -> int:
+        for name, (ref, _) in list(self._draining.items()):
+            if ref() is None:
+                del self._draining[name]
+        return sum(size for _, size in self._draining.values())
+
+    def _make_room(self, incoming: int, keep: Optional[str] = None) -> None:
+        """Evicts LRU models until ``incoming`` more bytes fit the budget. Caller holds ``_lock``."""
+        if self.memory_budget_bytes is None:
+            return
+        def used() -> int:
+            return sum(self._sizes.values()) + sum(self._reserved.values()) + self._draining_bytes()
+        while used() + incoming > self.memory_budget_bytes:
+            victim = next((name for name in self._loaded if name != keep), None)
+            if victim is None:
+                break
+            components = self._loaded.pop(victim)
+            size = self._sizes.pop(victim)
+            self._draining[victim] = (weakref.ref(components["model"]), size)
+            del components
+            gc.collect()  # frees the weights now unless a caller still holds them
+            print(f"Evicted {victim} to stay within the model memory budget.")
+        if used() + incoming > self.memory_budget_bytes:
+            print("Warning: the model memory budget is exceeded (model too large or evicted weights still in use).")
+
+    def tokenizer(self, name: str):
+        """Loads only the tokenizer; tokenizers are small and never evicted."""
+        tokenizer = self._tokenizers.get(name)
+        if tokenizer is None:
+            with self._tokenizer_lock:
+                if name not in self._tokenizers:
+                    self._tokenizers[name] = self._specs[name].load_tokenizer()
+                tokenizer = self._tokenizers[name]
+        return tokenizer
+
+    def revision(self, name: str) -> str | None:
+        """Hub commit a model's files come from; memoized, never loads or hashes weights."""
+        source = self._specs[name].source
+        return _source_revision(source) if source else None
+
+    def loaded_bytes(self) -> int:
+        """Weights of loaded models plus evicted ones still referenced by callers."""
+        with self._lock:
+            return sum(self._sizes.values()) + self._draining_bytes()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def __contains__(self, name) -> bool:
+        return name in self._specs
+
+    def __iter__(self):
+        return iter(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            draining = self._draining_bytes()
+            return {
+                "supported": list(self._specs),
+                "loaded": dict(self._sizes),
+                "loading": list(self._reserved),
+                "draining": {name: size for name, (_, size) in self._draining.items()},
+                "loaded_bytes": sum(self._sizes.values()) + draining,
+                "memory_budget_bytes": self.memory_budget_bytes,
+            }
+
+
+# RAM budget for loaded model weights; unset means no limit
+_budget_mb = os.getenv("MODEL_MEMORY_BUDGET_MB")
+
+SUPPORTED_MODELS = ModelRegistry(
+    {
+        "GPT-2": ModelSpec(
+            load_tokenizer=lambda: AutoTokenizer.from_pretrained('gpt2'),
+            load_model=_load_gpt2_model,
+            source='gpt2',
+            estimated_bytes=500 * 2**20,
+        ),
+        #"Llama-3.2": ModelSpec(
+        #    load_tokenizer=lambda: AutoTokenizer.from_pretrained("meta-llama/Llama-3.2-1B-Instruct"),
+        #    load_model=lambda: AutoModelForCausalLM.from_pretrained("meta-llama/Llama-3.2-1B-Instruct"),
+        #    source="meta-llama/Llama-3.2-1B-Instruct",
+        #),
     },
-    #"Llama-3.2": {
-    #    "tokenizer": AutoTokenizer.from_pretrained("meta-llama/Llama-3.2-1B-Instruct"),
-    #    "model": AutoModelForCausalLM.from_pretrained("meta-llama/Llama-3.2-1B-Instruct"),
-    #    "pipeline": pipeline("text-generation", model="meta-llama/Llama-3.2-1B-Instruct")
-    #}
-}
+    memory_budget_bytes=int(_budget_mb) * 2**20 if _budget_mb else None,
+)
 
 def extract_json_from_response(text: str) -> dict | None:
     """Extracts JSON from LM response, handling markdown code blocks and extra text."""
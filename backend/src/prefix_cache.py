@@ -0,0 +1,353 @@
+"""Token-id prefix cache for incremental causal-LM forward passes.
+
+The search-tree UI asks for next-token probabilities of a prompt, then of the
+same prompt plus one token, and so on. Caching ``past_key_values`` and the
+last-position logits per token-id prefix lets each expansion run a single
+incremental forward step instead of re-encoding the whole prompt.
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import torch
+
+from .lru import LRUCache
+
+
+@dataclass
+class PrefixEntry:
+    """Cached state after running the model over a token-id prefix."""
+    past_key_values: tuple  # legacy ((key, value), ...) layout, one pair per layer
+    last_logits: torch.Tensor  # [vocab] logits at the final prefix position
+    nbytes: int
+
+
+def _tensor_bytes(obj) -> int:
+    if isinstance(obj, torch.Tensor):
+        return obj.element_size() * obj.nelement()
+    if isinstance(obj, (tuple, list)):
+        return sum(_tensor_bytes(o) for o in obj)
+    return 0
+
+
+def to_legacy_cache(past) -> tuple:
+    """Converts a transformers ``Cache`` object to immutable tuples of tensors."""
+    if hasattr(past, "to_legacy_cache"):
+        return past.to_legacy_cache()
+    return past
+
+
+def from_legacy_cache(legacy: tuple):
+    """Builds a fresh ``DynamicCache`` that does not alias the cached entry.
+
+    ``DynamicCache.update`` concatenates into new tensors, so the stored
+    tuples are never mutated by a later forward pass.
+    """
+    from transformers import DynamicCache
+    return DynamicCache.from_legacy_cache(legacy)
+
+
+class _Node:
+    __slots__ = ("children", "cached")
+
+    def __init__(self):
+        self.children: dict[int, "_Node"] = {}
+        self.cached = False  # an entry for the prefix ending here is in the LRU
+
+
+class _PrefixIndex:
+    """Token trie over the cached prefixes of one namespace.
+
+    Finding every cached prefix of a prompt is one walk down the trie, so a
+    lookup costs O(len(ids)) instead of hashing each of its prefixes.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+
+    def add(self, ids: list[int]) -> None:
+        node = self.root
+        for token_id in ids:
+            node = node.children.setdefault(token_id, _Node())
+        node.cached = True
+
+    def remove(self, ids: list[int]) -> None:
+        path = [self.root]
+        for token_id in ids:
+            node = path[-1].children.get(token_id)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].cached = False
+        # Drop the branch back to the last node still in use
+        for depth in range(len(ids), 0, -1):
+            node = path[depth]
+            if node.cached or node.children:
+                break
+            del path[depth - 1].children[ids[depth - 1]]
+
+    def cached_lengths(self, ids: list[int]) -> list[int]:
+        """Lengths of the cached prefixes of ``ids``, shortest first."""
+        lengths = []
+        node = self.root
+        for n, token_id in enumerate(ids, 1):
+            node = node.children.get(token_id)
+            if node is None:
+                break
+            if node.cached:
+                lengths.append(n)
+        return lengths
+
+
+class PrefixCache:
+    """LRU cache of model state keyed by ``(namespace, token-id prefix)``.
+
+    Entries are bounded by a byte budget covering the key/value tensors and
+    the stored logits. ``namespace`` separates models sharing one cache. A
+    per-namespace token trie mirrors the cached keys for longest-prefix
+    lookups.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: Optional[int] = None):
+        self._lru = LRUCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            sizeof=lambda entry: entry.nbytes,
+            on_evict=self._forget,
+        )
+        self._indexes: dict[str, _PrefixIndex] = {}
+        self._index_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.tokens_reused = 0
+        self.tokens_computed = 0
+
+    def _forget(self, key: tuple, _entry) -> None:
+        namespace, ids = key
+        with self._index_lock:
+            index = self._indexes.get(namespace)
+            if index is not None:
+                index.remove(list(ids))
+
+    def longest_prefix(self, namespace: str, ids: list[int]) -> tuple[int, Optional[PrefixEntry]]:
+        """Returns ``(length, entry)`` for the longest cached prefix of ``ids``."""
+        with self._index_lock:
+            index = self._indexes.get(namespace)
+            lengths = index.cached_lengths(ids) if index is not None else []
+        for n in reversed(lengths):
+            key = (namespace, tuple(ids[:n]))
+            entry = self._lru.peek(key)
+            if entry is not None:
+                self._lru.touch(key)
+                return n, entry
+            self._forget(key, None)  # dropped between the walk and the read
+        return 0, None
+
+    def store(self, namespace: str, ids: list[int], past_key_values, last_logits: torch.Tensor) -> PrefixEntry:
+        legacy = to_legacy_cache(past_key_values)
+        entry = PrefixEntry(
+            past_key_values=legacy,
+            last_logits=last_logits,
+            nbytes=_tensor_bytes(legacy) + _tensor_bytes(last_logits),
+        )
+        with self._index_lock:
+            self._indexes.setdefault(namespace, _PrefixIndex()).add(ids)
+        if not self._lru.put((namespace, tuple(ids)), entry):
+            self._forget((namespace, tuple(ids)), None)
+        return entry
+
+    def record(self, prefix_len: int, total_len: int) -> None:
+        with self._lock:
+            if prefix_len == total_len:
+                self.hits += 1
+            elif prefix_len > 0:
+                self.partial_hits += 1
+            else:
+                self.misses += 1
+            self.tokens_reused += prefix_len
+            self.tokens_computed += total_len - prefix_len
+
+    def clear(self) -> None:
+        self._lru.clear()
+        with self._index_lock:
+            self._indexes.clear()
+
+    def stats(self) -> dict:
+        lru = self._lru.stats()
+        with self._lock:
+            lookups = self.hits + self.partial_hits + self.misses
+            return {
+                "entries": lru["entries"],
+                "bytes": lru["bytes"],
+                "max_bytes": self._lru.max_bytes,
+                "evictions": lru["evictions"],
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.partial_hits) / lookups, 4) if lookups else 0.0,
+                "tokens_reused": self.tokens_reused,
+                "tokens_computed": self.tokens_computed,
+            }
+
+
+@torch.no_grad()
+def forward_with_cache(cache: PrefixCache, namespace: str, model, ids: list[int]) -> PrefixEntry:
+    """Runs ``model`` over ``ids``, reusing the longest cached prefix.
+
+    An exact hit costs no forward pass; a partial hit runs only the uncached
+    suffix on top of the stored key/value tensors. The result is cached.
+    """
+    return _forward_from(cache, namespace, model, ids, *cache.longest_prefix(namespace, ids))
+
+
+def _forward_from(
+    cache: PrefixCache, namespace: str, model, ids: list[int], prefix_len: int, entry: Optional[PrefixEntry]
+) -> PrefixEntry:
+    """``forward_with_cache`` given the result of the prefix lookup."""
+    cache.record(prefix_len, len(ids))
+    if entry is not None and prefix_len == len(ids):
+        return entry
+
+    past = from_legacy_cache(entry.past_key_values) if entry is not None else None
+    input_ids = torch.tensor([ids[prefix_len:]], dtype=torch.long, device=model.device)
+    output = model(input_ids=input_ids, past_key_values=past, use_cache=True)
+    # Clone so the cached logits don't keep the full [seq, vocab] tensor alive.
+    last_logits = output.logits[0, -1, :].detach().clone()
+    return cache.store(namespace, ids, output.past_key_values, last_logits)
+
+
+def left_pad(sequences: list[list[int]], pad_token_id: int, device=None) -> tuple[torch.Tensor, torch.Tensor]:
+    """Left-pads token-id lists so every row ends at the last position.
+
+    Returns ``(input_ids, attention_mask)`` of shape ``[batch, max_len]``.
+    """
+    max_len = max(len(ids) for ids in sequences)
+    input_ids = torch.full((len(sequences), max_len), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(sequences), max_len), dtype=torch.long)
+    for row, ids in enumerate(sequences):
+        input_ids[row, max_len - len(ids):] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, max_len - len(ids):] = 1
+    return input_ids.to(device), attention_mask.to(device)
+
+
+@torch.no_grad()
+def forward_batch_with_cache(
+    cache: PrefixCache, namespace: str, model, batch_ids: list[list[int]], pad_token_id: int
+) -> list[PrefixEntry]:
+    """Batched ``forward_with_cache`` for concurrent requests.
+
+    Exact hits are served from the cache and partial hits run their short
+    suffix incrementally. All remaining prompts share one left-padded forward
+    pass; each row's key/value tensors are sliced past its padding and cached
+    on their own, so later expansions of any row hit the cache.
+    """
+    results: list[Optional[PrefixEntry]] = [None] * len(batch_ids)
+    misses: dict[tuple, list[int]] = {}
+    for i, ids in enumerate(batch_ids):
+        prefix_len, entry = cache.longest_prefix(namespace, ids)
+        if prefix_len > 0 or len(batch_ids) == 1:
+            results[i] = _forward_from(cache, namespace, model, ids, prefix_len, entry)
+        else:
+            misses.setdefault(tuple(ids), []).append(i)
+
+    if len(misses) == 1:
+        ids, rows = next(iter(misses.items()))
+        entry = _forward_from(cache, namespace, model, list(ids), 0, None)
+        for i in rows:
+            results[i] = entry
+    elif misses:
+        sequences = [list(ids) for ids in misses]
+        input_ids, attention_mask = left_pad(sequences, pad_token_id, model.device)
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+        output = model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True,
+        )
+        legacy = to_legacy_cache(output.past_key_values)
+        max_len = input_ids.shape[1]
+        for row, (ids, rows) in enumerate(misses.items()):
+            pad = max_len - len(ids)
+            row_past = tuple(
+                (key[row:row + 1, :, pad:, :].clone(), value[row:row + 1, :, pad:, :].clone())
+                for key, value in legacy
+            )
+            cache.record(0, len(ids))
+            entry = cache.store(namespace, list(ids), row_past, output.logits[row, -1, :].detach().clone())
+            for i in rows:
+                results[i] = entry
+    return results
+
+
+@torch.no_grad()
+def continuation_logprobs(
+    cache: PrefixCache,
+    namespace: str,
+    model,
+    prefix_ids: list[int],
+    continuations: list[list[int]],
+) -> list[float]:
+    """Log-likelihood of each continuation given a shared prefix.
+
+    The prefix runs once (or comes from the cache). The continuations are then
+    packed into one row after it, so scoring N candidates costs one prefix
+    forward plus one short forward, and the prefix key/value tensors are
+    extended once rather than copied for every candidate.
+    """
+    entry = forward_with_cache(cache, namespace, model, prefix_ids)
+    first = torch.log_softmax(entry.last_logits.float(), dim=-1)
+    totals = [first[ids[0]].item() for ids in continuations]
+    for row, extra in enumerate(_packed_continuation_logprobs(model, entry, len(prefix_ids), continuations)):
+        totals[row] += extra
+    return totals
+
+
+def _packed_continuation_logprobs(model, entry: PrefixEntry, prefix_len: int, continuations: list[list[int]]) -> list[float]:
+    """Sum of log-probs of tokens 2..L of each continuation, in one forward.
+
+    The continuations sit side by side in a single sequence. A 4D attention
+    mask lets each token see the prefix and the earlier tokens of its own
+    continuation only, and position ids restart at ``prefix_len`` for each.
+    """
+    # Token j of a continuation's input predicts its token j + 1
+    inputs = [ids[:-1] for ids in continuations]
+    total = sum(len(ids) for ids in inputs)
+    if total == 0:
+        return [0.0] * len(continuations)
+
+    dtype = entry.past_key_values[0][0].dtype
+    input_ids = torch.tensor([[token_id for ids in inputs for token_id in ids]], dtype=torch.long)
+    position_ids = torch.empty((1, total), dtype=torch.long)
+    mask = torch.full((1, 1, total, prefix_len + total), torch.finfo(dtype).min, dtype=dtype)
+    mask[..., :prefix_len] = 0
+    offsets = []
+    start = 0
+    for ids in inputs:
+        n = len(ids)
+        position_ids[0, start:start + n] = torch.arange(prefix_len, prefix_len + n)
+        block = mask[0, 0, start:start + n, prefix_len + start:prefix_len + start + n]
+        block.masked_fill_(torch.ones(n, n, dtype=torch.bool).tril(), 0)
+        offsets.append(start)
+        start += n
+
+    logits = model(
+        input_ids=input_ids.to(model.device),
+        attention_mask=mask.to(model.device),
+        position_ids=position_ids.to(model.device),
+        past_key_values=from_legacy_cache(entry.past_key_values),
+        use_cache=True,
+    ).logits.float()
+    logprobs = torch.log_softmax(logits[0], dim=-1)
+    totals = []
+    for ids, start in zip(continuations, offsets):
+        if len(ids) < 2:
+            totals.append(0.0)
+            continue
+        targets = torch.tensor(ids[1:], dtype=torch.long, device=logprobs.device)
+        positions = torch.arange(start, start + len(ids) - 1, device=logprobs.device)
+        totals.append(logprobs[positions, targets].sum().item())
+    return totals
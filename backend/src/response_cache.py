@@ -0,0 +1,172 @@
+"""Cache for deterministic remote completions.
+
+Responses are keyed by a hash of the full request (model, messages and every
+sampling parameter). Entries live in an in-memory LRU and, when a database
+path is configured, in an SQLite table shared by all workers on the host;
+both tiers expire entries after a TTL. Concurrent identical misses in one
+process wait on a single upstream call instead of each making their own.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from .lru import LRUCache
+
+
+def request_key(params: dict) -> str:
+    """Stable hash of a request's parameters."""
+    payload = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class _SQLiteTier:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1]
+
+    def put(self, key: str, body: str, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, expires_at) VALUES (?, ?, ?)", (key, body, expires_at)
+            )
+
+
+class ResponseCache:
+    """Two-tier TTL cache with in-flight coalescing.
+
+    ``encode``/``decode`` convert a response to and from the text stored in
+    SQLite; the memory tier keeps the decoded object.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        db_path: Optional[Path] = None,
+        encode: Callable[[Any], str] = json.dumps,
+        decode: Callable[[str], Any] = json.loads,
+    ):
+        self.ttl = ttl
+        self.encode = encode
+        self.decode = decode
+        self._memory = LRUCache(max_entries=max_entries)
+        self._disk = _SQLiteTier(db_path) if db_path else None
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "coalesced": 0, "misses": 0}
+        self._counts_lock = threading.Lock()  # the sync path runs on request threads
+
+    def _count(self, outcome: str) -> None:
+        with self._counts_lock:
+            self.counts[outcome] += 1
+
+    def _memory_get(self, key: str) -> Any:
+        entry = self._memory.peek(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at >= time.time():
+                self._memory.touch(key)
+                self._count("memory_hits")
+                return value
+            self._memory.pop(key)
+        return None
+
+    def _disk_hit(self, key: str, row: Optional[tuple[str, float]]) -> Any:
+        if row is None:
+            return None
+        value = self.decode(row[0])
+        self._memory.put(key, (value, row[1]))
+        self._count("disk_hits")
+        return value
+
+    def get(self, key: str) -> Any:
+        value = self._memory_get(key)
+        if value is None and self._disk is not None:
+            value = self._disk_hit(key, self._disk.get(key))
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl
+        self._memory.put(key, (value, expires_at))
+        if self._disk is not None:
+            self._disk.put(key, self.encode(value), expires_at)
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            self._count("misses")
+            value = fetch()
+            self.put(key, value)
+        return value
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable]) -> Any:
+        try:
+            value = await fetch()
+            expires_at = time.time() + self.ttl
+            self._memory.put(key, (value, expires_at))
+            if self._disk is not None:
+                try:
+                    await asyncio.to_thread(self._disk.put, key, self.encode(value), expires_at)
+                except Exception as e:  # the response is still good; only the disk copy is lost
+                    print(f"Response cache write failed: {e}")
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def get_or_fetch_async(self, key: str, fetch: Callable[[], Awaitable]) -> Any:
+        """Cached value, or the result of one shared ``fetch`` for all concurrent misses.
+
+        The fetch runs in its own task, so a caller that is cancelled (client
+        disconnect) neither cancels the upstream call nor fails the others
+        waiting on it.
+        """
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        task = self._in_flight.get(key)
+        if task is None and self._disk is not None:
+            value = self._disk_hit(key, await asyncio.to_thread(self._disk.get, key))
+            if value is not None:
+                return value
+            task = self._in_flight.get(key)  # another caller may have started it meanwhile
+
+        if task is not None:
+            self._count("coalesced")
+        else:
+            self._count("misses")
+            task = asyncio.get_running_loop().create_task(self._fetch_and_store(key, fetch))
+            # Marks a failure as retrieved even if every waiter was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        with self._counts_lock:
+            counts = dict(self.counts)
+        lookups = sum(counts.values())
+        hits = counts["memory_hits"] + counts["disk_hits"] + counts["coalesced"]
+        return {
+            **counts,
+            "entries": len(self._memory),
+            "disk": self._disk is not None,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,242 @@
+"""Pooled HTTP transport and failure handling for remote model APIs.
+
+One ``httpx.AsyncClient`` per process is shared by every request to an
+upstream, with explicit pool limits, keep-alive and timeouts, so the fan-out
+of a beam step reuses warm connections instead of opening new ones.
+``UpstreamGuard.call`` wraps each request with a per-model concurrency cap,
+retries with exponential backoff and full jitter on retryable failures, and
+a per-model circuit breaker that fails fast while an upstream is down.
+
+Connection reuse, retries and breaker state are exported through ``metrics``.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from . import metrics
+
+MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "60"))
+HTTP2 = os.getenv("UPSTREAM_HTTP2", "0") == "1"
+
+MODEL_CONCURRENCY = int(os.getenv("UPSTREAM_MODEL_CONCURRENCY", "16"))
+MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+UPSTREAM_REQUESTS = metrics.counter(
+    "upstream_requests_total", "Calls to remote model APIs by final outcome", ("model", "outcome")
+)
+UPSTREAM_RETRIES = metrics.counter(
+    "upstream_retries_total", "Retried calls to remote model APIs", ("model", "reason")
+)
+UPSTREAM_LATENCY = metrics.histogram(
+    "upstream_request_seconds", "Latency of one call to a remote model API, retries included", ("model",)
+)
+HTTP_REQUESTS = metrics.counter("upstream_http_requests_total", "HTTP requests sent upstream")
+HTTP_CONNECTIONS = metrics.counter("upstream_http_connections_total", "New upstream connections opened")
+
+
+class CircuitOpenError(Exception):
+    """Raised without contacting the upstream while its breaker is open."""
+
+
+async def _trace(event_name: str, info: dict) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        HTTP_CONNECTIONS.inc()
+
+
+async def _on_request(request: httpx.Request) -> None:
+    HTTP_REQUESTS.inc()
+    request.extensions["trace"] = _trace
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def make_async_http_client() -> httpx.AsyncClient:
+    """An ``AsyncClient`` with the configured pool, timeouts and reuse tracking."""
+    http2 = HTTP2 and http2_available()
+    if HTTP2 and not http2:
+        print("UPSTREAM_HTTP2=1 but the h2 package is not installed; using HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        event_hooks={"request": [_on_request]},
+    )
+
+
+def make_http_client() -> httpx.Client:
+    """The synchronous counterpart, sharing the pool and timeout settings."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; a server's Retry-After takes precedence."""
+    if retry_after is not None:
+        return min(max(retry_after, 0.0), BACKOFF_MAX)
+    return random.uniform(0.0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class _Breaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= BREAKER_RESET_SECONDS:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """Frees the half-open probe slot of an attempt that ended without an outcome."""
+        self.probing = False
+
+    def record(self, ok: bool) -> None:
+        self.probing = False
+        if ok:
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= BREAKER_FAILURES:
+            self.opened_at = time.monotonic()
+
+
+class UpstreamGuard:
+    """Concurrency cap, retries and circuit breaking per upstream model.
+
+    ``classify(exc)`` returns ``(reason, retry_after)`` for a retryable
+    failure, or ``None`` for one that should surface immediately (bad request,
+    auth). Only retryable failures count against the breaker.
+    """
+
+    def __init__(self, classify: Callable[[BaseException], Optional[tuple[str, Optional[float]]]]):
+        self.classify = classify
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._breakers: dict[str, _Breaker] = {}
+        self._in_flight: dict[str, int] = {}
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(MODEL_CONCURRENCY)
+        return self._semaphores[model]
+
+    def _breaker(self, model: str) -> _Breaker:
+        if model not in self._breakers:
+            self._breakers[model] = _Breaker()
+        return self._breakers[model]
+
+    async def call(self, model: str, request: Callable[[], Awaitable]):
+        breaker = self._breaker(model)
+        start = time.perf_counter()
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                if not breaker.allow():
+                    UPSTREAM_REQUESTS.inc(model=model, outcome="rejected")
+                    raise CircuitOpenError(f"Upstream for {model} is failing; retry in {BREAKER_RESET_SECONDS:.0f}s")
+                probe = breaker.state == "half_open"  # allowed while not closed: this attempt holds the probe
+                try:
+                    async with self._semaphore(model):
+                        self._in_flight[model] = self._in_flight.get(model, 0) + 1
+                        try:
+                            result = await request()
+                        finally:
+                            self._in_flight[model] -= 1
+                except Exception as e:
+                    retry = self.classify(e)
+                    if retry is None:
+                        breaker.record(True)  # the upstream answered; the request was at fault
+                        UPSTREAM_REQUESTS.inc(model=model, outcome="error")
+                        raise
+                    breaker.record(False)
+                    if attempt == MAX_RETRIES:
+                        UPSTREAM_REQUESTS.inc(model=model, outcome="error")
+                        raise
+                    reason, retry_after = retry
+                    UPSTREAM_RETRIES.inc(model=model, reason=reason)
+                    await asyncio.sleep(backoff_delay(attempt, retry_after))
+                    continue
+                except BaseException:
+                    # Cancelled (client disconnect, timeout): no verdict on the upstream,
+                    # but a half-open probe must not hold its slot forever
+                    if probe:
+                        breaker.release()
+                    raise
+                breaker.record(True)
+                UPSTREAM_REQUESTS.inc(model=model, outcome="ok")
+                return result
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, model=model)
+
+    def stats(self) -> dict:
+        sent = HTTP_REQUESTS.value()
+        opened = HTTP_CONNECTIONS.value()
+        return {
+            "http_requests": sent,
+            "connections_opened": opened,
+            "connection_reuse_ratio": round(1 - opened / sent, 4) if sent else 0.0,
+            "breakers": {model: breaker.state for model, breaker in self._breakers.items()},
+            "in_flight": dict(self._in_flight),
+        }
+
+    def collect_metrics(self) -> list[str]:
+        stats = self.stats()
+        return (
+            metrics.gauge_lines(
+                "upstream_connection_reuse_ratio", "Share of upstream requests sent on an existing connection",
+                {"": stats["connection_reuse_ratio"]},
+            )
+            + metrics.gauge_lines(
+                "upstream_breaker_open", "1 while a model's circuit breaker rejects calls",
+                {model: int(state == "open") for model, state in stats["breakers"].items()}, "model",
+            )
+            + metrics.gauge_lines(
+                "upstream_in_flight", "Calls currently holding a model's concurrency slot",
+                stats["in_flight"], "model",
+            )
+        )
@@ -0,0 +1,285 @@
+"""Embedding backends for the word game.
+
+A backend turns the game vocabulary into one L2-normalized vector per word.
+Matrices are computed offline (``build_embeddings.py``) in large batches and
+stored as float16 ``.npy`` files, so switching backends at runtime is a
+memory map rather than a model forward. Only the cheap ``static`` backend is
+ever computed on demand.
+
+Register another backend with ``register_backend``, e.g. a contextual
+backend over a different entry of ``SUPPORTED_MODELS``::
+
+    register_backend(contextual_backend("llama-contextual", "Llama 3.2"))
+
+The served copy can be kept compact (``WORD_GAME_EMBEDDING_STORAGE``):
+
+- ``float16`` (default): the stored matrix as is, half the size of float32.
+- ``int8``: symmetric per-row quantization, ``row ~= values * scale``, a
+  quarter of the size. Derived from the float16 file on first load.
+- ``float32``: an upcast copy in memory, the reference path.
+
+Scoring runs on the compact form chunk by chunk; nothing is dequantized as a
+whole. Against float32 scoring, ``build_embeddings.py --check`` enforces the
+tolerances in ``RANK_TOLERANCE``: the largest similarity error and the mean
+overlap of each target's top-100 words. On a clustered 30k x 768 unit
+matrix we measure about 1e-4 / 1.0 for float16 and 2e-3 / 0.99 for int8.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from .models import SUPPORTED_MODELS
+from .artifacts import artifact_dir, fingerprint, load_npy, save_npy
+
+# Rows upcast per chunk when scoring a compact matrix; small chunks stay in cache
+SCORE_CHUNK_ROWS = 512
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+# storage -> (max |similarity error|, min mean top-100 overlap) vs float32
+RANK_TOLERANCE = {
+    "float32": (0.0, 1.0),
+    "float16": (1e-3, 0.99),
+    "int8": (1e-2, 0.95),
+}
+
+
+@dataclass(frozen=True)
+class EmbeddingBackend:
+    name: str
+    model_name: str
+    # (vocab, batch_size) -> [num_words, dim] float32, rows in vocabulary order.
+    # ``vocab`` holds "words", "lemma_ids" and "lemma_offsets".
+    compute: Callable[[dict, int], np.ndarray]
+    description: str = ""
+    # Only backends that need no model forward are built inside a request
+    on_demand: bool = False
+    # Bump when ``compute`` changes so stale matrices miss the cache
+    version: int = 1
+
+
+EMBEDDING_BACKENDS: dict[str, EmbeddingBackend] = {}
+
+
+def register_backend(backend: EmbeddingBackend) -> EmbeddingBackend:
+    EMBEDDING_BACKENDS[backend.name] = backend
+    return backend
+
+
+# ------------------------------------------------------------------ #
+#  Backends
+# ------------------------------------------------------------------ #
+
+
+def static_backend(name: str, model_name: str, use_lemma_groups: bool = False) -> EmbeddingBackend:
+    """Mean of the model's input embedding rows for each word.
+
+    With ``use_lemma_groups`` the rows are every vocabulary token that
+    lemmatizes to the word (the vocabulary is built from that tokenizer);
+    otherwise the word is tokenized with a leading space.
+    """
+
+    def compute(vocab: dict, batch_size: int) -> np.ndarray:
+        components = SUPPORTED_MODELS[model_name]
+        weights = components["model"].get_input_embeddings().weight.detach().float()
+        if use_lemma_groups:
+            ids, offsets = vocab["lemma_ids"], vocab["lemma_offsets"]
+            groups = [ids[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        else:
+            tokenizer = components["tokenizer"]
+            groups = [tokenizer.encode(" " + w, add_special_tokens=False) for w in vocab["words"]]
+        rows = torch.stack([weights[torch.as_tensor(np.asarray(g), dtype=torch.long)].mean(dim=0) for g in groups])
+        return F.normalize(rows, p=2, dim=1).numpy()
+
+    return EmbeddingBackend(
+        name, model_name, compute,
+        description=f"{model_name} input embeddings averaged per word",
+        on_demand=True,
+    )
+
+
+def contextual_backend(name: str, model_name: str, template: str = "The word {word} means") -> EmbeddingBackend:
+    """Mean of the last hidden states over the word's tokens inside ``template``."""
+    prefix, suffix = template.split("{word}")
+
+    def compute(vocab: dict, batch_size: int) -> np.ndarray:
+        components = SUPPORTED_MODELS[model_name]
+        tokenizer, model = components["tokenizer"], components["model"]
+        # A space before the slot belongs to the word's first token
+        word_prefix = " " if prefix.endswith(" ") else ""
+        prefix_ids = tokenizer.encode(prefix.rstrip(" "), add_special_tokens=False)
+        suffix_ids = tokenizer.encode(suffix, add_special_tokens=False) if suffix else []
+        pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+        words = vocab["words"]
+        out = np.empty((len(words), model.config.hidden_size), dtype=np.float32)
+        with torch.inference_mode():
+            for start in range(0, len(words), batch_size):
+                batch = words[start:start + batch_size]
+                word_ids = [tokenizer.encode(word_prefix + w, add_special_tokens=False) for w in batch]
+                seqs = [prefix_ids + ids + suffix_ids for ids in word_ids]
+                width = max(len(s) for s in seqs)
+
+                input_ids = torch.full((len(seqs), width), pad_id, dtype=torch.long)
+                attention_mask = torch.zeros((len(seqs), width), dtype=torch.long)
+                word_mask = torch.zeros((len(seqs), width, 1))
+                for row, (seq, ids) in enumerate(zip(seqs, word_ids)):
+                    input_ids[row, :len(seq)] = torch.tensor(seq)
+                    attention_mask[row, :len(seq)] = 1
+                    word_mask[row, len(prefix_ids):len(prefix_ids) + len(ids)] = 1.0
+
+                hidden = model(
+                    input_ids=input_ids, attention_mask=attention_mask, output_hidden_states=True
+                ).hidden_states[-1].float()
+                pooled = (hidden * word_mask).sum(dim=1) / word_mask.sum(dim=1)
+                out[start:start + len(batch)] = F.normalize(pooled, p=2, dim=1).numpy()
+                print(f"Word Game: {name} embeddings {start + len(batch)}/{len(words)}")
+        return out
+
+    return EmbeddingBackend(
+        name, model_name, compute,
+        description=f"{model_name} last hidden states for the word in {template!r}",
+    )
+
+
+register_backend(static_backend("static", "GPT-2", use_lemma_groups=True))
+register_backend(contextual_backend("contextual", "GPT-2"))
+
+
+# ------------------------------------------------------------------ #
+#  Storage and scoring
+# ------------------------------------------------------------------ #
+
+
+class Int8Matrix:
+    """Row-wise int8 matrix; indexing dequantizes just the selected rows."""
+
+    dtype = np.dtype(np.int8)
+
+    def __init__(self, values: np.ndarray, scales: np.ndarray):
+        self.values = values  # [N, D] int8
+        self.scales = scales  # [N] float32
+
+    @classmethod
+    def quantize(cls, matrix: np.ndarray, chunk_rows: int = SCORE_CHUNK_ROWS) -> "Int8Matrix":
+        values = np.empty(matrix.shape, dtype=np.int8)
+        scales = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), chunk_rows):
+            chunk = np.asarray(matrix[start:start + chunk_rows], dtype=np.float32)
+            scale = np.abs(chunk).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            values[start:start + chunk_rows] = np.round(chunk / scale[:, None])
+            scales[start:start + chunk_rows] = scale
+        return cls(values, scales)
+
+    @property
+    def shape(self) -> tuple:
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.scales.nbytes
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, key) -> np.ndarray:
+        return self.values[key].astype(np.float32) * np.asarray(self.scales[key], dtype=np.float32)[..., None]
+
+    def score(self, query: np.ndarray, chunk_rows: int = SCORE_CHUNK_ROWS) -> np.ndarray:
+        """``self @ query`` with the row scale applied after each chunk's int8 matmul."""
+        out = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), chunk_rows):
+            end = start + chunk_rows
+            out[start:end] = (self.values[start:end].astype(np.float32) @ query) * self.scales[start:end]
+        return out
+
+
+def backend_key(vocab_key: str, backend: EmbeddingBackend) -> str:
+    return fingerprint(
+        vocab_key, backend.name, backend.model_name, backend.version,
+        SUPPORTED_MODELS.revision(backend.model_name),
+    )
+
+
+def matrix_path(vocab_key: str, backend: EmbeddingBackend):
+    return artifact_dir("word_game_embeddings", backend_key(vocab_key, backend)) / "embeddings.npy"
+
+
+def load_matrix(
+    vocab_key: str, backend: EmbeddingBackend, num_words: int, storage: str = "float16"
+) -> np.ndarray | Int8Matrix | None:
+    """Memory-maps a built matrix in ``storage`` form, or None if it is missing or stale."""
+    path = matrix_path(vocab_key, backend)
+    if storage == "int8":
+        values = load_npy(path.with_name("embeddings_int8.npy"))
+        scales = load_npy(path.with_name("scales.npy"))
+        if values is not None and scales is not None and len(values) == len(scales) == num_words:
+            return Int8Matrix(values, scales)
+
+    matrix = load_npy(path)
+    if matrix is None or len(matrix) != num_words:
+        return None
+    if storage == "float32":
+        return np.asarray(matrix, dtype=np.float32)
+    if storage == "int8":
+        quantized = Int8Matrix.quantize(matrix)
+        try:
+            save_npy(path.with_name("embeddings_int8.npy"), quantized.values)
+            save_npy(path.with_name("scales.npy"), quantized.scales)
+        except OSError as e:
+            print(f"Word Game: int8 {backend.name} embeddings not written ({e}).")
+        return quantized
+    return matrix
+
+
+def build_matrix(
+    vocab_key: str, backend: EmbeddingBackend, vocab: dict, batch_size: int = 256, storage: str = "float16"
+) -> np.ndarray | Int8Matrix:
+    """Computes and stores one backend's float16 matrix, then maps it in ``storage`` form."""
+    matrix = backend.compute(vocab, batch_size).astype(np.float16)
+    path = matrix_path(vocab_key, backend)
+    try:
+        save_npy(path, matrix)
+        # A stale int8 copy would otherwise be preferred by load_matrix
+        for name in ("embeddings_int8.npy", "scales.npy"):
+            path.with_name(name).unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Word Game: {backend.name} embeddings not written ({e}).")
+        return Int8Matrix.quantize(matrix) if storage == "int8" else matrix.astype(storage)
+    return load_matrix(vocab_key, backend, len(matrix), storage)
+
+
+def score(matrix: np.ndarray | Int8Matrix, query: np.ndarray, chunk_rows: int = SCORE_CHUNK_ROWS) -> np.ndarray:
+    """``matrix @ query`` in float32, upcasting a compact matrix one chunk at a time."""
+    query = np.asarray(query, dtype=np.float32)
+    if isinstance(matrix, Int8Matrix):
+        return matrix.score(query, chunk_rows)
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    out = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), chunk_rows):
+        out[start:start + chunk_rows] = matrix[start:start + chunk_rows].astype(np.float32) @ query
+    return out
+
+
+def rank_agreement(reference: np.ndarray, matrix: np.ndarray | Int8Matrix, targets, top_k: int = 100) -> dict:
+    """Compares compact scoring with float32 ``reference`` scoring for ``targets``."""
+    max_error, overlaps = 0.0, []
+    for target in targets:
+        expected = reference @ reference[target]
+        actual = score(matrix, matrix[target])
+        max_error = max(max_error, float(np.abs(expected - actual).max()))
+        top_expected = np.argpartition(-expected, top_k)[:top_k]
+        top_actual = np.argpartition(-actual, top_k)[:top_k]
+        overlaps.append(len(np.intersect1d(top_expected, top_actual)) / top_k)
+    return {"max_abs_error": max_error, "mean_top_k_overlap": float(np.mean(overlaps)), "top_k": top_k}
+
+
+def within_tolerance(storage: str, agreement: dict) -> bool:
+    max_error, min_overlap = RANK_TOLERANCE[storage]
+    return agreement["max_abs_error"] <= max_error and agreement["mean_top_k_overlap"] >= min_overlap
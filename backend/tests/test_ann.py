@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from src.ann import EXACT_SEARCH_MAX_ROWS, IVFIndex
+
+RECALL_TARGET = 0.95
+K = 10
+
+
+def unit_rows(rows: np.ndarray) -> np.ndarray:
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+
+def make_clustered(spread: float) -> np.ndarray:
+    """Word-embedding-like data: many topics, each a spread of nearby vectors."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(200, 48))
+    labels = rng.integers(0, len(centers), 12000)
+    return unit_rows(centers[labels] + spread * rng.normal(size=(len(labels), 48)))
+
+
+@pytest.fixture(scope="module")
+def clustered():
+    return make_clustered(1.0)
+
+
+@pytest.fixture(scope="module")
+def index(clustered):
+    return IVFIndex.build(clustered)
+
+
+def exact_top(vectors, query, k, exclude=()):
+    scores = vectors @ query
+    scores[list(exclude)] = -np.inf
+    return np.argsort(-scores, kind="stable")[:k]
+
+
+@pytest.mark.parametrize("spread", [1.0, 1.5])
+def test_tuned_probes_reach_the_recall_target_on_unseen_queries(spread):
+    clustered = make_clustered(spread)
+    index = IVFIndex.build(clustered)
+    n_probe, measured = index.tune_n_probe(clustered, RECALL_TARGET, K)
+    assert measured >= RECALL_TARGET
+    assert n_probe < index.n_lists  # still short of an exact scan
+
+    rows = np.random.default_rng(1).choice(len(clustered), 100, replace=False)
+    hits = 0
+    for row in rows:
+        ids, _ = index.search(clustered, clustered[row], K, n_probe, exclude={int(row)})
+        hits += len(np.intersect1d(ids, exact_top(clustered, clustered[row], K, exclude={row})))
+    assert hits / (K * len(rows)) >= RECALL_TARGET - 0.03
+
+
+def test_more_probes_never_lower_recall(clustered, index):
+    queries = clustered[:50]
+    recalls = [index.recall(clustered, queries, K, n_probe) for n_probe in (1, 4, 16, index.n_lists)]
+    assert recalls == sorted(recalls)
+    assert recalls[-1] == 1.0
+
+
+def test_search_widens_when_exclusion_leaves_too_few_rows(clustered):
+    tiny_lists = IVFIndex.build(clustered, n_lists=len(clustered) // 4, n_iter=2)
+    query = clustered[0]
+    probed = tiny_lists.candidates(query, 1)
+    ids, scores = tiny_lists.search(clustered, query, 20, n_probe=1, exclude=set(probed.tolist()))
+    assert len(ids) == 20
+    assert not set(ids.tolist()) & set(probed.tolist())
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_small_matrices_are_searched_exactly():
+    vectors = unit_rows(np.random.default_rng(2).normal(size=(EXACT_SEARCH_MAX_ROWS // 2, 16)))
+    index = IVFIndex.build(vectors, n_lists=8)
+    ids, _ = index.search(vectors, vectors[3], K, n_probe=1, exclude={3})
+    assert ids.tolist() == exact_top(vectors, vectors[3], K, exclude={3}).tolist()
+
+
+def test_saved_index_round_trips(tmp_path, clustered, index):
+    index.save(tmp_path)
+    loaded = IVFIndex.load(tmp_path, len(clustered))
+    assert np.array_equal(loaded.list_ids, index.list_ids)
+    assert IVFIndex.load(tmp_path, len(clustered) + 1) is None
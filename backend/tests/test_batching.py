@@ -0,0 +1,84 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.batching import MicroBatcher
+
+
+def doubled(items):
+    return [item * 2 for item in items]
+
+
+def slow_doubled(items):
+    time.sleep(0.2)
+    return doubled(items)
+
+
+@pytest.fixture
+def batcher():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        yield MicroBatcher(executor, max_batch_size=8, max_wait_ms=5)
+
+
+def test_concurrent_submissions_share_a_batch(batcher):
+    async def scenario():
+        results = await asyncio.gather(*(batcher.submit(doubled, "k", i) for i in range(5)))
+        assert results == [0, 2, 4, 6, 8]
+        assert batcher.stats()["batches_run"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_items_with_different_keys_run_in_separate_batches(batcher):
+    async def scenario():
+        results = await asyncio.gather(batcher.submit(doubled, "a", 1), batcher.submit(doubled, "b", 2))
+        assert results == [2, 4]
+        assert batcher.stats()["batches_run"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_restarted_worker_keeps_jobs_queued_while_it_was_down(batcher):
+    async def scenario():
+        waiting = asyncio.ensure_future(batcher.submit(doubled, "k", 1))
+        await asyncio.sleep(0)  # queued; the worker task has not started yet
+        batcher._worker.cancel()
+        await asyncio.sleep(0)
+        assert batcher._worker.done() and batcher.stats()["queued"] == 1
+
+        assert await asyncio.wait_for(batcher.submit(doubled, "k", 2), 1) == 4
+        assert await asyncio.wait_for(waiting, 1) == 2
+
+    asyncio.run(scenario())
+
+
+def test_jobs_held_by_a_dying_worker_are_not_left_hanging(batcher):
+    async def scenario():
+        running = asyncio.ensure_future(batcher.submit(slow_doubled, "k", 1))
+        await asyncio.sleep(0.05)  # the worker is inside the batch
+        batcher._worker.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(running, 1)
+        assert await asyncio.wait_for(batcher.submit(doubled, "k", 3), 1) == 6
+
+    asyncio.run(scenario())
+
+
+def test_batch_function_errors_reach_every_caller(batcher):
+    def broken(items):
+        raise ValueError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(
+            batcher.submit(broken, "k", 1), batcher.submit(broken, "k", 2), return_exceptions=True
+        )
+        assert all(isinstance(r, ValueError) for r in results)
+
+    asyncio.run(scenario())
+
+
+def test_a_new_event_loop_gets_a_fresh_queue(batcher):
+    assert asyncio.run(batcher.submit(doubled, "k", 1)) == 2
+    assert asyncio.run(batcher.submit(doubled, "k", 2)) == 4
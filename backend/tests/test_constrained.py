@@ -0,0 +1,68 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from src.constrained import TokenTrie, TrieCompleteCriteria, TrieLogitsProcessor
+
+VOCAB = {"e2": 1, "e4": 2, "e3": 3, "e7": 4, "e8": 5, "q": 6}
+EOS = 7
+PROMPT = [0, 0]
+
+
+class PairTokenizer:
+    """Splits a UCI move into two-character tokens."""
+
+    def encode(self, text, add_special_tokens=True):
+        return [VOCAB[text[i:i + 2]] for i in range(0, len(text), 2)]
+
+
+@pytest.fixture
+def trie():
+    return TokenTrie.build(PairTokenizer(), ["e2e4", "e2e3", "e7e8", "e7e8q"])
+
+
+def ids(*generated):
+    return torch.tensor([PROMPT + list(generated)])
+
+
+def test_build_and_lookup(trie):
+    assert trie.size == 4
+    assert trie.depth == 3
+    assert sorted(trie.root.children) == [1, 4]
+    assert trie.value([1, 2]) == "e2e4"
+    assert trie.value([4, 5]) == "e7e8"
+    assert trie.value([4, 5, 6]) == "e7e8q"
+    assert trie.value([1]) is None  # a prefix, not a complete move
+    assert trie.node([2]) is None
+
+
+def test_processor_allows_only_trie_continuations(trie):
+    processor = TrieLogitsProcessor([trie], len(PROMPT), EOS)
+
+    def allowed(*generated):
+        scores = processor(ids(*generated), torch.zeros(1, 8))
+        return set(torch.isfinite(scores[0]).nonzero().flatten().tolist())
+
+    assert allowed() == {1, 4}
+    assert allowed(1) == {2, 3}
+    assert allowed(4, 5) == {6, EOS}  # "e7e8" is complete but "e7e8q" extends it
+    assert allowed(3) == {EOS}  # off the trie: only end the row
+
+
+def test_processor_masks_rows_independently(trie):
+    other = TokenTrie.build(PairTokenizer(), ["e3e4"])
+    processor = TrieLogitsProcessor([trie, other], len(PROMPT), EOS)
+    scores = processor(torch.tensor([PROMPT, PROMPT]), torch.zeros(2, 8))
+    assert torch.isfinite(scores[0]).nonzero().flatten().tolist() == [1, 4]
+    assert torch.isfinite(scores[1]).nonzero().flatten().tolist() == [3]
+
+
+def test_criteria_stop_on_unextendable_strings(trie):
+    criteria = TrieCompleteCriteria([trie], len(PROMPT))
+    assert not criteria(ids(), None).item()
+    assert not criteria(ids(1), None).item()
+    assert criteria(ids(1, 2), None).item()
+    assert not criteria(ids(4, 5), None).item()  # could still become "e7e8q"
+    assert criteria(ids(4, 5, 6), None).item()
+    assert criteria(ids(3), None).item()  # off the trie
@@ -0,0 +1,121 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from src.prefix_cache import (
+    PrefixCache, _PrefixIndex, continuation_logprobs, forward_batch_with_cache, forward_with_cache
+)
+
+VOCAB_SIZE = 4
+
+
+class CountingModel:
+    """One-layer stand-in whose last logits encode the total sequence length."""
+
+    device = torch.device("cpu")
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input_ids, past_key_values=None, use_cache=True, **kwargs):
+        self.calls.append(input_ids.shape[1])
+        past_len = past_key_values.get_seq_length() if past_key_values is not None else 0
+        total = past_len + input_ids.shape[1]
+        kv = torch.zeros(input_ids.shape[0], 1, total, 2)
+        logits = torch.zeros(input_ids.shape[0], input_ids.shape[1], VOCAB_SIZE)
+        logits[:, -1, 0] = total
+        return SimpleNamespace(logits=logits, past_key_values=((kv, kv.clone()),))
+
+
+def test_miss_then_exact_hit():
+    cache, model = PrefixCache(max_bytes=1 << 20), CountingModel()
+    entry = forward_with_cache(cache, "m", model, [1, 2, 3])
+    assert model.calls == [3]
+    assert forward_with_cache(cache, "m", model, [1, 2, 3]) is entry
+    assert model.calls == [3]  # no forward pass for an exact hit
+    stats = cache.stats()
+    assert (stats["hits"], stats["partial_hits"], stats["misses"]) == (1, 0, 1)
+
+
+def test_partial_hit_runs_only_the_suffix():
+    cache, model = PrefixCache(max_bytes=1 << 20), CountingModel()
+    forward_with_cache(cache, "m", model, [1, 2, 3])
+    entry = forward_with_cache(cache, "m", model, [1, 2, 3, 4, 5])
+    assert model.calls == [3, 2]
+    assert entry.last_logits[0].item() == 5
+    assert entry.past_key_values[0][0].shape[2] == 5
+    stats = cache.stats()
+    assert (stats["partial_hits"], stats["tokens_reused"], stats["tokens_computed"]) == (1, 3, 5)
+
+
+def test_longest_prefix_picks_the_deepest_cached_prefix():
+    cache, model = PrefixCache(max_bytes=1 << 20), CountingModel()
+    for ids in ([1], [1, 2, 3], [1, 2, 3, 4, 5, 6]):
+        forward_with_cache(cache, "m", model, ids)
+    assert cache.longest_prefix("m", [1, 2, 3, 4, 9])[0] == 3
+    assert cache.longest_prefix("m", [1, 2, 9])[0] == 1
+    assert cache.longest_prefix("m", [2, 1]) == (0, None)
+
+
+def test_namespaces_do_not_share_entries():
+    cache, model = PrefixCache(max_bytes=1 << 20), CountingModel()
+    forward_with_cache(cache, "a", model, [1, 2])
+    assert cache.longest_prefix("b", [1, 2]) == (0, None)
+
+
+def test_eviction_and_clear_drop_index_entries():
+    cache, model = PrefixCache(max_bytes=1 << 20, max_entries=1), CountingModel()
+    forward_with_cache(cache, "m", model, [1, 2])
+    forward_with_cache(cache, "m", model, [7, 8])  # evicts [1, 2]
+    assert cache.longest_prefix("m", [1, 2, 3]) == (0, None)
+    assert not cache._indexes["m"].root.children.get(1)
+    assert cache.longest_prefix("m", [7, 8])[0] == 2
+    cache.clear()
+    assert cache.longest_prefix("m", [7, 8]) == (0, None)
+
+
+def test_oversized_entry_is_not_indexed():
+    cache, model = PrefixCache(max_bytes=1), CountingModel()
+    forward_with_cache(cache, "m", model, [1, 2])
+    assert cache.longest_prefix("m", [1, 2]) == (0, None)
+    assert not cache._indexes["m"].root.children
+
+
+def test_batch_serves_hits_and_shares_one_pass_for_misses():
+    cache, model = PrefixCache(max_bytes=1 << 20), CountingModel()
+    forward_with_cache(cache, "m", model, [1, 2])
+    model.calls.clear()
+    entries = forward_batch_with_cache(cache, "m", model, [[1, 2], [1, 2, 3], [5, 6, 7], [8, 9]], pad_token_id=0)
+    assert model.calls == [1, 3]  # the partial hit's suffix, then the two misses together
+    assert [e.past_key_values[0][0].shape[2] for e in entries] == [2, 3, 3, 2]
+    assert cache.longest_prefix("m", [8, 9, 10])[0] == 2
+
+
+def test_index_prunes_removed_branches():
+    index = _PrefixIndex()
+    index.add([1, 2, 3])
+    index.add([1, 2])
+    assert index.cached_lengths([1, 2, 3, 4]) == [2, 3]
+    index.remove([1, 2, 3])
+    assert index.cached_lengths([1, 2, 3]) == [2]
+    assert not index.root.children[1].children[2].children
+    index.remove([1, 2])
+    assert not index.root.children
+
+
+def test_packed_continuations_match_separate_forwards():
+    from transformers import GPT2Config, GPT2LMHeadModel
+
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(GPT2Config(vocab_size=32, n_positions=64, n_embd=32, n_layer=2, n_head=2)).eval()
+    prefix, continuations = [3, 1, 4, 1, 5], [[9], [2, 6], [5, 3, 5], [8, 9, 7, 9]]
+    scores = continuation_logprobs(PrefixCache(max_bytes=1 << 24), "m", model, prefix, continuations)
+    for ids, score in zip(continuations, scores):
+        with torch.no_grad():
+            logits = model(torch.tensor([prefix + ids])).logits[0]
+        logprobs = torch.log_softmax(logits.float(), dim=-1)
+        expected = sum(logprobs[len(prefix) - 1 + j, token].item() for j, token in enumerate(ids))
+        assert score == pytest.approx(expected, abs=1e-4)
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from src.lru import LRUCache
+from src.response_cache import ResponseCache, request_key
+
+
+def counting_fetch(calls, delay=0.02, value="v"):
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return {"value": value, "call": len(calls)}
+    return fetch
+
+
+def test_request_key_ignores_dict_order():
+    assert request_key({"model": "m", "temperature": 0}) == request_key({"temperature": 0, "model": "m"})
+    assert request_key({"model": "m"}) != request_key({"model": "n"})
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def scenario():
+        cache = ResponseCache(16, ttl=60)
+        calls = []
+        results = await asyncio.gather(*(cache.get_or_fetch_async("k", counting_fetch(calls)) for _ in range(10)))
+        assert len(calls) == 1
+        assert all(r == results[0] for r in results)
+        assert cache.stats()["misses"] == 1 and cache.stats()["coalesced"] == 9
+        assert await cache.get_or_fetch_async("k", counting_fetch(calls)) == results[0]
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    async def scenario():
+        cache = ResponseCache(16, ttl=60)
+        calls = []
+        leader = asyncio.create_task(cache.get_or_fetch_async("k", counting_fetch(calls)))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(cache.get_or_fetch_async("k", counting_fetch(calls))) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        results = await asyncio.gather(*followers)
+        assert len(calls) == 1
+        assert all(r["call"] == 1 for r in results)
+        # The upstream call finished after the leader left and was still cached
+        assert cache.get("k")["call"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def scenario():
+        cache = ResponseCache(16, ttl=60)
+
+        async def boom():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        results = await asyncio.gather(*(cache.get_or_fetch_async("k", boom) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert cache.get("k") is None
+        calls = []
+        assert (await cache.get_or_fetch_async("k", counting_fetch(calls)))["call"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_entries_expire_after_ttl():
+    async def scenario():
+        cache = ResponseCache(16, ttl=0.05)
+        calls = []
+        await cache.get_or_fetch_async("k", counting_fetch(calls, delay=0))
+        await asyncio.sleep(0.06)
+        assert (await cache.get_or_fetch_async("k", counting_fetch(calls, delay=0)))["call"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_disk_tier_is_shared_across_instances(tmp_path):
+    async def scenario():
+        db = tmp_path / "cache" / "responses.sqlite"
+        calls = []
+        first = ResponseCache(16, ttl=60, db_path=db)
+        value = await first.get_or_fetch_async("k", counting_fetch(calls, delay=0))
+        second = ResponseCache(16, ttl=60, db_path=db)
+        assert await second.get_or_fetch_async("k", counting_fetch(calls, delay=0)) == value
+        assert len(calls) == 1
+        assert second.stats()["disk_hits"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResponseCache(2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a is now most recent
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_lru_byte_budget():
+    lru = LRUCache(max_bytes=10, sizeof=len)
+    lru.put("a", "xxxx")
+    lru.put("b", "yyyy")
+    lru.put("c", "zzzz")
+    assert "a" not in lru and "b" in lru and "c" in lru
+    assert lru.total_bytes == 8 and lru.evictions == 1
+    lru.put("huge", "x" * 11)
+    assert "huge" not in lru
+    assert lru.get("b") == "yyyy"
@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+
+from src import upstream
+from src.upstream import CircuitOpenError, UpstreamGuard
+
+
+class Transient(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def fast_breaker(monkeypatch):
+    monkeypatch.setattr(upstream, "BREAKER_FAILURES", 2)
+    monkeypatch.setattr(upstream, "BREAKER_RESET_SECONDS", 0.05)
+    monkeypatch.setattr(upstream, "MAX_RETRIES", 0)
+    monkeypatch.setattr(upstream, "BACKOFF_BASE", 0.001)
+
+
+def make_guard():
+    return UpstreamGuard(lambda e: ("503", None) if isinstance(e, Transient) else None)
+
+
+async def fail():
+    raise Transient()
+
+
+async def succeed():
+    return "ok"
+
+
+async def trip(guard, model="m"):
+    for _ in range(upstream.BREAKER_FAILURES):
+        with pytest.raises(Transient):
+            await guard.call(model, fail)
+
+
+def test_opens_after_consecutive_failures_and_rejects():
+    async def scenario():
+        guard = make_guard()
+        await trip(guard)
+        assert guard.stats()["breakers"]["m"] == "open"
+        with pytest.raises(CircuitOpenError):
+            await guard.call("m", succeed)
+        assert guard.stats()["breakers"]["m"] == "open"
+
+    asyncio.run(scenario())
+
+
+def test_half_open_probe_success_closes():
+    async def scenario():
+        guard = make_guard()
+        await trip(guard)
+        await asyncio.sleep(0.06)
+        assert guard.stats()["breakers"]["m"] == "half_open"
+        assert await guard.call("m", succeed) == "ok"
+        assert guard.stats()["breakers"]["m"] == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_half_open_probe_failure_reopens():
+    async def scenario():
+        guard = make_guard()
+        await trip(guard)
+        await asyncio.sleep(0.06)
+        with pytest.raises(Transient):
+            await guard.call("m", fail)
+        assert guard.stats()["breakers"]["m"] == "open"
+
+    asyncio.run(scenario())
+
+
+def test_only_one_probe_while_half_open():
+    async def scenario():
+        guard = make_guard()
+        await trip(guard)
+        await asyncio.sleep(0.06)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "ok"
+
+        probe = asyncio.create_task(guard.call("m", slow))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await guard.call("m", succeed)
+        release.set()
+        assert await probe == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_probe_frees_the_slot():
+    async def scenario():
+        guard = make_guard()
+        await trip(guard)
+        await asyncio.sleep(0.06)
+
+        probe = asyncio.create_task(guard.call("m", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert guard.stats()["breakers"]["m"] == "half_open"
+        assert await guard.call("m", succeed) == "ok"
+        assert guard.stats()["breakers"]["m"] == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_non_retryable_errors_do_not_trip():
+    async def scenario():
+        guard = make_guard()
+
+        async def bad():
+            raise BadRequest()
+
+        for _ in range(upstream.BREAKER_FAILURES + 1):
+            with pytest.raises(BadRequest):
+                await guard.call("m", bad)
+        assert guard.stats()["breakers"]["m"] == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_retries_transient_failures(monkeypatch):
+    monkeypatch.setattr(upstream, "MAX_RETRIES", 2)
+    monkeypatch.setattr(upstream, "BREAKER_FAILURES", 5)
+
+    async def scenario():
+        guard = make_guard()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise Transient()
+            return "ok"
+
+        assert await guard.call("flaky", flaky) == "ok"
+        assert len(attempts) == 3
+        assert upstream.UPSTREAM_RETRIES.value(model="flaky", reason="503") == 2
+
+    asyncio.run(scenario())
+
+
+def test_concurrency_is_capped_per_model(monkeypatch):
+    monkeypatch.setattr(upstream, "MODEL_CONCURRENCY", 2)
+
+    async def scenario():
+        guard = make_guard()
+        running = {"now": 0, "peak": 0}
+
+        async def slow():
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+
+        await asyncio.gather(*(guard.call("capped", slow) for _ in range(6)))
+        assert running["peak"] == 2
+
+    asyncio.run(scenario())
@@ -21,11 +21,31 @@ export interface GuessResponse {
   category_match: boolean;
 }
 
+export interface GuessBatchItem {
+  input_word: string;
+  result: GuessResponse | null;
+  error: string | null;
+}
+
+export interface GuessBatchResponse {
+  results: GuessBatchItem[];
+}
+
 export interface HintResponse {
   hint_word: string;
   hint_similarity: number;
 }
 
+export interface Neighbor {
+  word: string;
+  similarity: number;
+}
+
+export interface NeighborsResponse {
+  word: string;
+  neighbors: Neighbor[];
+}
+
 export interface GiveUpResponse {
   target_word: string;
 }
@@ -54,6 +74,17 @@ export async function submitGuess(
   return res.data;
 }
 
+export async function submitGuessBatch(
+  gameId: string,
+  words: string[]
+): Promise<GuessBatchResponse> {
+  const res = await axios.post<GuessBatchResponse>(
+    `${API_BASE}/game/guess_batch`,
+    { game_id: gameId, words }
+  );
+  return res.data;
+}
+
 export async function getHint(
   gameId: string,
   lastGuess: string,
@@ -67,6 +98,19 @@ export async function getHint(
   return res.data;
 }
 
+export async function getNeighbors(
+  gameId: string,
+  word?: string,
+  n = 10
+): Promise<NeighborsResponse> {
+  const res = await axios.post<NeighborsResponse>(`${API_BASE}/game/neighbors`, {
+    game_id: gameId,
+    word: word ?? null,
+    n,
+  });
+  return res.data;
+}
+
 export async function giveUp(gameId: string): Promise<GiveUpResponse> {
   const res = await axios.post<GiveUpResponse>(`${API_BASE}/game/give_up`, {
     game_id: gameId,
@@ -83,9 +83,18 @@ export interface StepData {
   chosen_token_id: number;
 }
 
+export interface BeamData {
+  text: string;
+  score: number;
+  logprob: number;
+  finished: boolean;
+  steps: StepData[];
+}
+
 export interface IterativeGenerationResponse {
   generated_text: string;
   steps: StepData[];
+  beams?: BeamData[] | null;
 }
 
 // LM Request Configuration